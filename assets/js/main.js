@@ -4,6 +4,11 @@ document.addEventListener("DOMContentLoaded", () => {
         if(resultElement) {
             resultElement.innerHTML = "";
         }
+        // Drops the pending response, the button itself cancels the search on the server
+        const searchForm = document.getElementById("global-search-form")
+        if(searchForm && window.htmx) {
+            htmx.trigger(searchForm, "htmx:abort");
+        }
     });
 });
 
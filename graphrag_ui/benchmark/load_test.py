@@ -0,0 +1,257 @@
+"""
+Drives the real app with many concurrent simulated users against a synthetic
+project and a local OpenAI stub. Reports the throughput and the latency
+percentiles per page, and the event loop lag measured inside the server.
+
+Usage:
+
+python -m graphrag_ui.benchmark.load_test --users 50 --duration 60 --max-loop-lag-ms 200
+
+The run fails with exit code 1 if the longest event loop lag exceeds
+--max-loop-lag-ms, i.e. if a handler blocked all other requests for longer.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from graphrag_ui.benchmark.openai_stub import (
+    running_stub,
+    configure_environment,
+    add_stub_arguments,
+    read_stub_settings,
+    free_port,
+)
+from graphrag_ui.benchmark.synthetic_project import (
+    generate_project,
+    add_scale_arguments,
+    read_scale,
+)
+from graphrag_ui.benchmark.query_benchmark import QUERIES
+
+PROJECT = "load-test"
+LOOP_LAG_PATH = "/load-test/loop-lag"
+# Relative frequency of the actions of a simulated user
+ACTIONS = {
+    "home": 2,
+    "project": 3,
+    "global_search": 3,
+    "local_search": 2,
+    "generate_questions": 1,
+    "output_preview": 1,
+}
+
+
+def serve(port: int):
+    """Runs the app in the server process, with routes to read its event loop lag."""
+    import uvicorn
+
+    from graphrag_ui.service.execution_service import loop_monitor
+    from graphrag_ui.ui.project import app
+
+    @app.route(LOOP_LAG_PATH)
+    def get():
+        return loop_monitor.stats().model_dump()
+
+    @app.route(f"{LOOP_LAG_PATH}/reset")
+    def post():
+        loop_monitor.reset()
+        return ""
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class LoadTestResults:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {action: [] for action in ACTIONS}
+        self.errors: Dict[str, int] = {action: 0 for action in ACTIONS}
+
+    def record(self, action: str, seconds: float, ok: bool):
+        self.latencies[action].append(seconds)
+        if not ok:
+            self.errors[action] += 1
+
+    def summary(self, duration_s: float) -> dict:
+        actions = {}
+        for action, latencies in self.latencies.items():
+            if not latencies:
+                continue
+            actions[action] = {
+                "requests": len(latencies),
+                "errors": self.errors[action],
+                "requests_per_second": round(len(latencies) / duration_s, 2),
+                **{
+                    f"p{q}_seconds": round(float(np.percentile(latencies, q)), 4)
+                    for q in [50, 95, 99]
+                },
+                "max_seconds": round(max(latencies), 4),
+            }
+        requests = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "requests": requests,
+            "errors": sum(self.errors.values()),
+            "requests_per_second": round(requests / duration_s, 2),
+            "actions": actions,
+        }
+
+
+async def perform(client: httpx.AsyncClient, action: str, user: int) -> bool:
+    query = random.choice(QUERIES)
+    search = {"projectTitle": PROJECT, "query": query, "searchId": f"user-{user}"}
+    match action:
+        case "home":
+            response = await client.get("/")
+        case "project":
+            response = await client.get(f"/project/{PROJECT}")
+        case "global_search":
+            response = await client.post(
+                "/project/search", data={**search, "searchType": "global"}
+            )
+        case "local_search":
+            response = await client.post(
+                "/project/search", data={**search, "searchType": "local"}
+            )
+        case "generate_questions":
+            response = await client.post("/project/generate-question", data=search)
+        case "output_preview":
+            response = await client.get(
+                f"/project/output/{PROJECT}/create_final_entities.parquet"
+            )
+    return response.status_code < 400
+
+
+async def simulate_user(
+    client: httpx.AsyncClient,
+    user: int,
+    deadline: float,
+    think_time_s: float,
+    results: LoadTestResults,
+):
+    actions, weights = list(ACTIONS), list(ACTIONS.values())
+    while time.perf_counter() < deadline:
+        action = random.choices(actions, weights)[0]
+        start = time.perf_counter()
+        try:
+            ok = await perform(client, action, user)
+        except httpx.HTTPError:
+            ok = False
+        results.record(action, time.perf_counter() - start, ok)
+        await asyncio.sleep(random.uniform(0, 2 * think_time_s))
+
+
+async def run_load(
+    base_url: str, users: int, duration_s: float, think_time_s: float
+) -> dict:
+    results = LoadTestResults()
+    limits = httpx.Limits(max_connections=users)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=300, limits=limits, headers={"HX-Request": "1"}
+    ) as client:
+        await client.post(f"{LOOP_LAG_PATH}/reset")
+        start = time.perf_counter()
+        deadline = start + duration_s
+        await asyncio.gather(
+            *[
+                simulate_user(client, user, deadline, think_time_s, results)
+                for user in range(users)
+            ]
+        )
+        elapsed = time.perf_counter() - start
+        loop_lag = (await client.get(LOOP_LAG_PATH)).json()
+    return {
+        **results.summary(elapsed),
+        "seconds": round(elapsed, 1),
+        "loop_lag": loop_lag,
+    }
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout_s: float = 60):
+    deadline = time.time() + timeout_s
+    while True:
+        try:
+            httpx.get(f"{base_url}{LOOP_LAG_PATH}").raise_for_status()
+            return
+        except httpx.HTTPError:
+            if time.time() > deadline or process.poll() is not None:
+                raise RuntimeError("The app did not start")
+            time.sleep(0.2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument(
+        "--think-time-ms",
+        type=float,
+        default=500,
+        help="Average pause of a user between two requests",
+    )
+    parser.add_argument(
+        "--max-loop-lag-ms",
+        type=float,
+        help="Fail if the event loop was blocked for longer than this",
+    )
+    parser.add_argument("--output", type=Path, help="File to write the JSON results to")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    add_scale_arguments(parser)
+    add_stub_arguments(parser, exclude=["dimensions"])
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        project_root = Path(tmp_dir)
+        with running_stub(read_stub_settings(args)) as stub_url:
+            configure_environment(stub_url, project_root)
+            generate_project(project_root / PROJECT, read_scale(args))
+            port = free_port()
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "graphrag_ui.benchmark.load_test",
+                    f"--serve={port}",
+                ],
+                # The session key of the app is written to the working directory
+                cwd=tmp_dir,
+                env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+            )
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                wait_for_server(base_url, server)
+                report = asyncio.run(
+                    run_load(
+                        base_url, args.users, args.duration, args.think_time_ms / 1000
+                    )
+                )
+            finally:
+                server.terminate()
+                server.wait()
+    report["users"] = args.users
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.max_loop_lag_ms is not None:
+        max_lag = report["loop_lag"]["max_ms"]
+        if max_lag > args.max_loop_lag_ms:
+            print(
+                f"FAILED: the event loop was blocked for {max_lag} ms, "
+                f"more than {args.max_loop_lag_ms} ms"
+            )
+            sys.exit(1)
@@ -0,0 +1,192 @@
+"""
+Measures memory and throughput of the Neo4J importers against a local stand-in
+for the Neo4J driver, so that no database is needed.
+
+Usage:
+
+python -m graphrag_ui.benchmark.neo4j_import_benchmark --rows 50000 --dimensions 1536
+"""
+
+import argparse
+import json
+import multiprocessing
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ENTITY_STATEMENT = "MERGE (e:__Entity__ {id: value.id})"
+ENTITY_COLUMNS = [
+    "name",
+    "type",
+    "description",
+    "human_readable_id",
+    "id",
+    "description_embedding",
+    "text_unit_ids",
+]
+
+
+class StandInSummary:
+    counters = {}
+
+
+class StandInTransaction:
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+
+    def run(self, query: str, parameters: dict = None, **kwargs):
+        rows = {**(parameters or {}), **kwargs}.get("rows", [])
+        # Touch every value like the driver does when it serializes the parameters
+        for row in rows:
+            for value in row.values():
+                if hasattr(value, "__len__") and not isinstance(value, str):
+                    len(value)
+        time.sleep(self.latency_s)
+        return self
+
+    def consume(self):
+        return StandInSummary()
+
+
+class StandInSession:
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        return transaction_function(StandInTransaction(self.latency_s), *args, **kwargs)
+
+
+class StandInDriver:
+    """Stands in for neo4j.Driver, simulating a fixed server latency per batch."""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+
+    def session(self, **kwargs):
+        return StandInSession(self.latency_s)
+
+
+def generate_entities(file: Path, rows: int, dimensions: int, chunk: int = 10_000):
+    # Writes a single row group like pandas.to_parquet does for graphrag outputs
+    rng = np.random.default_rng(42)
+    schema = pa.schema(
+        [
+            ("name", pa.string()),
+            ("type", pa.string()),
+            ("description", pa.string()),
+            ("human_readable_id", pa.int64()),
+            ("id", pa.string()),
+            ("description_embedding", pa.list_(pa.float64())),
+            ("text_unit_ids", pa.list_(pa.string())),
+        ]
+    )
+    tables = []
+    for start in range(0, rows, chunk):
+        ids = range(start, min(start + chunk, rows))
+        embeddings = rng.random((len(ids), dimensions))
+        tables.append(
+            pa.table(
+                {
+                    "name": [f'"ENTITY {i}"' for i in ids],
+                    "type": ['"ORGANIZATION"' for _ in ids],
+                    "description": [f"Description of entity {i}" for i in ids],
+                    "human_readable_id": list(ids),
+                    "id": [f"entity-{i}" for i in ids],
+                    "description_embedding": list(embeddings),
+                    "text_unit_ids": [[f"chunk-{i % 100}"] for i in ids],
+                },
+                schema=schema,
+            )
+        )
+    pq.write_table(pa.concat_tables(tables), file, row_group_size=rows)
+
+
+def run_import(
+    mode: str, file: str, batch_size: int, latency_s: float, trace_memory: bool
+) -> dict:
+    import pandas as pd
+
+    from graphrag_ui.config import cfg
+    from graphrag_ui.service.neo4j_service import (
+        batched_import,
+        read_parquet_batches,
+    )
+
+    cfg.neo4j.driver = StandInDriver(latency_s)
+    pool = pa.default_memory_pool()
+    if trace_memory:
+        tracemalloc.start()
+    start_s = time.perf_counter()
+    if mode == "dataframe":
+        rows = pd.read_parquet(file, columns=ENTITY_COLUMNS)
+    else:
+        rows = read_parquet_batches(Path(file), ENTITY_COLUMNS, batch_size)
+    total = batched_import(ENTITY_STATEMENT, rows, batch_size, stage=mode)
+    elapsed = time.perf_counter() - start_s
+    result = {
+        "mode": mode,
+        "rows": total,
+        "peak_arrow_mb": round(pool.max_memory() / 2**20, 1),
+    }
+    if trace_memory:
+        _, peak_python = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_python_mb"] = round(peak_python / 2**20, 1)
+    else:
+        result["seconds"] = round(elapsed, 3)
+        result["rows_per_second"] = round(total / elapsed)
+    return result
+
+
+def run_isolated(mode: str, file: str, batch_size: int, latency_s: float) -> dict:
+    # Each run uses a fresh process, so that the memory peaks do not mix.
+    # Throughput is measured without tracemalloc, which slows down allocations.
+    context = multiprocessing.get_context("spawn")
+    result = {}
+    for trace_memory in [False, True]:
+        with context.Pool(1) as pool:
+            result.update(
+                pool.apply(
+                    run_import, (mode, file, batch_size, latency_s, trace_memory)
+                )
+            )
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=5,
+        help="Simulated Neo4J latency per batch in milliseconds",
+    )
+    parser.add_argument("--output", type=str, help="File to write the JSON results to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = Path(tmp_dir) / "create_final_entities.parquet"
+        generate_entities(file, args.rows, args.dimensions)
+        results = [
+            run_isolated(mode, file.as_posix(), args.batch_size, args.latency_ms / 1000)
+            for mode in ["dataframe", "streaming"]
+        ]
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report)
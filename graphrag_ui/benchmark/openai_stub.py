@@ -0,0 +1,269 @@
+"""
+A local stand-in for the OpenAI chat completion and embedding APIs with a
+configurable latency and token throughput, so that the query path can be
+measured without network variance or costs.
+
+Usage:
+
+python -m graphrag_ui.benchmark.openai_stub --port 8901 --latency-ms 300 --tokens-per-second 60
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from pydantic import BaseModel, Field
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Tokens sent per streamed chunk
+CHUNK_TOKENS = 8
+
+
+class StubSettings(BaseModel):
+    latency_ms: float = Field(300, description="Time to the first token")
+    tokens_per_second: float = Field(60, description="Completion token throughput")
+    completion_tokens: int = Field(250, description="Tokens of a text completion")
+    embedding_latency_ms: float = Field(50, description="Latency of an embedding")
+    dimensions: int = Field(1536, description="The size of the embeddings")
+
+
+class StubStats(BaseModel):
+    chat_completions: int = Field(0, description="Chat completions served")
+    embeddings: int = Field(0, description="Embedding requests served")
+    prompt_tokens: int = Field(0, description="Estimated prompt tokens received")
+    completion_tokens: int = Field(0, description="Completion tokens sent")
+
+
+def count_tokens(text: str) -> int:
+    # Rough estimate, the stub should not spend the CPU time of a tokenizer
+    return max(1, len(text) // 4)
+
+
+def completion_text(messages: List[dict], json_mode: bool, tokens: int) -> str:
+    if json_mode:
+        # The answer of a map step of a global search
+        points = [
+            {
+                "description": f"Point {i} of the answer [Data: Reports (1)]",
+                "score": 80 - i,
+            }
+            for i in range(3)
+        ]
+        return json.dumps({"points": points})
+    prompt = " ".join(str(m.get("content", "")) for m in messages).lower()
+    if "question" in prompt and "generate" in prompt:
+        return "\n".join(f"- What is the role of topic {i}?" for i in range(5))
+    return " ".join(["answer"] * tokens)
+
+
+def create_app(settings: StubSettings) -> Starlette:
+    stats = StubStats()
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        tokens = min(settings.completion_tokens, body.get("max_tokens") or 10**6)
+        text = completion_text(messages, json_mode, tokens)
+        prompt_tokens = sum(count_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = count_tokens(text) if json_mode else len(text.split())
+        stats.chat_completions += 1
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        base = {
+            "id": f"chatcmpl-{stats.chat_completions}",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+        }
+        await asyncio.sleep(settings.latency_ms / 1000)
+        if not body.get("stream"):
+            await asyncio.sleep(completion_tokens / settings.tokens_per_second)
+            return JSONResponse(
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }
+            )
+
+        async def stream():
+            words = text.split(" ")
+            for start in range(0, len(words), CHUNK_TOKENS):
+                content = " ".join(words[start : start + CHUNK_TOKENS])
+                if start + CHUNK_TOKENS < len(words):
+                    content += " "
+                chunk = {
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": content},
+                            "finish_reason": None,
+                        }
+                    ],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(CHUNK_TOKENS / settings.tokens_per_second)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        stats.embeddings += 1
+        await asyncio.sleep(settings.embedding_latency_ms / 1000)
+        data = []
+        for i, text in enumerate(inputs):
+            # The same text always gets the same embedding
+            seed = int(hashlib.sha256(str(text).encode()).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(settings.dimensions)
+            vector /= np.linalg.norm(vector)
+            data.append(
+                {"object": "embedding", "index": i, "embedding": vector.tolist()}
+            )
+        tokens = sum(count_tokens(str(text)) for text in inputs)
+        return JSONResponse(
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "stub"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        )
+
+    async def get_stats(request: Request):
+        return JSONResponse(stats.model_dump())
+
+    return Starlette(
+        routes=[
+            Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+            Route("/v1/embeddings", embeddings, methods=["POST"]),
+            Route("/stats", get_stats),
+        ]
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def read_stats(base_url: str) -> Dict[str, int]:
+    with urllib.request.urlopen(f"{base_url.removesuffix('/v1')}/stats") as response:
+        return json.loads(response.read())
+
+
+@contextmanager
+def running_stub(settings: StubSettings, timeout_s: float = 30) -> Iterator[str]:
+    """
+    Runs the stub in its own process, so that its CPU time is not measured,
+    and yields its base URL.
+    """
+    port = free_port()
+    arguments = [
+        f"--{name.replace('_', '-')}={value}"
+        for name, value in settings.model_dump().items()
+    ]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "graphrag_ui.benchmark.openai_stub", f"--port={port}"]
+        + arguments,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}/v1"
+    try:
+        deadline = time.time() + timeout_s
+        while True:
+            try:
+                read_stats(base_url)
+                break
+            except OSError:
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError("The OpenAI stub did not start")
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def configure_environment(base_url: str, project_root: Path):
+    """
+    Points the app at the stub. Must be called before graphrag_ui.config is
+    imported. The Neo4J settings are placeholders, no connection is made.
+    """
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["PROJECT_DIR"] = project_root.as_posix()
+    os.environ.setdefault("OPENAI_API_MODEL", "gpt-4o-mini")
+    os.environ.setdefault("OPENAI_API_MODEL_EMBEDDING", "text-embedding-3-small")
+    os.environ.setdefault("TIKTOCKEN_ENCODING", "cl100k_base")
+    os.environ.setdefault("IMAGE_PATH", project_root.as_posix())
+    os.environ.setdefault("NEO4J_URI", "bolt://localhost:7687")
+    os.environ.setdefault("NEO4J_USERNAME", "neo4j")
+    os.environ.setdefault("NEO4J_PASSWORD", "neo4j")
+    os.environ.setdefault("NEO4J_DATABASE", "neo4j")
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser, exclude: Iterable[str] = ()):
+    for name, field in StubSettings.model_fields.items():
+        if name in exclude:
+            continue
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            type=field.annotation,
+            default=field.default,
+            help=field.description,
+        )
+
+
+def read_stub_settings(args: argparse.Namespace) -> StubSettings:
+    return StubSettings(
+        **{name: getattr(args, name) for name in StubSettings.model_fields}
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8901)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(read_stub_settings(args)),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,227 @@
+"""
+Measures the latency, the stage timings, the CPU time and the peak memory of
+the local search, the global searches and the question generation against a
+synthetic project and a local OpenAI stub, so that no API calls are paid for.
+
+Usage:
+
+python -m graphrag_ui.benchmark.query_benchmark --entities 5000 --reports 400 --output results.json
+python -m graphrag_ui.benchmark.query_benchmark --output new.json --compare results.json
+python -m graphrag_ui.benchmark.query_benchmark --search-types global --community-level 1
+python -m graphrag_ui.benchmark.query_benchmark --search-profile fast --output fast.json --compare results.json
+
+Every search type runs in a fresh process, so that the peak RSS of one does not
+hide the other. The first search of a process loads the libraries and is
+reported separately as the cold latency.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from graphrag_ui.benchmark.openai_stub import (
+    running_stub,
+    configure_environment,
+    add_stub_arguments,
+    read_stub_settings,
+    read_stats,
+)
+from graphrag_ui.benchmark.synthetic_project import (
+    generate_project,
+    add_scale_arguments,
+    read_scale,
+)
+
+SEARCH_TYPES = ["local", "global", "fast_global", "questions"]
+QUERIES = [
+    "What are the main topics?",
+    "Which organizations work on energy policy?",
+    "How is the supply chain related to climate risk?",
+    "Who are the most important partners?",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 4) if values else None
+
+
+async def run_search(search_type: str, query: str, project_dir: Path):
+    from graphrag_ui.service.graphrag_query import (
+        search_rag,
+        generate_question_result,
+        SearchType,
+    )
+
+    if search_type == "questions":
+        return await generate_question_result([query], project_dir)
+    return await search_rag(query, project_dir, SearchType(search_type))
+
+
+def run_searches(
+    search_type: str, project_dir: str, base_url: str, iterations: int
+) -> dict:
+    project_dir = Path(project_dir)
+    configure_environment(base_url, project_dir.parent)
+    from graphrag_ui.service.metrics_service import STAGE_SECONDS
+
+    async def measure() -> dict:
+        start_s = time.perf_counter()
+        await run_search(search_type, QUERIES[0], project_dir)
+        cold_s = time.perf_counter() - start_s
+        stages_before = STAGE_SECONDS.totals()
+        cpu_before = time.process_time()
+        latencies, llm_calls, prompt_tokens = [], [], []
+        for i in range(iterations):
+            start_s = time.perf_counter()
+            result = await run_search(
+                search_type, QUERIES[i % len(QUERIES)], project_dir
+            )
+            latencies.append(time.perf_counter() - start_s)
+            llm_calls.append(result.llm_calls)
+            prompt_tokens.append(result.prompt_tokens)
+        cpu_s = time.process_time() - cpu_before
+        stages = {}
+        for key, (total, count) in STAGE_SECONDS.totals().items():
+            stage, _, label = key
+            before, before_count = stages_before.get(key, (0, 0))
+            if label != search_type or count == before_count:
+                continue
+            stages[stage] = {
+                "seconds_per_search": round((total - before) / iterations, 4),
+                "calls_per_search": round((count - before_count) / iterations, 2),
+            }
+        return {
+            "search_type": search_type,
+            "iterations": iterations,
+            "cold_seconds": round(cold_s, 4),
+            "p50_seconds": percentile(latencies, 50),
+            "p95_seconds": percentile(latencies, 95),
+            "mean_seconds": round(float(np.mean(latencies)), 4),
+            "cpu_seconds_per_search": round(cpu_s / iterations, 4),
+            "llm_calls_per_search": float(np.mean(llm_calls)),
+            "prompt_tokens_per_search": float(np.mean(prompt_tokens)),
+            "stages": stages,
+        }
+
+    result = asyncio.run(measure())
+    # Kilobytes on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_rss_mb"] = round(
+        peak_rss / (2**20 if sys.platform == "darwin" else 2**10), 1
+    )
+    return result
+
+
+def run_isolated(
+    search_type: str, project_dir: Path, base_url: str, iterations: int
+) -> dict:
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(
+            run_searches, (search_type, project_dir.as_posix(), base_url, iterations)
+        )
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    lines = [f"Compared to {baseline.get('commit')}:"]
+    previous = {r["search_type"]: r for r in baseline["results"]}
+    for result in report["results"]:
+        before = previous.get(result["search_type"])
+        if before is None:
+            continue
+        for key in [
+            "p50_seconds",
+            "p95_seconds",
+            "cpu_seconds_per_search",
+            "peak_rss_mb",
+        ]:
+            if before.get(key):
+                change = (result[key] - before[key]) / before[key] * 100
+                lines.append(
+                    f"{result['search_type']:>9} {key:<24} {before[key]:>10} -> {result[key]:>10} ({change:+.1f}%)"
+                )
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument(
+        "--search-types", nargs="+", choices=SEARCH_TYPES, default=SEARCH_TYPES
+    )
+    parser.add_argument("--output", type=Path, help="File to write the JSON results to")
+    parser.add_argument(
+        "--compare", type=Path, help="JSON results of an earlier run to compare with"
+    )
+    parser.add_argument(
+        "--community-level",
+        help="The community level of the searches, a level or auto",
+    )
+    parser.add_argument(
+        "--search-profile",
+        choices=["fast", "balanced", "thorough"],
+        help="The profile of the searches",
+    )
+    add_scale_arguments(parser)
+    # The stub returns embeddings of the size of the synthetic ones
+    add_stub_arguments(parser, exclude=["dimensions"])
+    args = parser.parse_args()
+    scale = read_scale(args)
+    stub_settings = read_stub_settings(args)
+    if args.community_level is not None:
+        # Read by the configuration of the search processes
+        os.environ["COMMUNITY_LEVEL"] = args.community_level
+    if args.search_profile is not None:
+        os.environ["SEARCH_PROFILE"] = args.search_profile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        project_dir = Path(tmp_dir) / "benchmark"
+        with running_stub(stub_settings) as base_url:
+            configure_environment(base_url, project_dir.parent)
+            generate_project(project_dir, scale)
+            results = [
+                run_isolated(search_type, project_dir, base_url, args.iterations)
+                for search_type in args.search_types
+            ]
+            stub_stats = read_stats(base_url)
+    report = {
+        "commit": current_commit(),
+        "scale": scale.model_dump(),
+        "community_level": os.environ.get("COMMUNITY_LEVEL"),
+        "search_profile": os.environ.get("SEARCH_PROFILE"),
+        "stub": stub_settings.model_dump(),
+        "stub_stats": stub_stats,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.compare:
+        print("\n".join(compare(report, json.loads(args.compare.read_text()))))
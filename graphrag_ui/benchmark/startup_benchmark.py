@@ -0,0 +1,165 @@
+"""
+Measures how long a fresh server process takes until it can serve the home
+page: the import of the app and the first response. Also lists the slowest
+imports and checks that the heavy libraries, which are only needed by the
+searches and the Neo4J sync, are not loaded at startup.
+
+Usage:
+
+python -m graphrag_ui.benchmark.startup_benchmark --runs 5 --output startup.json
+python -m graphrag_ui.benchmark.startup_benchmark --max-startup-ms 1000
+
+The run fails with exit code 1 if one of the deferred libraries is loaded at
+startup, or if the median startup exceeds --max-startup-ms.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# Libraries which are loaded by the first search or sync, not by the startup
+DEFERRED_MODULES = ["graphrag", "lancedb", "tiktoken", "openai", "neo4j"]
+
+
+def measure():
+    """Runs in the fresh process: imports the app and requests the home page."""
+    import time
+
+    start = time.perf_counter()
+    from graphrag_ui.ui.main import app
+
+    imported = time.perf_counter()
+
+    from starlette.testclient import TestClient
+
+    # Entering the client runs the startup handlers of the app
+    with TestClient(app) as client:
+        response = client.get("/")
+        served = time.perf_counter()
+    print(
+        json.dumps(
+            {
+                "import_ms": round((imported - start) * 1000, 1),
+                "startup_ms": round((served - start) * 1000, 1),
+                "status": response.status_code,
+                "loaded": [m for m in DEFERRED_MODULES if m in sys.modules],
+            }
+        )
+    )
+
+
+def run_measurement(work_dir: Path, env: Dict[str, str], importtime: bool) -> dict:
+    result = subprocess.run(
+        [sys.executable]
+        + (["-X", "importtime"] if importtime else [])
+        + ["-m", "graphrag_ui.benchmark.startup_benchmark", "--measure"],
+        # The session key of the app is written to the working directory
+        cwd=work_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    if importtime:
+        measurement["imports"] = slowest_imports(result.stderr)
+    return measurement
+
+
+def slowest_imports(importtime_log: str) -> Dict[str, float]:
+    """The own import time of the modules per top level package in milliseconds."""
+    packages: Dict[str, float] = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line.removeprefix("import time:").split("|")
+        if not own.strip().isdigit():
+            # The header line
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(own) / 1000
+    return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+
+def summarize(measurements: List[dict], imports: Dict[str, float], top: int) -> dict:
+    def median(key: str) -> float:
+        return round(float(np.median([m[key] for m in measurements])), 1)
+
+    return {
+        "runs": len(measurements),
+        "import_ms": median("import_ms"),
+        "startup_ms": median("startup_ms"),
+        "status": measurements[0]["status"],
+        "loaded_deferred_modules": sorted(
+            {m for measurement in measurements for m in measurement["loaded"]}
+        ),
+        "slowest_imports_ms": {
+            package: round(ms, 1) for package, ms in list(imports.items())[:top]
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of slowest packages listed"
+    )
+    parser.add_argument(
+        "--max-startup-ms",
+        type=float,
+        help="Fail if the median startup takes longer than this",
+    )
+    parser.add_argument("--output", type=Path, help="File to write the JSON results to")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        (tmp_dir / "projects").mkdir()
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(sys.path),
+            "PROJECT_DIR": os.environ.get("PROJECT_DIR", str(tmp_dir / "projects")),
+            "IMAGE_PATH": os.environ.get("IMAGE_PATH", str(tmp_dir / "images")),
+        }
+        # A separate run lists the imports, as -X importtime slows the imports down
+        imports = run_measurement(tmp_dir, env, importtime=True)["imports"]
+        measurements = [
+            run_measurement(tmp_dir, env, importtime=False) for _ in range(args.runs)
+        ]
+    report = summarize(measurements, imports, args.top)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    failures = []
+    if report["loaded_deferred_modules"]:
+        failures.append(
+            f"{', '.join(report['loaded_deferred_modules'])} loaded at startup"
+        )
+    if args.max_startup_ms is not None and report["startup_ms"] > args.max_startup_ms:
+        failures.append(
+            f"the startup took {report['startup_ms']} ms, "
+            f"more than {args.max_startup_ms} ms"
+        )
+    if failures:
+        print(f"FAILED: {'; '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
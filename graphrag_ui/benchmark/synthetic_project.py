@@ -0,0 +1,172 @@
+"""
+Generates a graphrag project with synthetic output tables, so that the query
+path can be measured at any scale without indexing real documents.
+
+Usage:
+
+python -m graphrag_ui.benchmark.synthetic_project <project dir> --entities 2000 --reports 200
+"""
+
+import argparse
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.service.graphrag_constants import (
+    COMMUNITY_LEVEL,
+    COMMUNITY_REPORT_TABLE,
+    ENTITY_TABLE,
+    ENTITY_EMBEDDING_TABLE,
+    RELATIONSHIP_TABLE,
+    TEXT_UNIT_TABLE,
+)
+
+WORDS = (
+    "market supply chain energy policy research partner product customer risk "
+    "regulation growth platform network investment community region technology "
+    "health education finance climate strategy operation service data security"
+).split()
+
+
+class ProjectScale(BaseModel):
+    entities: int = Field(2000, description="The number of entities")
+    relationships: int = Field(5000, description="The number of relationships")
+    reports: int = Field(200, description="The number of community reports")
+    text_units: int = Field(1000, description="The number of text units")
+    dimensions: int = Field(1536, description="The size of the embeddings")
+    report_words: int = Field(300, description="The words of a report")
+    text_unit_words: int = Field(250, description="The words of a text unit")
+    seed: int = Field(42, description="The seed of the random generator")
+
+
+def sentence(rng: np.random.Generator, words: int) -> str:
+    return " ".join(rng.choice(WORDS, words))
+
+
+def communities_per_level(reports: int, levels: int) -> list:
+    # Every level has twice the communities of the level above, like a Leiden hierarchy
+    weights = [2**level for level in range(levels)]
+    counts = [max(1, reports * w // sum(weights)) for w in weights]
+    counts[-1] += max(0, reports - sum(counts))
+    return counts
+
+
+def generate_project(project_dir: Path, scale: ProjectScale = ProjectScale()) -> Path:
+    """Writes the settings and the output tables read by the searches."""
+    rng = np.random.default_rng(scale.seed)
+    output_dir = project_dir / "output"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (project_dir / "settings.yaml").write_text("# Synthetic benchmark project\n")
+
+    names = [f'"ENTITY {i}"' for i in range(scale.entities)]
+    text_unit_ids = [f"text-unit-{i}" for i in range(scale.text_units)]
+    entity_text_units = rng.integers(0, scale.text_units, (scale.entities, 3))
+    degrees = rng.zipf(2.0, scale.entities).clip(1, 1000)
+
+    nodes, reports, community = [], [], 0
+    for level, count in enumerate(
+        communities_per_level(scale.reports, COMMUNITY_LEVEL + 1)
+    ):
+        members = rng.integers(community, community + count, scale.entities)
+        for i, name in enumerate(names):
+            nodes.append(
+                {
+                    "id": f"entity-{i}",
+                    "level": level,
+                    "title": name,
+                    "degree": int(degrees[i]),
+                    "community": str(members[i]),
+                }
+            )
+        for c in range(community, community + count):
+            content = sentence(rng, scale.report_words)
+            reports.append(
+                {
+                    "id": f"report-{c}",
+                    "community": str(c),
+                    "level": level,
+                    "title": f"Community {c}",
+                    "summary": content[:200],
+                    "findings": [{"summary": sentence(rng, 8), "explanation": content}],
+                    "rank": float(rng.uniform(1, 10)),
+                    "rank_explanation": sentence(rng, 12),
+                    "full_content": f"# Community {c}\n\n{content}",
+                }
+            )
+        community += count
+    pd.DataFrame(nodes).to_parquet(output_dir / f"{ENTITY_TABLE}.parquet")
+    pd.DataFrame(reports).to_parquet(output_dir / f"{COMMUNITY_REPORT_TABLE}.parquet")
+
+    embeddings = rng.standard_normal((scale.entities, scale.dimensions))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    pd.DataFrame(
+        {
+            "name": names,
+            "type": ['"ORGANIZATION"'] * scale.entities,
+            "description": [sentence(rng, 40) for _ in names],
+            "human_readable_id": range(scale.entities),
+            "id": [f"entity-{i}" for i in range(scale.entities)],
+            "description_embedding": list(embeddings),
+            "text_unit_ids": [
+                [text_unit_ids[t] for t in units] for units in entity_text_units
+            ],
+        }
+    ).to_parquet(output_dir / f"{ENTITY_EMBEDDING_TABLE}.parquet")
+
+    sources = rng.integers(0, scale.entities, scale.relationships)
+    targets = (sources + rng.integers(1, scale.entities, scale.relationships)) % max(
+        scale.entities, 1
+    )
+    pd.DataFrame(
+        {
+            "source": [names[s] for s in sources],
+            "target": [names[t] for t in targets],
+            "id": [f"relationship-{i}" for i in range(scale.relationships)],
+            "rank": (degrees[sources] + degrees[targets]).astype(int),
+            "weight": rng.uniform(1, 10, scale.relationships),
+            "human_readable_id": range(scale.relationships),
+            "description": [sentence(rng, 15) for _ in range(scale.relationships)],
+            "text_unit_ids": [
+                [text_unit_ids[t]]
+                for t in rng.integers(0, scale.text_units, scale.relationships)
+            ],
+        }
+    ).to_parquet(output_dir / f"{RELATIONSHIP_TABLE}.parquet")
+
+    pd.DataFrame(
+        {
+            "id": text_unit_ids,
+            "text": [sentence(rng, scale.text_unit_words) for _ in text_unit_ids],
+            "n_tokens": [scale.text_unit_words] * scale.text_units,
+            "document_ids": [["document-0"]] * scale.text_units,
+        }
+    ).to_parquet(output_dir / f"{TEXT_UNIT_TABLE}.parquet")
+    return project_dir
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser):
+    for name, field in ProjectScale.model_fields.items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            type=field.annotation,
+            default=field.default,
+            help=field.description,
+        )
+
+
+def read_scale(args: argparse.Namespace) -> ProjectScale:
+    return ProjectScale(
+        **{name: getattr(args, name) for name in ProjectScale.model_fields}
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("project_dir", type=Path)
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    generate_project(args.project_dir, read_scale(args))
@@ -1,13 +1,10 @@
+from functools import cached_property
 from pathlib import Path
 import os
 
 from dotenv import load_dotenv
-import tiktoken
 
-from graphrag.query.llm.oai.chat_openai import ChatOpenAI
-from graphrag.query.llm.oai.typing import OpenaiApiType
-
-from neo4j import GraphDatabase
+from graphrag_ui.service.graphrag_constants import COMMUNITY_LEVEL
 
 load_dotenv()
 
@@ -21,16 +18,55 @@ class Neo4JConfig:
             cls._instance = super(Neo4JConfig, cls).__new__(cls)
         return cls._instance
 
+    # Neo4J is optional, it is only needed to sync projects and to search them in Neo4J
     neo4j_uri = os.getenv("NEO4J_URI")
-    assert neo4j_uri is not None, "Please specify a Neo4J URL"
     neo4j_username = os.getenv("NEO4J_USERNAME")
-    assert neo4j_username is not None, "Please specify a Neo4J user name"
     neo4j_password = os.getenv("NEO4J_PASSWORD")
-    assert neo4j_password is not None, "Please specify a Neo4J password"
     neo4j_database = os.getenv("NEO4J_DATABASE")
-    assert neo4j_database is not None, "Please specify a Neo4J database"
-    # Create a Neo4j driver
-    driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_username, neo4j_password))
+    # Number of concurrent sessions used to write batches during imports
+    import_workers = int(os.getenv("NEO4J_IMPORT_WORKERS", "4"))
+    # Maximum number of batches which are read ahead of the Neo4j writes
+    import_queue_size = int(os.getenv("NEO4J_IMPORT_QUEUE_SIZE", "8"))
+    # Rows per batch, optionally per stage, e.g. "entities=200,relationships=2000"
+    import_default_batch_size = int(os.getenv("NEO4J_IMPORT_BATCH_SIZE", "1000"))
+    import_batch_sizes = {
+        stage.strip(): int(size)
+        for stage, size in (
+            entry.split("=", 1)
+            for entry in os.getenv("NEO4J_IMPORT_BATCH_SIZES", "").split(",")
+            if "=" in entry
+        )
+    }
+
+    # Retries of a batch which failed with a transient error, with exponential backoff
+    import_max_retries = int(os.getenv("NEO4J_IMPORT_MAX_RETRIES", "5"))
+    import_retry_backoff = float(os.getenv("NEO4J_IMPORT_RETRY_BACKOFF", "1.0"))
+
+    def import_batch_size(self, stage: str) -> int:
+        return self.import_batch_sizes.get(stage, self.import_default_batch_size)
+
+    @property
+    def configured(self) -> bool:
+        return None not in (
+            self.neo4j_uri,
+            self.neo4j_username,
+            self.neo4j_password,
+            self.neo4j_database,
+        )
+
+    # Connects on first use, so that neo4j is only imported when it is needed
+    @cached_property
+    def driver(self):
+        if not self.configured:
+            raise ValueError(
+                "Neo4J is not configured. Please specify NEO4J_URI, NEO4J_USERNAME, "
+                "NEO4J_PASSWORD and NEO4J_DATABASE"
+            )
+        from neo4j import GraphDatabase
+
+        return GraphDatabase.driver(
+            self.neo4j_uri, auth=(self.neo4j_username, self.neo4j_password)
+        )
 
 
 class Config:
@@ -46,15 +82,7 @@ class Config:
     open_ai_model = os.getenv("OPENAI_API_MODEL")
     open_ai_model_embedding = os.getenv("OPENAI_API_MODEL_EMBEDDING")
 
-    llm = ChatOpenAI(
-        api_key=openai_api_key,
-        model=open_ai_model,
-        api_type=OpenaiApiType.OpenAI,  # OpenaiApiType.OpenAI or OpenaiApiType.AzureOpenAI
-        max_retries=20,
-    )
-
     tiktocken_encoding = os.getenv("TIKTOCKEN_ENCODING")
-    token_encoder = tiktoken.get_encoding(tiktocken_encoding)
 
     project_dir = os.getenv("PROJECT_DIR")
     project_dir = Path(project_dir)
@@ -62,7 +90,78 @@ class Config:
     image_path = os.getenv("IMAGE_PATH")
     image_path = Path(image_path)
 
+    # Responses smaller than this number of bytes are sent uncompressed
+    compression_min_size = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+    compression_level = int(os.getenv("COMPRESSION_LEVEL", "6"))
+    # Maximum number of rendered page fragments kept in memory
+    fragment_cache_size = int(os.getenv("FRAGMENT_CACHE_SIZE", "256"))
+
+    # Threads for the blocking work of requests, e.g. reading the output tables
+    blocking_workers = int(os.getenv("BLOCKING_WORKERS", "8"))
+    # Processes for the CPU bound work of requests, e.g. the CSV conversion
+    process_workers = int(os.getenv("PROCESS_WORKERS", "2"))
+    # Event loop blockings longer than this are logged with the blocking stack
+    loop_block_threshold_ms = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "200"))
+
+    # Number of projects whose search data is kept loaded, the least recently used is dropped first
+    query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", "4"))
+    # Memory budget of the loaded search data, the least recently used projects are dropped
+    # to stay within it and projects are only loaded ahead of a search if they fit into it
+    query_memory_mb = float(os.getenv("QUERY_MEMORY_MB", "1024"))
+    # Load the search data of a project when its page is opened
+    preload_on_open = os.getenv("PRELOAD_ON_OPEN", "true").lower() == "true"
+    # Number of the most recently used projects loaded at startup, none by default
+    warm_up_projects = int(os.getenv("WARM_UP_PROJECTS", "0"))
+
+    # Default community level of the searches, a level or "auto" for the deepest level within the budgets below
+    community_level = os.getenv("COMMUNITY_LEVEL", str(COMMUNITY_LEVEL))
+    # Budgets of the global search at the "auto" community level: the map calls and the
+    # tokens of the mapped reports, 0 for no limit
+    auto_level_max_map_calls = int(os.getenv("AUTO_LEVEL_MAX_MAP_CALLS", "10"))
+    auto_level_max_tokens = int(os.getenv("AUTO_LEVEL_MAX_TOKENS", "0"))
+
+    # Profile of the searches, fast, balanced or thorough, unless a project or a search chooses another one
+    search_profile = os.getenv("SEARCH_PROFILE", "balanced")
+
+    # The fast global search maps at most this number of the reports most relevant to the query
+    fast_global_top_n = int(os.getenv("FAST_GLOBAL_TOP_N", "20"))
+    # Minimum relevance score of a report mapped by the fast global search
+    fast_global_min_score = float(os.getenv("FAST_GLOBAL_MIN_SCORE", "0.25"))
+    # Weight of the report rank in the relevance score, the rest is the query similarity
+    fast_global_rank_weight = float(os.getenv("FAST_GLOBAL_RANK_WEIGHT", "0.1"))
+    # If fewer reports are relevant, the fast global search maps all reports or,
+    # without fallback, the most relevant ones up to this number
+    fast_global_min_reports = int(os.getenv("FAST_GLOBAL_MIN_REPORTS", "3"))
+    fast_global_fallback = os.getenv("FAST_GLOBAL_FALLBACK", "true").lower() == "true"
+
+    # Token to log into the admin page. The admin page is disabled without it
+    admin_token = os.getenv("ADMIN_TOKEN")
+    # Milliseconds between two stack samples of a profiled request
+    profile_interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    # Number of profiles kept per project, the oldest are deleted first
+    profile_max_count = int(os.getenv("PROFILE_MAX_COUNT", "20"))
+
     neo4j = Neo4JConfig()
 
+    # The LLM client and the token encoder are created on first use, so that
+    # the app starts without loading graphrag and tiktoken
+    @cached_property
+    def llm(self):
+        from graphrag.query.llm.oai.chat_openai import ChatOpenAI
+        from graphrag.query.llm.oai.typing import OpenaiApiType
+
+        return ChatOpenAI(
+            api_key=self.openai_api_key,
+            model=self.open_ai_model,
+            api_type=OpenaiApiType.OpenAI,  # OpenaiApiType.OpenAI or OpenaiApiType.AzureOpenAI
+            max_retries=20,
+        )
+
+    @cached_property
+    def token_encoder(self):
+        import tiktoken
+
+        return tiktoken.get_encoding(self.tiktocken_encoding)
+
 
 cfg = Config()
@@ -7,3 +7,6 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger("graphrag_ui")
+
+# One line of key=value pairs per search or indexing run with the duration of its stages
+timing_logger = logging.getLogger("graphrag_ui.timing")
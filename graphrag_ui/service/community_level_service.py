@@ -0,0 +1,197 @@
+"""
+Selects the community level of the searches. A search at a level uses the
+reports of the deepest community of every entity up to that level, so deeper
+levels give more specific reports, but the global search maps more of them.
+
+The reports and their tokens per level are counted once per index version and
+stored in the UI folder of the project. The "auto" level is the deepest level
+whose reports fit into the configured map call and token budgets.
+"""
+
+import math
+
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.config import cfg
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.graphrag_constants import (
+    COMMUNITY_REPORT_TABLE,
+    ENTITY_TABLE,
+    GLOBAL_MAX_TOKENS,
+)
+from graphrag_ui.service.graphrag_service import get_index_version
+from graphrag_ui.service.project_settings_service import (
+    UI_FOLDER,
+    read_project_settings,
+)
+from graphrag_ui.service.search_profile_service import (
+    SearchProfile,
+    resolve_search_profile,
+)
+
+AUTO_LEVEL = "auto"
+# The choice of the project's level, or of the configured level for a project
+DEFAULT_LEVEL = "default"
+LEVELS_FILE = f"{UI_FOLDER}/community_levels.json"
+
+
+class CommunityLevel(BaseModel):
+    level: int = Field(..., description="The community level")
+    reports: int = Field(..., description="The reports a search at this level uses")
+    tokens: int = Field(..., description="The tokens of their full content")
+    summary_tokens: int = Field(..., description="The tokens of their summaries")
+
+    def mapped_tokens(self, use_summary: bool = False) -> int:
+        return self.summary_tokens if use_summary else self.tokens
+
+    def map_calls(
+        self, max_tokens: int = GLOBAL_MAX_TOKENS, use_summary: bool = False
+    ) -> int:
+        """The estimated LLM calls of a global search mapping all the reports."""
+        return math.ceil(self.mapped_tokens(use_summary) / max_tokens)
+
+
+class CommunityLevels(BaseModel):
+    index_version: str = Field(..., description="The index version counted")
+    levels: List[CommunityLevel] = Field(..., description="The levels, top first")
+
+
+def count_levels(
+    report_df: pd.DataFrame, node_df: pd.DataFrame
+) -> List[CommunityLevel]:
+    """
+    Counts the reports per level like read_indexer_reports selects them: the
+    reports up to the level of the deepest community of every entity.
+    """
+    tokens, summary_tokens = (
+        report_df[column]
+        .fillna("")
+        .map(lambda text: len(cfg.token_encoder.encode(text)))
+        for column in ["full_content", "summary"]
+    )
+    node_df = node_df.assign(community=node_df["community"].fillna(-1).astype(int))
+    levels = []
+    for level in sorted(int(level) for level in report_df["level"].unique()):
+        nodes = node_df[node_df["level"] <= level]
+        communities = nodes.groupby("title")["community"].max().astype(str).unique()
+        selected = (report_df["level"] <= level) & report_df["community"].astype(
+            str
+        ).isin(communities)
+        levels.append(
+            CommunityLevel(
+                level=level,
+                reports=int(selected.sum()),
+                tokens=int(tokens[selected].sum()),
+                summary_tokens=int(summary_tokens[selected].sum()),
+            )
+        )
+    return levels
+
+
+def community_levels(project_dir: Path) -> List[CommunityLevel]:
+    """The levels of the current index, counted by the first call."""
+    levels_file = project_dir / LEVELS_FILE
+    index_version = get_index_version(project_dir)
+    if levels_file.exists():
+        stored = CommunityLevels.model_validate_json(levels_file.read_text("utf-8"))
+        if stored.index_version == index_version:
+            return stored.levels
+    report_df = pd.read_parquet(
+        project_dir / "output" / f"{COMMUNITY_REPORT_TABLE}.parquet",
+        columns=["community", "level", "summary", "full_content"],
+    )
+    node_df = pd.read_parquet(
+        project_dir / "output" / f"{ENTITY_TABLE}.parquet",
+        columns=["title", "level", "community"],
+    )
+    levels = count_levels(report_df, node_df)
+    logger.info(
+        f"Counted the reports of {project_dir.name} per level: "
+        + ", ".join(f"{level.level}: {level.reports}" for level in levels)
+    )
+    levels_file.parent.mkdir(parents=True, exist_ok=True)
+    levels_file.write_text(
+        CommunityLevels(index_version=index_version, levels=levels).model_dump_json(
+            indent=2
+        ),
+        "utf-8",
+    )
+    return levels
+
+
+def auto_level(
+    levels: List[CommunityLevel],
+    max_tokens: int = GLOBAL_MAX_TOKENS,
+    use_summary: bool = False,
+) -> int:
+    """
+    The deepest level within AUTO_LEVEL_MAX_MAP_CALLS and AUTO_LEVEL_MAX_TOKENS,
+    the top level if none is.
+    """
+    fitting = [
+        level.level
+        for level in levels
+        if (
+            cfg.auto_level_max_map_calls <= 0
+            or level.map_calls(max_tokens, use_summary) <= cfg.auto_level_max_map_calls
+        )
+        and (
+            cfg.auto_level_max_tokens <= 0
+            or level.mapped_tokens(use_summary) <= cfg.auto_level_max_tokens
+        )
+    ]
+    if fitting:
+        return max(fitting)
+    return min((level.level for level in levels), default=0)
+
+
+def default_level_choice(project_dir: Path) -> str:
+    """The level of the project's searches, a level or auto."""
+    return read_project_settings(project_dir).community_level or cfg.community_level
+
+
+def level_choice(project_dir: Path, choice: Optional[str] = None) -> str:
+    """The chosen level or auto, else the project's."""
+    if choice in (None, "", DEFAULT_LEVEL):
+        return default_level_choice(project_dir)
+    return choice
+
+
+def level_setting(choice: str) -> Optional[str]:
+    """The level stored for a project, a level or auto, None for the default."""
+    if choice in ("", DEFAULT_LEVEL):
+        return None
+    if choice == AUTO_LEVEL:
+        return choice
+    if choice.isdigit():
+        return str(int(choice))
+    raise ValueError(f"Invalid community level: {choice}")
+
+
+def resolve_community_level(
+    project_dir: Path,
+    choice: Optional[str] = None,
+    profile: Optional[SearchProfile] = None,
+) -> int:
+    """
+    The level of a search: the chosen one, else the project's. The auto level
+    is resolved for the map calls of the search profile, by default the
+    project's profile.
+    """
+    choice = level_choice(project_dir, choice)
+    if choice == AUTO_LEVEL:
+        profile = profile or resolve_search_profile(project_dir)
+        return auto_level(
+            community_levels(project_dir),
+            profile.global_max_tokens,
+            profile.use_community_summary,
+        )
+    try:
+        return int(choice)
+    except ValueError:
+        raise ValueError(f"Invalid community level: {choice}")
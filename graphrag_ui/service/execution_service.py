@@ -0,0 +1,75 @@
+"""
+Runs blocking work of requests outside of the event loop, so that one heavy
+request does not hold up all the others. File and network I/O and the
+graphrag calls go to a bounded thread pool, CPU bound work on files, like the
+CSV conversion, to a process pool. Both are sized in the configuration.
+
+The event loop itself is watched by a LoopLagMonitor, which logs the stack of
+any callback which still blocks it for longer than the configured threshold.
+"""
+
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from graphrag_ui.config import cfg
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.loop_lag_service import LoopLagMonitor
+
+_thread_pool = ThreadPoolExecutor(
+    max_workers=cfg.blocking_workers, thread_name_prefix="graphrag-ui-blocking"
+)
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+loop_monitor = LoopLagMonitor(block_threshold_s=cfg.loop_block_threshold_ms / 1000)
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Runs func in the thread pool. The context variables, e.g. the stage
+    timing of the request, are passed on to the thread.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _thread_pool, functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+def process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Spawned processes, as the server process holds threads and sockets
+            _process_pool = ProcessPoolExecutor(
+                max_workers=cfg.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+async def run_in_process(func: Callable[..., Any], *args) -> Any:
+    """Runs func in the process pool. The function and its arguments are pickled."""
+    return await asyncio.get_running_loop().run_in_executor(
+        process_pool(), functools.partial(func, *args)
+    )
+
+
+def start_loop_monitor():
+    loop_monitor.start()
+    logger.info(
+        f"Logging event loop blockings longer than {cfg.loop_block_threshold_ms:g} ms"
+    )
+
+
+def shutdown_pools():
+    loop_monitor.stop()
+    _thread_pool.shutdown(wait=False, cancel_futures=True)
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
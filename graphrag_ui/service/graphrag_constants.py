@@ -0,0 +1,27 @@
+"""
+The names of the graphrag output tables and the search types, in a module of
+their own, so that the pages can use them without importing graphrag.
+"""
+
+from enum import StrEnum
+
+COMMUNITY_REPORT_TABLE = "create_final_community_reports"
+ENTITY_TABLE = "create_final_nodes"
+ENTITY_EMBEDDING_TABLE = "create_final_entities"
+RELATIONSHIP_TABLE = "create_final_relationships"
+COVARIATE_TABLE = "create_final_covariates"
+TEXT_UNIT_TABLE = "create_final_text_units"
+
+# community level in the Leiden community hierarchy from which we will load the community reports
+# higher value means we use reports from more fine-grained communities (at the cost of higher computation cost)
+# The default, the level can be configured per project and chosen per search
+COMMUNITY_LEVEL = 2
+# Tokens of the community reports mapped by one LLM call of the global search
+GLOBAL_MAX_TOKENS = 12_000
+
+
+class SearchType(StrEnum):
+    GLOBAL = "global"
+    # A global search which only maps the reports relevant to the query
+    FAST_GLOBAL = "fast_global"
+    LOCAL = "local"
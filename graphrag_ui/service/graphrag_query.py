@@ -1,14 +1,17 @@
-from typing import Union, List, Tuple
+import time
+
+from dataclasses import dataclass
+from typing import Any, Optional, Union, List, Tuple
 
-from enum import StrEnum
 from pathlib import Path
 
 from markdown import markdown
 import pandas as pd
-import tiktoken
 
 from graphrag.query.llm.oai.embedding import OpenAIEmbedding
+from graphrag.query.context_builder.builders import LocalContextBuilder
 from graphrag.query.context_builder.entity_extraction import EntityVectorStoreKey
+from graphrag.query.context_builder.conversation_history import ConversationHistory
 from graphrag.query.indexer_adapters import (
     read_indexer_entities,
     read_indexer_reports,
@@ -16,13 +19,20 @@ from graphrag.query.indexer_adapters import (
     read_indexer_covariates,
     read_indexer_text_units,
 )
-from graphrag.query.structured_search.global_search.search import GlobalSearch
+from graphrag.query.structured_search.global_search.search import (
+    GlobalSearch,
+    GlobalSearchResult,
+)
 from graphrag.query.structured_search.local_search.search import LocalSearch
 from graphrag.query.question_gen.local_gen import LocalQuestionGen, BaseQuestionGen
+from graphrag.query.question_gen.base import QuestionResult
+from graphrag.query.structured_search.base import SearchResult
 from graphrag.query.structured_search.global_search.community_context import (
     GlobalCommunityContext,
 )
-from graphrag.vector_stores.lancedb import LanceDBVectorStore
+from graphrag.query.structured_search.global_search.callbacks import (
+    GlobalSearchLLMCallback,
+)
 from graphrag.query.input.loaders.dfs import (
     store_entity_semantic_embeddings,
 )
@@ -32,38 +42,125 @@ from graphrag.query.structured_search.local_search.mixed_context import (
 from graphrag.query.llm.oai.typing import OpenaiApiType
 
 from graphrag_ui.config import cfg
+from graphrag_ui.service.graphrag_constants import (
+    COMMUNITY_REPORT_TABLE,
+    ENTITY_TABLE,
+    ENTITY_EMBEDDING_TABLE,
+    RELATIONSHIP_TABLE,
+    COVARIATE_TABLE,
+    TEXT_UNIT_TABLE,
+    COMMUNITY_LEVEL,
+    SearchType,
+)
+from graphrag_ui.service.metrics_service import timed, observe_stage, stage_timing
+from graphrag_ui.service.execution_service import run_blocking
+from graphrag_ui.service.community_level_service import resolve_community_level
+from graphrag_ui.service.query_cache_service import get_context_builder
+from graphrag_ui.service.search_profile_service import (
+    SEARCH_PROFILES,
+    SearchProfile,
+    SearchProfileName,
+    resolve_search_profile,
+)
+from graphrag_ui.service.report_selection_service import (
+    ReportIndex,
+    ReportSelection,
+    build_report_index,
+    embed_texts,
+)
+from graphrag_ui.service.project_settings_service import (
+    read_project_settings,
+    ContextBackend,
+)
 
 
-COMMUNITY_REPORT_TABLE = "create_final_community_reports"
-ENTITY_TABLE = "create_final_nodes"
-ENTITY_EMBEDDING_TABLE = "create_final_entities"
-RELATIONSHIP_TABLE = "create_final_relationships"
-COVARIATE_TABLE = "create_final_covariates"
-TEXT_UNIT_TABLE = "create_final_text_units"
+@dataclass
+class FastGlobalSearchResult(GlobalSearchResult):
+    """The result of a fast global search with the selection of its reports."""
 
-# community level in the Leiden community hierarchy from which we will load the community reports
-# higher value means we use reports from more fine-grained communities (at the cost of higher computation cost)
-COMMUNITY_LEVEL = 2
+    report_selection: Optional[ReportSelection] = None
 
-token_encoder = tiktoken.get_encoding("cl100k_base")
 
+class TimedLLM:
+    """Times every call of the wrapped LLM as the stage 'llm'."""
 
-class SearchType(StrEnum):
-    GLOBAL = "global"
-    LOCAL = "local"
+    def __init__(self, llm):
+        self._llm = llm
 
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
 
-def load_project_data(project_dir: Path):
-    entity_df = pd.read_parquet(f"{project_dir}/output/{ENTITY_TABLE}.parquet")
-    entity_embedding_df = pd.read_parquet(
-        f"{project_dir}/output/{ENTITY_EMBEDDING_TABLE}.parquet"
-    )
-    report_df = pd.read_parquet(
-        f"{project_dir}/output/{COMMUNITY_REPORT_TABLE}.parquet"
-    )
+    def generate(self, *args, **kwargs):
+        with timed("llm"):
+            return self._llm.generate(*args, **kwargs)
+
+    async def agenerate(self, *args, **kwargs):
+        with timed("llm"):
+            return await self._llm.agenerate(*args, **kwargs)
+
+
+class TimedContextBuilder:
+    """Times the context builds of the wrapped builder as the stage 'build_context'."""
+
+    def __init__(self, context_builder):
+        self._context_builder = context_builder
+        self._prebuilt = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._context_builder, name)
+
+    async def prebuild_context(self, **kwargs):
+        """
+        Builds the context in the thread pool. The search engines call
+        build_context synchronously on the event loop, the next call returns
+        this context instead of building it again.
+        """
+        self._prebuilt = await run_blocking(self.build_context, **kwargs)
+
+    def build_context(self, *args, **kwargs):
+        if self._prebuilt is not None:
+            prebuilt, self._prebuilt = self._prebuilt, None
+            return prebuilt
+        with timed("build_context"):
+            return self._context_builder.build_context(*args, **kwargs)
+
+
+class MapReduceTimingCallback(GlobalSearchLLMCallback):
+    """Times the map and the reduce phase of a global search."""
+
+    def __init__(self):
+        super().__init__()
+        self.map_started_at = None
+        self.map_finished_at = None
+
+    def on_map_response_start(self, map_response_contexts: List[str]):
+        super().on_map_response_start(map_response_contexts)
+        self.map_started_at = time.perf_counter()
+
+    def on_map_response_end(self, map_response_outputs: List[SearchResult]):
+        super().on_map_response_end(map_response_outputs)
+        self.map_finished_at = time.perf_counter()
+        observe_stage("map", self.map_finished_at - self.map_started_at)
+
+    def on_search_end(self):
+        if self.map_finished_at is not None:
+            observe_stage("reduce", time.perf_counter() - self.map_finished_at)
 
-    reports = read_indexer_reports(report_df, entity_df, COMMUNITY_LEVEL)
-    entities = read_indexer_entities(entity_df, entity_embedding_df, COMMUNITY_LEVEL)
+
+def load_project_data(project_dir: Path, community_level: int = COMMUNITY_LEVEL):
+    with timed("load_project_data"):
+        entity_df = pd.read_parquet(f"{project_dir}/output/{ENTITY_TABLE}.parquet")
+        entity_embedding_df = pd.read_parquet(
+            f"{project_dir}/output/{ENTITY_EMBEDDING_TABLE}.parquet"
+        )
+        report_df = pd.read_parquet(
+            f"{project_dir}/output/{COMMUNITY_REPORT_TABLE}.parquet"
+        )
+
+        reports = read_indexer_reports(report_df, entity_df, community_level)
+        entities = read_indexer_entities(
+            entity_df, entity_embedding_df, community_level
+        )
 
     return reports, entities
 
@@ -78,8 +175,37 @@ def get_claims(project_dir: Path) -> Union[dict, None]:
     return None
 
 
-def build_local_context_builder(project_dir: Path) -> LocalSearchMixedContext:
-    reports, entities = load_project_data(project_dir)
+def create_text_embedder() -> OpenAIEmbedding:
+    return OpenAIEmbedding(
+        api_key=cfg.openai_api_key,
+        api_base=None,
+        api_type=OpenaiApiType.OpenAI,
+        model=cfg.open_ai_model_embedding,
+        deployment_name=cfg.open_ai_model_embedding,
+        max_retries=20,
+    )
+
+
+def build_local_context_builder(
+    project_dir: Path,
+    project_data: Optional[Tuple[list, list]] = None,
+    community_level: int = COMMUNITY_LEVEL,
+) -> LocalContextBuilder:
+    if read_project_settings(project_dir).context_backend == ContextBackend.NEO4J:
+        # Imported here, so that Neo4J is only needed by projects which use it
+        from graphrag_ui.service.neo4j_context_builder import Neo4jLocalSearchContext
+
+        return Neo4jLocalSearchContext(
+            project=project_dir.name,
+            text_embedder=create_text_embedder(),
+            token_encoder=cfg.token_encoder,
+            community_level=community_level,
+        )
+
+    # Imported here, so that lancedb is only loaded by local searches in memory
+    from graphrag.vector_stores.lancedb import LanceDBVectorStore
+
+    reports, entities = project_data or load_project_data(project_dir)
 
     # load description embeddings to an in-memory lancedb vectorstore
     # to connect to a remote db, specify url and port values.
@@ -102,14 +228,7 @@ def build_local_context_builder(project_dir: Path) -> LocalSearchMixedContext:
     text_unit_df = pd.read_parquet(f"{project_dir}/output/{TEXT_UNIT_TABLE}.parquet")
     text_units = read_indexer_text_units(text_unit_df)
 
-    text_embedder = OpenAIEmbedding(
-        api_key=cfg.openai_api_key,
-        api_base=None,
-        api_type=OpenaiApiType.OpenAI,
-        model=cfg.open_ai_model_embedding,
-        deployment_name=cfg.open_ai_model_embedding,
-        max_retries=20,
-    )
+    text_embedder = create_text_embedder()
 
     return LocalSearchMixedContext(
         community_reports=reports,
@@ -121,48 +240,112 @@ def build_local_context_builder(project_dir: Path) -> LocalSearchMixedContext:
         entity_text_embeddings=description_embedding_store,
         embedding_vectorstore_key=EntityVectorStoreKey.ID,  # if the vectorstore uses entity title as ids, set this to EntityVectorStoreKey.TITLE
         text_embedder=text_embedder,
-        token_encoder=token_encoder,
+        token_encoder=cfg.token_encoder,
     )
 
 
-def build_global_context_builder(project_dir: Path) -> GlobalCommunityContext:
-    reports, entities = load_project_data(project_dir)
+def build_global_context_builder(
+    project_dir: Path, project_data: Optional[Tuple[list, list]] = None
+) -> GlobalCommunityContext:
+    reports, entities = project_data or load_project_data(project_dir)
 
     return GlobalCommunityContext(
         community_reports=reports,
         entities=entities,  # default to None if you don't want to use community weights for ranking
-        token_encoder=token_encoder,
+        token_encoder=cfg.token_encoder,
     )
 
 
-def init_local_params() -> Tuple[dict, dict]:
+def build_context_builder(
+    project_dir: Path,
+    search_type: SearchType,
+    project_data: Tuple[list, list],
+    community_level: int = COMMUNITY_LEVEL,
+) -> Union[LocalContextBuilder, GlobalCommunityContext, ReportIndex]:
+    match search_type:
+        case SearchType.LOCAL:
+            return build_local_context_builder(
+                project_dir, project_data, community_level
+            )
+        case SearchType.GLOBAL:
+            return build_global_context_builder(project_dir, project_data)
+        case SearchType.FAST_GLOBAL:
+            return build_report_index(
+                project_dir, project_data or load_project_data(project_dir)
+            )
+        case _:
+            raise ValueError(f"Invalid search type: {search_type}")
+
+
+def init_local_params(profile: Optional[SearchProfile] = None) -> Tuple[dict, dict]:
+    profile = profile or SEARCH_PROFILES[SearchProfileName.BALANCED]
     local_context_params = {
         "text_unit_prop": 0.5,
         "community_prop": 0.1,
         "conversation_history_max_turns": 5,
         "conversation_history_user_turns_only": True,
-        "top_k_mapped_entities": 10,
-        "top_k_relationships": 10,
+        "top_k_mapped_entities": profile.top_k_mapped_entities,
+        "top_k_relationships": profile.top_k_relationships,
         "include_entity_rank": True,
         "include_relationship_weight": True,
         "include_community_rank": False,
         "return_candidate_context": False,
         "embedding_vectorstore_key": EntityVectorStoreKey.ID,  # set this to EntityVectorStoreKey.TITLE if the vectorstore uses entity title as ids
-        "max_tokens": 12_000,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 5000)
+        "max_tokens": profile.local_max_tokens,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 5000)
     }
 
     llm_params = {
-        "max_tokens": 2_000,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 1000=1500)
+        "max_tokens": profile.local_response_max_tokens,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 1000=1500)
         "temperature": 0.0,
     }
     return (local_context_params, llm_params)
 
 
+async def search_profile(
+    project_dir: Path, profile: Optional[SearchProfile]
+) -> SearchProfile:
+    """The profile of a search, by default the project's profile."""
+    if profile is not None:
+        return profile
+    return await run_blocking(resolve_search_profile, project_dir)
+
+
+async def search_community_level(
+    project_dir: Path, community_level: Optional[int], profile: SearchProfile
+) -> int:
+    """The community level of a search, by default the project's level."""
+    if community_level is not None:
+        return community_level
+    return await run_blocking(resolve_community_level, project_dir, None, profile)
+
+
 async def rag_local(query: str, project_dir: Path) -> str:
+    result = await search_local(query, project_dir)
+    return markdown(result.response)
+
 
-    context_builder = build_local_context_builder(project_dir)
+async def search_local(
+    query: str,
+    project_dir: Path,
+    community_level: Optional[int] = None,
+    profile: Optional[SearchProfile] = None,
+) -> SearchResult:
 
-    local_context_params, llm_params = init_local_params()
+    profile = await search_profile(project_dir, profile)
+    community_level = await search_community_level(
+        project_dir, community_level, profile
+    )
+    with timed("create_context_builder"):
+        context_builder = TimedContextBuilder(
+            await run_blocking(
+                get_context_builder, project_dir, SearchType.LOCAL, community_level
+            )
+        )
+
+    local_context_params, llm_params = init_local_params(profile)
+    await context_builder.prebuild_context(
+        query=query, conversation_history=None, **local_context_params
+    )
 
     # text_unit_prop: proportion of context window dedicated to related text units
     # community_prop: proportion of context window dedicated to community reports.
@@ -180,24 +363,29 @@ async def rag_local(query: str, project_dir: Path) -> str:
     # max_tokens: maximum number of tokens to use for the context window.
 
     search_engine = LocalSearch(
-        llm=cfg.llm,
+        llm=TimedLLM(cfg.llm),
         context_builder=context_builder,
-        token_encoder=token_encoder,
+        token_encoder=cfg.token_encoder,
         llm_params=llm_params,
         context_builder_params=local_context_params,
         response_type="multiple paragraphs",  # free form text describing the response type and format, can be anything, e.g. prioritized list, single paragraph, multiple paragraphs, multiple-page report
     )
 
-    result = await search_engine.asearch(query)
-    return markdown(result.response)
+    with timed("asearch"):
+        return await search_engine.asearch(query)
 
 
 async def rag_global(query: str, project_dir: Path) -> str:
+    result = await search_global(query, project_dir)
+    return markdown(result.response)
 
-    context_builder = build_global_context_builder(project_dir)
 
+def init_global_params(
+    profile: Optional[SearchProfile] = None,
+) -> Tuple[dict, dict, dict]:
+    profile = profile or SEARCH_PROFILES[SearchProfileName.BALANCED]
     context_builder_params = {
-        "use_community_summary": False,  # False means using full community reports. True means using community short summaries.
+        "use_community_summary": profile.use_community_summary,  # False means using full community reports. True means using community short summaries.
         "shuffle_data": True,
         "include_community_rank": True,
         "min_community_rank": 0,
@@ -205,55 +393,165 @@ async def rag_global(query: str, project_dir: Path) -> str:
         "include_community_weight": True,
         "community_weight_name": "occurrence weight",
         "normalize_community_weight": True,
-        "max_tokens": 12_000,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 5000)
+        "max_tokens": profile.global_max_tokens,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 5000)
         "context_name": "Reports",
     }
 
     map_llm_params = {
-        "max_tokens": 1000,
+        "max_tokens": profile.map_max_tokens,
         "temperature": 0.0,
         "response_format": {"type": "json_object"},
     }
 
     reduce_llm_params = {
-        "max_tokens": 2000,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 1000-1500)
+        "max_tokens": profile.reduce_max_tokens,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 1000-1500)
         "temperature": 0.0,
     }
+    return (context_builder_params, map_llm_params, reduce_llm_params)
 
+
+async def search_global(
+    query: str,
+    project_dir: Path,
+    community_level: Optional[int] = None,
+    profile: Optional[SearchProfile] = None,
+) -> GlobalSearchResult:
+
+    profile = await search_profile(project_dir, profile)
+    community_level = await search_community_level(
+        project_dir, community_level, profile
+    )
+    with timed("create_context_builder"):
+        context_builder = TimedContextBuilder(
+            await run_blocking(
+                get_context_builder, project_dir, SearchType.GLOBAL, community_level
+            )
+        )
+    return await map_reduce(query, context_builder, profile)
+
+
+async def search_fast_global(
+    query: str,
+    project_dir: Path,
+    community_level: Optional[int] = None,
+    profile: Optional[SearchProfile] = None,
+) -> FastGlobalSearchResult:
+    """A global search which only maps the reports most relevant to the query."""
+
+    profile = await search_profile(project_dir, profile)
+    community_level = await search_community_level(
+        project_dir, community_level, profile
+    )
+    with timed("create_context_builder"):
+        report_index: ReportIndex = await run_blocking(
+            get_context_builder, project_dir, SearchType.FAST_GLOBAL, community_level
+        )
+
+    with timed("embed_query"):
+        query_embedding = (await run_blocking(embed_texts, [query]))[0]
+    with timed("select_reports"):
+        reports, report_selection = report_index.select(
+            query_embedding,
+            max_tokens=profile.global_max_tokens,
+            use_summary=profile.use_community_summary,
+        )
+    # Built per search from the selected reports, which is cheap
+    context_builder = TimedContextBuilder(
+        GlobalCommunityContext(
+            community_reports=reports,
+            entities=report_index.entities,
+            token_encoder=cfg.token_encoder,
+        )
+    )
+    result = await map_reduce(query, context_builder, profile)
+    report_selection.map_calls = len(result.map_responses)
+    return FastGlobalSearchResult(**vars(result), report_selection=report_selection)
+
+
+async def map_reduce(
+    query: str, context_builder: TimedContextBuilder, profile: SearchProfile
+) -> GlobalSearchResult:
+    context_builder_params, map_llm_params, reduce_llm_params = init_global_params(
+        profile
+    )
+    await context_builder.prebuild_context(
+        conversation_history=None, **context_builder_params
+    )
+
+    map_reduce_timing = MapReduceTimingCallback()
     search_engine = GlobalSearch(
-        llm=cfg.llm,
+        llm=TimedLLM(cfg.llm),
         context_builder=context_builder,
-        token_encoder=token_encoder,
-        max_data_tokens=12_000,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 5000)
+        token_encoder=cfg.token_encoder,
+        max_data_tokens=profile.reduce_max_data_tokens,  # change this based on the token limit you have on your model (if you are using a model with 8k limit, a good setting could be 5000)
         map_llm_params=map_llm_params,
         reduce_llm_params=reduce_llm_params,
         allow_general_knowledge=False,  # set this to True will add instruction to encourage the LLM to incorporate general knowledge in the response, which may increase hallucinations, but could be useful in some use cases.
         json_mode=True,  # set this to False if your LLM model does not support JSON mode.
         context_builder_params=context_builder_params,
-        concurrent_coroutines=32,
+        concurrent_coroutines=profile.concurrent_coroutines,
         response_type="multiple paragraphs",  # free form text describing the response type and format, can be anything, e.g. prioritized list, single paragraph, multiple paragraphs, multiple-page report
+        callbacks=[map_reduce_timing],
     )
 
-    result = await search_engine.asearch(query)
-    return markdown(result.response)
+    with timed("asearch"):
+        result = await search_engine.asearch(query)
+    map_reduce_timing.on_search_end()
+    return result
 
 
 async def generate_questions(
     question_history: List[str], project_dir: Path
 ) -> List[str]:
-
-    context_builder = build_local_context_builder(project_dir)
-
-    local_context_params, llm_params = init_local_params()
-
-    question_generator = LocalQuestionGen(
-        llm=cfg.llm,
-        context_builder=context_builder,
-        token_encoder=token_encoder,
-        llm_params=llm_params,
-        context_builder_params=local_context_params,
-    )
-    return await execute_question_generation(question_history, question_generator)
+    result = await generate_question_result(question_history, project_dir)
+    return result.response
+
+
+async def generate_question_result(
+    question_history: List[str],
+    project_dir: Path,
+    community_level: Optional[int] = None,
+    profile: Optional[SearchProfile] = None,
+) -> QuestionResult:
+    with stage_timing("question_generation", project_dir.name, "questions") as timing:
+
+        profile = await search_profile(project_dir, profile)
+        community_level = await search_community_level(
+            project_dir, community_level, profile
+        )
+        with timed("create_context_builder"):
+            context_builder = TimedContextBuilder(
+                await run_blocking(
+                    get_context_builder,
+                    project_dir,
+                    SearchType.LOCAL,
+                    community_level,
+                )
+            )
+
+        local_context_params, llm_params = init_local_params(profile)
+        # The same query and history as LocalQuestionGen.agenerate builds it with
+        await context_builder.prebuild_context(
+            query=question_history[-1],
+            conversation_history=ConversationHistory.from_list(
+                [{"role": "user", "content": q} for q in question_history[:-1]]
+            ),
+            **local_context_params,
+        )
+
+        question_generator = LocalQuestionGen(
+            llm=TimedLLM(cfg.llm),
+            context_builder=context_builder,
+            token_encoder=cfg.token_encoder,
+            llm_params=llm_params,
+            context_builder_params=local_context_params,
+        )
+        with timed("agenerate"):
+            result = await question_generator.agenerate(
+                question_history=question_history, context_data=None, question_count=5
+            )
+        timing.record_usage(result)
+        return result
 
 
 async def execute_question_generation(
@@ -266,10 +564,32 @@ async def execute_question_generation(
 
 
 async def query_rag(query: str, project_dir: Path, search_type: SearchType) -> str:
-    match search_type:
-        case SearchType.GLOBAL:
-            return await rag_global(query, project_dir)
-        case SearchType.LOCAL:
-            return await rag_local(query, project_dir)
-        case _:
-            raise ValueError(f"Invalid search type: {search_type}")
+    result = await search_rag(query, project_dir, search_type)
+    return markdown(result.response)
+
+
+async def search_rag(
+    query: str,
+    project_dir: Path,
+    search_type: SearchType,
+    community_level: Optional[int] = None,
+    profile: Optional[SearchProfile] = None,
+) -> SearchResult:
+    with stage_timing("search", project_dir.name, search_type) as timing:
+        match search_type:
+            case SearchType.GLOBAL:
+                result = await search_global(
+                    query, project_dir, community_level, profile
+                )
+            case SearchType.FAST_GLOBAL:
+                result = await search_fast_global(
+                    query, project_dir, community_level, profile
+                )
+            case SearchType.LOCAL:
+                result = await search_local(
+                    query, project_dir, community_level, profile
+                )
+            case _:
+                raise ValueError(f"Invalid search type: {search_type}")
+        timing.record_usage(result)
+        return result
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 
 from pathlib import Path
@@ -9,14 +10,11 @@ import yaml
 
 import pandas as pd
 
-from graphrag.index.cli import _initialize_project_at
-from graphrag.index.progress.load_progress_reporter import load_progress_reporter
-from graphrag.index.progress.types import ReporterType
-
 from graphrag_ui.config import cfg
 from pydantic import BaseModel, Field
 
-from graphrag_ui.service.graphrag_query import COVARIATE_TABLE
+from graphrag_ui.service.graphrag_constants import COVARIATE_TABLE
+from graphrag_ui.service.metrics_service import stage_timing
 
 
 class ProjectStatus(Enum):
@@ -42,31 +40,40 @@ class Project(BaseModel):
 
 
 def graphrag_init(input_dir: Path):
-    subprocess.call(
-        ["python", "-m", "graphrag.index", "--init", "--root", input_dir.as_posix()]
-    )
+    with stage_timing("init", input_dir.name):
+        subprocess.call(
+            ["python", "-m", "graphrag.index", "--init", "--root", input_dir.as_posix()]
+        )
 
 
 def graphrag_index(input_dir: Path):
     # python -m graphrag.index --root $env:CONTENT_ROOT
-    subprocess.call(["python", "-m", "graphrag.index", "--root", input_dir.as_posix()])
+    with stage_timing("index", input_dir.name):
+        subprocess.call(
+            ["python", "-m", "graphrag.index", "--root", input_dir.as_posix()]
+        )
 
 
-def graphrag_prompt_tuning(input_dir: Path):
+def graphrag_prompt_tuning(input_dir: Path, output: str = "prompts"):
     settings_file = input_dir / "settings.yaml"
     assert settings_file.exists(), "Settings file not found"
-    subprocess.call(
-        [
-            "python",
-            "-m",
-            "graphrag.prompt_tune",
-            "--no-entity-types",
-            "--root",
-            input_dir.as_posix(),
-            "--config",
-            settings_file.as_posix(),
-        ]
-    )
+    with stage_timing("prompt_tuning", input_dir.name):
+        return_code = subprocess.call(
+            [
+                "python",
+                "-m",
+                "graphrag.prompt_tune",
+                "--no-entity-types",
+                "--root",
+                input_dir.as_posix(),
+                "--config",
+                settings_file.as_posix(),
+                "--output",
+                output,
+            ]
+        )
+    if return_code != 0:
+        raise RuntimeError(f"Prompt tuning failed with exit code {return_code}")
 
 
 def get_project_status(project_dir: Path) -> ProjectStatus:
@@ -122,6 +129,18 @@ def list_output_files(project_dir: Path) -> List[Path]:
     return list((project_dir / "output").glob("*.parquet"))
 
 
+def get_index_version(project_dir: Path) -> str:
+    """
+    Identifies the current index of a project. The version changes whenever
+    one of the output files is written again.
+    """
+    sha = hashlib.sha256()
+    for output_file in sorted(list_output_files(project_dir)):
+        stat = output_file.stat()
+        sha.update(f"{output_file.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return sha.hexdigest()[:16]
+
+
 def list_columns(file: Path) -> Tuple[List[str], str]:
     if file.suffix != ".parquet" or not file.exists():
         return []
@@ -0,0 +1,89 @@
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.logger_factory import logger
+
+
+class JobStatus(Enum):
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class Job(BaseModel):
+    id: str = Field(..., description="The unique identifier of the job")
+    name: str = Field(
+        ..., description="The name of the job, e.g. 'prompt-tuning:<project>'"
+    )
+    status: JobStatus = Field(JobStatus.RUNNING, description="The job status")
+    message: str = Field("", description="The last status or error message")
+    progress: Dict[str, Any] = Field(
+        default_factory=dict, description="Arbitrary progress data of the job"
+    )
+    result: Any = Field(None, description="The result returned by the job")
+    started_at: float = Field(default_factory=time.time)
+    finished_at: Optional[float] = Field(None)
+
+    @property
+    def done(self) -> bool:
+        return self.status != JobStatus.RUNNING
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="graphrag-ui-job")
+_jobs: Dict[str, Job] = {}
+_jobs_by_name: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def submit_job(name: str, func: Callable[..., Any], *args, **kwargs) -> Job:
+    """
+    Runs func in the background job pool. Only one job with the same name
+    runs at a time: submitting a running job again returns the existing one.
+    Only the latest job of a name is kept, so that repeated jobs like the
+    preloads do not accumulate.
+    The job object is passed to func as the keyword argument 'job' so that
+    the function can report progress.
+    """
+    with _lock:
+        existing = find_job(name)
+        if existing is not None and not existing.done:
+            return existing
+        if existing is not None:
+            del _jobs[existing.id]
+        job = Job(id=uuid.uuid4().hex, name=name)
+        _jobs[job.id] = job
+        _jobs_by_name[name] = job.id
+
+    def run():
+        try:
+            job.result = func(*args, job=job, **kwargs)
+            job.status = JobStatus.FINISHED
+        except Exception as e:
+            logger.exception(f"Job {name} failed")
+            job.message = str(e)
+            job.status = JobStatus.FAILED
+        finally:
+            job.finished_at = time.time()
+
+    _executor.submit(run)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    return _jobs.get(job_id)
+
+
+def find_job(name: str) -> Optional[Job]:
+    job_id = _jobs_by_name.get(name)
+    return _jobs.get(job_id) if job_id is not None else None
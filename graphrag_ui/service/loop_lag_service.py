@@ -0,0 +1,144 @@
+"""
+Measures how long the event loop is blocked: a task sleeps for a fixed
+interval and records by how much it wakes up late. While a handler blocks
+the loop, e.g. with a synchronous parquet read, no other request is served.
+
+With a threshold, a watchdog thread also logs the stack of the event loop
+thread while it is blocked for longer, which shows the blocking code.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from collections import deque
+from typing import Deque, Optional
+
+import numpy as np
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.metrics_service import Counter, Histogram, register
+
+# Seconds between the probes of the event loop
+PROBE_INTERVAL = 0.05
+# Number of recent probes kept for the percentiles
+MAX_SAMPLES = 100_000
+
+LOOP_LAG_SECONDS = register(
+    Histogram(
+        "graphrag_ui_event_loop_lag_seconds",
+        "How late the event loop probe woke up",
+        buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    )
+)
+LOOP_BLOCKS = register(
+    Counter(
+        "graphrag_ui_event_loop_blocks_total",
+        "Times the event loop was blocked for longer than the threshold",
+    )
+)
+
+
+class LoopLagStats(BaseModel):
+    samples: int = Field(0, description="The number of probes")
+    p50_ms: float = Field(0, description="The median lag in milliseconds")
+    p99_ms: float = Field(0, description="The 99th percentile lag in milliseconds")
+    max_ms: float = Field(0, description="The longest lag in milliseconds")
+    blocked_ms: float = Field(
+        0, description="The total lag, i.e. the time the loop was blocked"
+    )
+
+
+class LoopLagMonitor:
+    def __init__(
+        self,
+        interval_s: float = PROBE_INTERVAL,
+        block_threshold_s: Optional[float] = None,
+    ):
+        self.interval_s = interval_s
+        self.block_threshold_s = block_threshold_s
+        self._lags: Deque[float] = deque(maxlen=MAX_SAMPLES)
+        self._max = 0.0
+        self._total = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._loop_thread: Optional[int] = None
+        # When the probe last went to sleep, read by the watchdog
+        self._last_probe = time.monotonic()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Starts probing the running event loop, if not done already."""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_probe = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        if self.block_threshold_s is not None:
+            threading.Thread(
+                target=self._watch,
+                args=(self._task,),
+                name="loop-watchdog",
+                daemon=True,
+            ).start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def observe(self, lag_s: float):
+        self._lags.append(lag_s)
+        self._max = max(self._max, lag_s)
+        self._total += lag_s
+        LOOP_LAG_SECONDS.observe(lag_s)
+        if self.block_threshold_s is not None and lag_s > self.block_threshold_s:
+            LOOP_BLOCKS.inc()
+            logger.warning(f"The event loop was blocked for {lag_s * 1000:.0f} ms")
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            self._last_probe = time.monotonic()
+            await asyncio.sleep(self.interval_s)
+            self.observe(max(0.0, loop.time() - start - self.interval_s))
+
+    def _watch(self, task: asyncio.Task):
+        reported = None
+        while not task.done():
+            time.sleep(self.block_threshold_s / 2)
+            last_probe = self._last_probe
+            late = time.monotonic() - last_probe - self.interval_s
+            if late > self.block_threshold_s and reported != last_probe:
+                # Only once per blocking, the probe logs how long it lasted
+                reported = last_probe
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    logger.warning(
+                        f"The event loop has been blocked for {late * 1000:.0f} ms in:\n"
+                        + "".join(traceback.format_stack(frame))
+                    )
+
+    def stats(self) -> LoopLagStats:
+        if not self._lags:
+            return LoopLagStats()
+        lags_ms = np.array(self._lags) * 1000
+        return LoopLagStats(
+            samples=len(lags_ms),
+            p50_ms=round(float(np.percentile(lags_ms, 50)), 2),
+            p99_ms=round(float(np.percentile(lags_ms, 99)), 2),
+            max_ms=round(self._max * 1000, 2),
+            blocked_ms=round(self._total * 1000, 2),
+        )
+
+    def reset(self):
+        self._lags.clear()
+        self._max = 0.0
+        self._total = 0.0
@@ -0,0 +1,129 @@
+"""
+Estimates the memory held by the loaded search data of a project, broken down
+into its components. The objects are measured with sys.getsizeof, following
+containers and object attributes. Of long lists only a sample is measured and
+the result is extrapolated, so that measuring a project of thousands of
+entities takes tens of milliseconds instead of seconds.
+"""
+
+import sys
+
+from enum import StrEnum
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Number of items of a list which are measured
+SAMPLE_SIZE = 200
+# Attributes of the graphrag model objects which hold embedding vectors
+EMBEDDING_ATTRIBUTES = {
+    "description_embedding",
+    "name_embedding",
+    "graph_embedding",
+    "summary_embedding",
+    "full_content_embedding",
+    "text_embedding",
+}
+ATOMIC_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+class MemoryComponent(StrEnum):
+    ENTITIES = "entities"
+    EMBEDDINGS = "embeddings"
+    REPORTS = "reports"
+    RELATIONSHIPS = "relationships"
+    TEXT_UNITS = "text_units"
+    COVARIATES = "covariates"
+
+
+def sample(items: List[Any]) -> Tuple[List[Any], float]:
+    """A sample of the items spread over the list and the factor to extrapolate it."""
+    if len(items) <= SAMPLE_SIZE:
+        return items, 1.0
+    step = len(items) / SAMPLE_SIZE
+    return [items[int(i * step)] for i in range(SAMPLE_SIZE)], step
+
+
+def deep_size(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """The size of the object and of everything it refers to, counted once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, ATOMIC_TYPES):
+        return sys.getsizeof(obj)
+    if isinstance(obj, np.ndarray):
+        # A view refers to the data of its base
+        return sys.getsizeof(obj) + (
+            0 if obj.base is None else deep_size(obj.base, seen)
+        )
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(deep=True)))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        items = [*obj.keys(), *obj.values()]
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(obj)
+    elif hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+        items = list(vars(obj).values())
+    else:
+        items = []
+    measured, factor = sample(items)
+    return size + int(sum(deep_size(item, seen) for item in measured) * factor)
+
+
+def split_size(objects: Iterable[Any], seen: Set[int]) -> Tuple[int, int]:
+    """The size of the model objects without and the size of their embeddings."""
+    measured, factor = sample(list(objects))
+    data, embeddings = 0, 0
+    for obj in measured:
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        data += sys.getsizeof(obj)
+        attributes = vars(obj) if hasattr(obj, "__dict__") else {}
+        data += sys.getsizeof(attributes)
+        for name, value in attributes.items():
+            if name in EMBEDDING_ATTRIBUTES:
+                embeddings += deep_size(value, seen)
+            else:
+                data += deep_size(value, seen)
+    return int(data * factor), int(embeddings * factor)
+
+
+def measure_footprint(
+    project_data: Tuple[list, list], context_builders: Iterable[Any]
+) -> Dict[MemoryComponent, int]:
+    """
+    The estimated bytes per component of a loaded project. The tables which
+    only the local search loads are taken from its context builder.
+    """
+    reports, entities = project_data
+    context_builders = list(context_builders)
+    relationships, text_units, covariates = [], [], []
+    for context_builder in context_builders:
+        relationships += list(getattr(context_builder, "relationships", {}).values())
+        text_units += list(getattr(context_builder, "text_units", {}).values())
+        for claims in getattr(context_builder, "covariates", {}).values():
+            covariates += claims
+    seen: Set[int] = set()
+    footprint = {component: 0 for component in MemoryComponent}
+    for context_builder in context_builders:
+        # The report embeddings of the fast global search
+        if hasattr(context_builder, "report_embeddings"):
+            footprint[MemoryComponent.EMBEDDINGS] += deep_size(
+                context_builder.report_embeddings, seen
+            )
+    for component, objects in [
+        (MemoryComponent.ENTITIES, entities),
+        (MemoryComponent.REPORTS, reports),
+        (MemoryComponent.RELATIONSHIPS, relationships),
+        (MemoryComponent.TEXT_UNITS, text_units),
+        (MemoryComponent.COVARIATES, covariates),
+    ]:
+        data, embeddings = split_size(objects, seen)
+        footprint[component] += data
+        footprint[MemoryComponent.EMBEDDINGS] += embeddings
+    return footprint
@@ -0,0 +1,293 @@
+"""
+Times the stages of searches and indexing runs and renders them, with the
+other metrics of the app, in the Prometheus text format.
+
+Stages are timed with timed() inside a stage_timing() block, which labels
+them with the project and the search type and logs a timing line per search
+or indexing run.
+"""
+
+import json
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.logger_factory import timing_logger
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# From fast context builds up to indexing runs of an hour
+STAGE_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+    600,
+    1800,
+    3600,
+)
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self.label_values(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = STAGE_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Bucket counts, sum and count by label values
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.label_values(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[float, int]]:
+        """The sum and the count of the observations by label values."""
+        with self._lock:
+            return {key: (s, n) for key, (_, s, n) in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(c), s, n) for key, (c, s, n) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                bucket_labels = {**labels, "le": format_value(bound)}
+                yield f"{self.name}_bucket", bucket_labels, bucket_count
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+_metrics: List[Metric] = []
+_collectors: List[Callable[[], Iterable[Metric]]] = []
+
+
+def register(metric: Metric) -> Metric:
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(collector: Callable[[], Iterable[Metric]]):
+    """Registers a function which returns metrics created when they are rendered."""
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics + [m for c in _collectors for m in c()]:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = register(
+    Histogram(
+        "graphrag_ui_stage_seconds",
+        "Duration of the stages of searches and indexing runs",
+        ["stage", "project", "search_type"],
+    )
+)
+LLM_CALLS = register(
+    Counter(
+        "graphrag_ui_llm_calls_total",
+        "LLM calls made by searches",
+        ["project", "search_type"],
+    )
+)
+PROMPT_TOKENS = register(
+    Counter(
+        "graphrag_ui_prompt_tokens_total",
+        "Prompt tokens sent by searches",
+        ["project", "search_type"],
+    )
+)
+
+
+class StageTiming(BaseModel):
+    project: str = Field(..., description="The name of the project")
+    search_type: str = Field("", description="The search type, if it is a search")
+    seconds: Dict[str, float] = Field(
+        default_factory=dict, description="The summed duration of each stage"
+    )
+    counts: Dict[str, int] = Field(
+        default_factory=dict, description="How often each stage ran"
+    )
+    llm_calls: int = Field(0, description="The LLM calls reported by graphrag")
+    prompt_tokens: int = Field(0, description="The prompt tokens reported by graphrag")
+
+    def add(self, stage: str, seconds: float):
+        self.seconds[stage] = self.seconds.get(stage, 0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def record_usage(self, result):
+        self.llm_calls = getattr(result, "llm_calls", 0) or 0
+        self.prompt_tokens = getattr(result, "prompt_tokens", 0) or 0
+        LLM_CALLS.inc(
+            self.llm_calls, project=self.project, search_type=self.search_type
+        )
+        PROMPT_TOKENS.inc(
+            self.prompt_tokens, project=self.project, search_type=self.search_type
+        )
+
+    def log_line(self, name: str) -> str:
+        fields = [f"project={json.dumps(self.project)}"]
+        if self.search_type:
+            fields.append(f"search_type={self.search_type}")
+        for stage, seconds in self.seconds.items():
+            count = self.counts[stage]
+            fields.append(
+                f"{stage}={seconds:.3f}"
+                + (f" {stage}_count={count}" if count > 1 else "")
+            )
+        if self.search_type:
+            fields.append(f"llm_calls={self.llm_calls}")
+            fields.append(f"prompt_tokens={self.prompt_tokens}")
+        return f"{name} " + " ".join(fields)
+
+
+_timing: ContextVar[Optional[StageTiming]] = ContextVar("timing", default=None)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Observes a stage of the current stage_timing block."""
+    timing = _timing.get()
+    if timing is None:
+        return
+    STAGE_SECONDS.observe(
+        seconds, stage=stage, project=timing.project, search_type=timing.search_type
+    )
+    timing.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str, project: Optional[str] = None, search_type: str = ""):
+    """
+    Observes the duration of the block as a stage of the current stage_timing
+    block or, outside of one, with the given labels.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if project is None and _timing.get() is not None:
+            observe_stage(stage, seconds)
+        else:
+            STAGE_SECONDS.observe(
+                seconds, stage=stage, project=project or "", search_type=search_type
+            )
+
+
+@contextmanager
+def stage_timing(name: str, project: str, search_type: str = ""):
+    """
+    Collects the stages timed in the block and logs them in one line when it
+    ends. The whole block is observed as the stage name.
+    """
+    timing = StageTiming(project=project, search_type=str(search_type))
+    token = _timing.set(timing)
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        seconds = time.perf_counter() - start
+        _timing.reset(token)
+        STAGE_SECONDS.observe(
+            seconds, stage=name, project=project, search_type=timing.search_type
+        )
+        timing.add("total", seconds)
+        timing_logger.info(timing.log_line(name))
@@ -0,0 +1,153 @@
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, List, Union
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from graphrag_ui.service.project_settings_service import UI_FOLDER
+
+CHECKPOINT_FILE = f"{UI_FOLDER}/neo4j_checkpoint.json"
+# Guards the checkpoint, which is updated by the import workers of all stages
+_lock = threading.RLock()
+
+# The fields of neo4j.SummaryCounters which are aggregated per stage
+COUNTER_FIELDS = [
+    "nodes_created",
+    "nodes_deleted",
+    "relationships_created",
+    "relationships_deleted",
+    "properties_set",
+    "labels_added",
+    "labels_removed",
+]
+
+
+class StageProgress(BaseModel):
+    completed: bool = Field(False, description="True if the whole stage is done")
+    batch_size: int = Field(0, description="The batch size the batches were read with")
+    rows: int = Field(0, description="The number of rows written so far")
+    committed_below: int = Field(
+        0, description="All batches with a lower index are committed"
+    )
+    committed: List[int] = Field(
+        default_factory=list,
+        description="Committed batches at or above committed_below",
+    )
+    counters: Dict[str, int] = Field(
+        default_factory=dict, description="The aggregated Neo4J summary counters"
+    )
+    seconds: float = Field(0, description="The time spent in finished runs")
+    _checkpoint: Union["ImportCheckpoint", None] = PrivateAttr(None)
+    _started_at: Union[float, None] = PrivateAttr(None)
+
+    @property
+    def running(self) -> bool:
+        return self._started_at is not None
+
+    @property
+    def elapsed(self) -> float:
+        running_s = time.time() - self._started_at if self.running else 0
+        return self.seconds + running_s
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0
+
+    def begin(self):
+        self._started_at = time.time()
+
+    def finish(self):
+        if self.running:
+            self.seconds = self.elapsed
+            self._started_at = None
+
+    def start(self, batch_size: int):
+        """Forgets the committed batches if they were read with another batch size."""
+        with _lock:
+            if self.batch_size != batch_size:
+                self.batch_size = batch_size
+                self.committed_below = 0
+                self.committed = []
+
+    def is_committed(self, batch_index: int) -> bool:
+        return batch_index < self.committed_below or batch_index in self.committed
+
+    def commit(self, batch_index: int, rows: int, counters=None):
+        """Records a committed batch and saves the checkpoint."""
+        with _lock:
+            self.rows += rows
+            committed = set(self.committed)
+            committed.add(batch_index)
+            while self.committed_below in committed:
+                committed.remove(self.committed_below)
+                self.committed_below += 1
+            self.committed = sorted(committed)
+            self.add_counters(counters)
+        if self._checkpoint is not None:
+            self._checkpoint.save()
+
+    def add_counters(self, counters):
+        """Adds neo4j.SummaryCounters or a dict of counters to the totals."""
+        if counters is None:
+            return
+        with _lock:
+            for field in COUNTER_FIELDS:
+                value = (
+                    counters.get(field, 0)
+                    if isinstance(counters, dict)
+                    else getattr(counters, field, 0)
+                )
+                self.counters[field] = self.counters.get(field, 0) + value
+
+
+class ImportCheckpoint(BaseModel):
+    index_version: str = Field(..., description="The index version being imported")
+    stages: Dict[str, StageProgress] = Field(default_factory=dict)
+    _file: Union[Path, None] = PrivateAttr(None)
+
+    def stage(self, name: str) -> StageProgress:
+        with _lock:
+            if name not in self.stages:
+                self.stages[name] = StageProgress()
+            progress = self.stages[name]
+            progress._checkpoint = self
+            return progress
+
+    def complete_stage(self, name: str):
+        self.stage(name).completed = True
+        self.save()
+
+    def save(self):
+        if self._file is None:
+            return
+        with _lock:
+            content = self.model_dump_json(indent=2)
+            tmp_file = self._file.with_suffix(".tmp")
+            tmp_file.write_text(content, "utf-8")
+            tmp_file.replace(self._file)
+
+
+def load_checkpoint(project_dir: Path, index_version: str) -> ImportCheckpoint:
+    """
+    Loads the checkpoint of an interrupted import of the same index version,
+    or starts a new one.
+    """
+    checkpoint_file = project_dir / CHECKPOINT_FILE
+    checkpoint = None
+    if checkpoint_file.exists():
+        checkpoint = ImportCheckpoint.model_validate_json(
+            checkpoint_file.read_text("utf-8")
+        )
+        if checkpoint.index_version != index_version:
+            checkpoint = None
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(index_version=index_version)
+    checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+    checkpoint._file = checkpoint_file
+    return checkpoint
+
+
+def remove_checkpoint(project_dir: Path):
+    (project_dir / CHECKPOINT_FILE).unlink(missing_ok=True)
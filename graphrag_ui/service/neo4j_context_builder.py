@@ -0,0 +1,273 @@
+from typing import Any, List, Tuple
+
+import pandas as pd
+import tiktoken
+
+from graphrag.query.context_builder.builders import LocalContextBuilder
+from graphrag.query.context_builder.conversation_history import ConversationHistory
+from graphrag.query.llm.base import BaseTextEmbedding
+
+from graphrag_ui.config import cfg
+from graphrag_ui.service.graphrag_constants import COMMUNITY_LEVEL
+from graphrag_ui.service.neo4j_service import ENTITY_VECTOR_INDEX
+
+# The vector index cannot filter by project, so more candidates are fetched
+# than needed and the ones of other projects are dropped.
+VECTOR_OVERSAMPLING = 10
+
+ENTITY_COLUMNS = """
+RETURN e.id AS id, e.human_readable_id AS human_readable_id, e.name AS entity,
+       e.description AS description, COUNT { (e)-[:RELATED]-() } AS rank
+"""
+
+ENTITY_QUERY = (
+    """
+CALL db.index.vector.queryNodes($index, $candidates, $embedding) YIELD node, score
+WHERE node.project = $project
+WITH node AS e, score ORDER BY score DESC LIMIT $top_k
+"""
+    + ENTITY_COLUMNS
+)
+
+# If the candidates hold too few entities of the project, like for a small
+# project next to large ones, the entities of the project are compared with the
+# query one by one
+PROJECT_ENTITY_QUERY = (
+    """
+MATCH (e:__Entity__ {project: $project})
+WHERE e.description_embedding IS NOT NULL
+WITH e, vector.similarity.cosine(e.description_embedding, $embedding) AS score
+ORDER BY score DESC LIMIT $top_k
+"""
+    + ENTITY_COLUMNS
+)
+
+RELATIONSHIP_QUERY = """
+MATCH (e:__Entity__ {project: $project})-[r:RELATED]-(other:__Entity__)
+WHERE e.id IN $ids
+WITH DISTINCT r, other.id IN $ids AS in_network
+RETURN r.human_readable_id AS id, startNode(r).name AS source, endNode(r).name AS target,
+       r.description AS description, r.weight AS weight, r.rank AS rank, in_network
+ORDER BY in_network DESC, r.rank DESC, r.weight DESC
+LIMIT $limit
+"""
+
+# Like read_indexer_reports, only the deepest community of every entity up to
+# the community level is used
+REPORT_QUERY = """
+MATCH (e:__Entity__ {project: $project})-[:IN_COMMUNITY]->(c:__Community__)
+WHERE e.id IN $ids AND toInteger(c.level) <= $level
+WITH e, c ORDER BY toInteger(c.level) DESC, toInteger(c.community) DESC
+WITH e, head(collect(c)) AS c
+WHERE c.full_content IS NOT NULL
+RETURN c.community AS id, c.title AS title, c.summary AS summary,
+       c.full_content AS content, c.rank AS rank, count(e) AS matches
+ORDER BY matches DESC, rank DESC
+"""
+
+TEXT_UNIT_QUERY = """
+MATCH (c:__Chunk__)-[:HAS_ENTITY]->(e:__Entity__ {project: $project})
+WHERE e.id IN $ids
+RETURN c.id AS id, c.text AS text, count(e) AS matches
+ORDER BY matches DESC
+"""
+
+CLAIM_QUERY = """
+MATCH (c:__Covariate__ {project: $project})
+WHERE c.subject_id IN $names
+RETURN c.human_readable_id AS id, c.subject_id AS entity, c.object_id AS object,
+       c.type AS type, c.status AS status, c.description AS description
+"""
+
+
+class Neo4jLocalSearchContext(LocalContextBuilder):
+    """
+    Builds the local search context from a project which was synced to Neo4J,
+    instead of loading all output tables into memory. The entities are found
+    with the Neo4J vector index, or among the entities of the project if the
+    index finds too few of them, and their neighborhood is fetched with a few
+    Cypher queries. The reports are those of the community level, as in the
+    context built in memory.
+    """
+
+    def __init__(
+        self,
+        project: str,
+        text_embedder: BaseTextEmbedding,
+        token_encoder: tiktoken.Encoding,
+        community_level: int = COMMUNITY_LEVEL,
+    ):
+        self.project = project
+        self.text_embedder = text_embedder
+        self.token_encoder = token_encoder
+        self.community_level = community_level
+
+    def build_context(
+        self,
+        query: str,
+        conversation_history: ConversationHistory | None = None,
+        conversation_history_max_turns: int | None = 5,
+        conversation_history_user_turns_only: bool = True,
+        max_tokens: int = 8000,
+        text_unit_prop: float = 0.5,
+        community_prop: float = 0.25,
+        top_k_mapped_entities: int = 10,
+        top_k_relationships: int = 10,
+        use_community_summary: bool = False,
+        column_delimiter: str = "|",
+        **kwargs: Any,
+    ) -> Tuple[str, dict[str, pd.DataFrame]]:
+        if community_prop + text_unit_prop > 1:
+            raise ValueError(
+                "The sum of community_prop and text_unit_prop should not exceed 1."
+            )
+        final_context = []
+        final_context_data = {}
+        if conversation_history:
+            pre_user_questions = "\n".join(
+                conversation_history.get_user_turns(conversation_history_max_turns)
+            )
+            query = f"{query}\n{pre_user_questions}"
+            history_context, history_context_data = conversation_history.build_context(
+                include_user_turns_only=conversation_history_user_turns_only,
+                max_qa_turns=conversation_history_max_turns,
+                column_delimiter=column_delimiter,
+                max_tokens=max_tokens,
+                recency_bias=False,
+            )
+            if history_context.strip() != "":
+                final_context.append(history_context)
+                final_context_data = history_context_data
+                max_tokens -= self._num_tokens(history_context)
+
+        embedding = self.text_embedder.embed(query)
+        entities = self._run(
+            ENTITY_QUERY,
+            index=ENTITY_VECTOR_INDEX,
+            candidates=top_k_mapped_entities * VECTOR_OVERSAMPLING,
+            embedding=embedding,
+            top_k=top_k_mapped_entities,
+        )
+        if len(entities) < top_k_mapped_entities:
+            entities = self._run(
+                PROJECT_ENTITY_QUERY,
+                embedding=embedding,
+                top_k=top_k_mapped_entities,
+            )
+        if len(entities) == 0:
+            return "", {}
+        ids = entities["id"].tolist()
+
+        community_tokens = max(int(max_tokens * community_prop), 0)
+        reports = self._run(REPORT_QUERY, ids=ids, level=self.community_level)
+        if len(reports) > 0:
+            reports["content"] = (
+                reports["summary"] if use_community_summary else reports["content"]
+            )
+        self._add_section(
+            final_context,
+            final_context_data,
+            "Reports",
+            reports,
+            ["id", "title", "content"],
+            community_tokens,
+            column_delimiter,
+        )
+
+        local_tokens = max(int(max_tokens * (1 - community_prop - text_unit_prop)), 0)
+        relationships = self._run(
+            RELATIONSHIP_QUERY,
+            ids=ids,
+            limit=top_k_relationships * len(ids),
+        )
+        claims = self._run(CLAIM_QUERY, names=entities["entity"].tolist())
+        for name, df, columns in [
+            (
+                "Entities",
+                entities.drop(columns=["id"]).rename(
+                    columns={
+                        "human_readable_id": "id",
+                        "rank": "number of relationships",
+                    }
+                ),
+                ["id", "entity", "description", "number of relationships"],
+            ),
+            (
+                "Relationships",
+                relationships,
+                ["id", "source", "target", "description", "weight"],
+            ),
+            (
+                "Claims",
+                claims,
+                ["id", "entity", "object", "type", "status", "description"],
+            ),
+        ]:
+            local_tokens -= self._add_section(
+                final_context,
+                final_context_data,
+                name,
+                df,
+                columns,
+                local_tokens,
+                column_delimiter,
+            )
+
+        text_unit_tokens = max(int(max_tokens * text_unit_prop), 0)
+        text_units = self._run(TEXT_UNIT_QUERY, ids=ids)
+        self._add_section(
+            final_context,
+            final_context_data,
+            "Sources",
+            text_units,
+            ["id", "text"],
+            text_unit_tokens,
+            column_delimiter,
+        )
+        return "\n\n".join(final_context), final_context_data
+
+    def _run(self, query: str, **parameters) -> pd.DataFrame:
+        records, _, keys = cfg.neo4j.driver.execute_query(
+            query,
+            project=self.project,
+            database_=cfg.neo4j.neo4j_database,
+            **parameters,
+        )
+        return pd.DataFrame([r.values() for r in records], columns=keys)
+
+    def _num_tokens(self, text: str) -> int:
+        return len(self.token_encoder.encode(text))
+
+    def _add_section(
+        self,
+        final_context: List[str],
+        final_context_data: dict,
+        name: str,
+        df: pd.DataFrame,
+        columns: List[str],
+        max_tokens: int,
+        column_delimiter: str,
+    ) -> int:
+        """
+        Adds rows of df as a table to the context until max_tokens is reached.
+        Returns the number of tokens used.
+        """
+        if len(df) == 0:
+            return 0
+        header = f"-----{name}-----\n" + column_delimiter.join(columns)
+        lines = [header]
+        tokens = self._num_tokens(header)
+        included = 0
+        for row in df[columns].itertuples(index=False):
+            line = column_delimiter.join("" if v is None else str(v) for v in row)
+            line_tokens = self._num_tokens(line)
+            if tokens + line_tokens > max_tokens:
+                break
+            lines.append(line)
+            tokens += line_tokens
+            included += 1
+        if included == 0:
+            return 0
+        final_context.append("\n".join(lines))
+        final_context_data[name.lower()] = df.head(included)
+        return tokens
@@ -0,0 +1,692 @@
+"""
+Exports the graphrag output of a project to the CSV layout of
+`neo4j-admin database import`, which is much faster than the Cypher import
+for very large projects. The offline import replaces the whole database, so
+it is meant for a database which only holds this project.
+
+Usage:
+
+python -m graphrag_ui.service.neo4j_export_service <project>
+neo4j-admin database import full --overwrite-destination @<project>/.graphrag_ui/neo4j_import/import.args neo4j
+"""
+
+import csv
+import multiprocessing
+import shutil
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.config import cfg
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.graphrag_service import get_index_version
+from graphrag_ui.service.neo4j_service import (
+    COMMUNITY_COLUMNS,
+    COMMUNITY_REPORT_COLUMNS,
+    COVARIATE_EXCLUDED_COLUMNS,
+    DOCUMENT_COLUMNS,
+    ENTITY_CLEAN_COLUMNS,
+    ENTITY_COLUMNS,
+    RELATIONSHIP_CLEAN_COLUMNS,
+    RELATIONSHIP_COLUMNS,
+    TEXT_UNIT_COLUMNS,
+    content_hash,
+    create_path,
+    read_parquet_batches,
+    read_record_batches,
+)
+from graphrag_ui.service.project_settings_service import UI_FOLDER
+
+EXPORT_FOLDER = f"{UI_FOLDER}/neo4j_import"
+EXPORT_BATCH_SIZE = 10_000
+ARRAY_DELIMITER = ";"
+# Stored as float32 arrays like db.create.setNodeVectorProperty does
+EMBEDDING_TYPE = "float[]"
+
+
+class ExportFile(BaseModel):
+    kind: str = Field(..., description="Either nodes or relationships")
+    label: str = Field(..., description="The node label or the relationship type")
+    header_file: Path = Field(..., description="The CSV file with the header")
+    data_file: Path = Field(..., description="The CSV file with the data")
+    rows: int = Field(0, description="The number of rows in the data file")
+
+    @property
+    def argument(self) -> str:
+        return f"--{self.kind}={self.label}={self.header_file},{self.data_file}"
+
+
+class CsvTable:
+    """
+    Writes a header file and a data file for neo4j-admin import. The data is
+    appended batch by batch with the pyarrow CSV writer, and list columns are
+    joined with the array delimiter.
+    """
+
+    def __init__(
+        self, target_dir: Path, name: str, kind: str, label: str, header: List[str]
+    ):
+        self.header = header
+        self.export_file = ExportFile(
+            kind=kind,
+            label=label,
+            header_file=target_dir / f"{name}.header.csv",
+            data_file=target_dir / f"{name}.csv",
+        )
+        with open(self.export_file.header_file, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(header)
+        self.schema = pa.schema([(f"c{i}", pa.string()) for i in range(len(header))])
+        self.writer = pa_csv.CSVWriter(
+            self.export_file.data_file,
+            self.schema,
+            write_options=pa_csv.WriteOptions(include_header=False),
+        )
+
+    def write(self, columns: List[pa.Array]):
+        assert len(columns) == len(self.header)
+        record_batch = pa.RecordBatch.from_arrays(
+            [to_csv_array(column) for column in columns], schema=self.schema
+        )
+        self.writer.write_batch(record_batch)
+        self.export_file.rows += len(record_batch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.writer.close()
+
+
+def to_csv_array(array) -> pa.Array:
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    if pa.types.is_list(array.type) or pa.types.is_large_list(array.type):
+        return pc.binary_join(pc.cast(array, pa.list_(pa.string())), ARRAY_DELIMITER)
+    return pc.cast(array, pa.string())
+
+
+def neo4j_type(data_type: pa.DataType) -> str:
+    if pa.types.is_list(data_type) or pa.types.is_large_list(data_type):
+        return f"{neo4j_type(data_type.value_type)}[]"
+    if pa.types.is_integer(data_type):
+        return "long"
+    if pa.types.is_float32(data_type) or pa.types.is_float16(data_type):
+        return "float"
+    if pa.types.is_floating(data_type):
+        return "double"
+    if pa.types.is_boolean(data_type):
+        return "boolean"
+    return "string"
+
+
+def typed_header(name: str, data_type: pa.DataType) -> str:
+    type_name = neo4j_type(data_type)
+    return name if type_name == "string" else f"{name}:{type_name}"
+
+
+def constant(value: str, length: int) -> pa.Array:
+    return pa.array([value] * length, pa.string())
+
+
+def content_hashes(record_batch: pa.RecordBatch) -> pa.Array:
+    # Same records as read_parquet_batches, so that a later sync sees no change
+    return pa.array(
+        [content_hash(r) for r in record_batch.to_pandas().to_dict("records")],
+        pa.string(),
+    )
+
+
+def explode(
+    record_batch: pa.RecordBatch, id_column: str, list_column: str
+) -> Tuple[pa.Array, pa.Array]:
+    """Returns (id, element) pairs for every element of a list column."""
+    lists = record_batch.column(list_column)
+    elements = pc.list_flatten(lists)
+    ids = pc.take(
+        pc.cast(record_batch.column(id_column), pa.string()),
+        pc.list_parent_indices(lists),
+    )
+    return ids, pc.cast(elements, pa.string())
+
+
+def lookup(keys: pa.Array, key_index: pa.Array, values: pa.Array) -> pa.Array:
+    return pc.take(values, pc.index_in(keys, value_set=key_index))
+
+
+def read_entity_ids(input_dir: Path) -> Tuple[pa.Array, pa.Array]:
+    """Returns the cleaned entity names and their ids."""
+    names, ids = [], []
+    for record_batch in read_record_batches(
+        create_path(input_dir, "create_final_entities"),
+        columns=["name", "id"],
+        batch_size=EXPORT_BATCH_SIZE,
+        clean_columns=["name"],
+    ):
+        names.append(record_batch.column("name"))
+        ids.append(pc.cast(record_batch.column("id"), pa.string()))
+    return (
+        pa.concat_arrays(names) if names else pa.array([], pa.string()),
+        pa.concat_arrays(ids) if ids else pa.array([], pa.string()),
+    )
+
+
+def entity_endpoints(
+    record_batch: pa.RecordBatch, names: pa.Array, ids: pa.Array
+) -> Tuple[pa.Array, pa.Array, pa.Array]:
+    """
+    Returns the source and target entity ids of the relationships in the
+    batch, with a mask of the relationships whose entities exist.
+    """
+    start_ids = lookup(record_batch.column("source"), names, ids)
+    end_ids = lookup(record_batch.column("target"), names, ids)
+    mask = pc.and_(pc.is_valid(start_ids), pc.is_valid(end_ids))
+    return start_ids, end_ids, mask
+
+
+def export_documents(
+    input_dir: Path, target_dir: Path, batch_size: int
+) -> List[ExportFile]:
+    project = input_dir.name
+    file = create_path(input_dir, "create_final_documents")
+    with CsvTable(
+        target_dir,
+        "documents",
+        "nodes",
+        "__Document__",
+        [":ID(Document)", "project", "id", "title", "documents_hash"],
+    ) as documents:
+        for record_batch in read_record_batches(file, DOCUMENT_COLUMNS, batch_size):
+            rows = len(record_batch)
+            documents.write(
+                [
+                    record_batch.column("id"),
+                    constant(project, rows),
+                    record_batch.column("id"),
+                    record_batch.column("title"),
+                    content_hashes(record_batch),
+                ]
+            )
+    return [documents.export_file]
+
+
+def export_text_units(
+    input_dir: Path, target_dir: Path, batch_size: int
+) -> List[ExportFile]:
+    project = input_dir.name
+    file = create_path(input_dir, "create_final_text_units")
+    with CsvTable(
+        target_dir,
+        "chunks",
+        "nodes",
+        "__Chunk__",
+        [":ID(Chunk)", "project", "id", "text", "n_tokens:long", "text_units_hash"],
+    ) as chunks, CsvTable(
+        target_dir,
+        "part_of",
+        "relationships",
+        "PART_OF",
+        [":START_ID(Chunk)", ":END_ID(Document)"],
+    ) as part_of:
+        for record_batch in read_record_batches(file, TEXT_UNIT_COLUMNS, batch_size):
+            rows = len(record_batch)
+            chunks.write(
+                [
+                    record_batch.column("id"),
+                    constant(project, rows),
+                    record_batch.column("id"),
+                    record_batch.column("text"),
+                    record_batch.column("n_tokens"),
+                    content_hashes(record_batch),
+                ]
+            )
+            part_of.write(list(explode(record_batch, "id", "document_ids")))
+    return [chunks.export_file, part_of.export_file]
+
+
+def export_entities(
+    input_dir: Path, target_dir: Path, batch_size: int
+) -> List[ExportFile]:
+    project = input_dir.name
+    file = create_path(input_dir, "create_final_entities")
+    with CsvTable(
+        target_dir,
+        "entities",
+        "nodes",
+        "__Entity__",
+        [
+            ":ID(Entity)",
+            "project",
+            "id",
+            "name",
+            "description",
+            "human_readable_id:long",
+            f"description_embedding:{EMBEDDING_TYPE}",
+            "entities_hash",
+            ":LABEL",
+        ],
+    ) as entities, CsvTable(
+        target_dir,
+        "has_entity",
+        "relationships",
+        "HAS_ENTITY",
+        [":START_ID(Chunk)", ":END_ID(Entity)"],
+    ) as has_entity:
+        for record_batch in read_record_batches(
+            file, ENTITY_COLUMNS, batch_size, clean_columns=ENTITY_CLEAN_COLUMNS
+        ):
+            rows = len(record_batch)
+            # The entity type becomes an additional label
+            types = pc.replace_substring(record_batch.column("type"), ";", "_")
+            labels = pc.if_else(pc.equal(types, ""), None, types)
+            entities.write(
+                [
+                    record_batch.column("id"),
+                    constant(project, rows),
+                    record_batch.column("id"),
+                    record_batch.column("name"),
+                    record_batch.column("description"),
+                    record_batch.column("human_readable_id"),
+                    record_batch.column("description_embedding"),
+                    content_hashes(record_batch),
+                    labels,
+                ]
+            )
+            entity_ids, text_unit_ids = explode(record_batch, "id", "text_unit_ids")
+            has_entity.write([text_unit_ids, entity_ids])
+    return [entities.export_file, has_entity.export_file]
+
+
+def export_relationships(
+    input_dir: Path, target_dir: Path, batch_size: int
+) -> List[ExportFile]:
+    file = create_path(input_dir, "create_final_relationships")
+    names, ids = read_entity_ids(input_dir)
+    with CsvTable(
+        target_dir,
+        "related",
+        "relationships",
+        "RELATED",
+        [
+            ":START_ID(Entity)",
+            ":END_ID(Entity)",
+            "id",
+            "rank:long",
+            "weight:double",
+            "human_readable_id:long",
+            "description",
+            "text_unit_ids:string[]",
+            "relationships_hash",
+        ],
+    ) as related:
+        for record_batch in read_record_batches(
+            file,
+            RELATIONSHIP_COLUMNS,
+            batch_size,
+            clean_columns=RELATIONSHIP_CLEAN_COLUMNS,
+        ):
+            hashes = content_hashes(record_batch)
+            start_ids, end_ids, mask = entity_endpoints(record_batch, names, ids)
+            related.write(
+                [
+                    pc.filter(column, mask)
+                    for column in [
+                        start_ids,
+                        end_ids,
+                        record_batch.column("id"),
+                        record_batch.column("rank"),
+                        record_batch.column("weight"),
+                        record_batch.column("human_readable_id"),
+                        record_batch.column("description"),
+                        record_batch.column("text_unit_ids"),
+                        hashes,
+                    ]
+                ]
+            )
+    return [related.export_file]
+
+
+def read_community_reports(input_dir: Path) -> Dict[str, dict]:
+    file = create_path(input_dir, "create_final_community_reports")
+    reports = {}
+    if not file.exists():
+        return reports
+    for batch in read_parquet_batches(
+        file, COMMUNITY_REPORT_COLUMNS, EXPORT_BATCH_SIZE
+    ):
+        for record in batch:
+            record["content_hash"] = content_hash(record)
+            reports[str(record["community"])] = record
+    return reports
+
+
+def read_relationship_endpoints(input_dir: Path) -> Tuple[pa.Array, pa.Array, pa.Array]:
+    """Returns the relationship ids with the ids of their source and target entities."""
+    names, ids = read_entity_ids(input_dir)
+    relationship_ids, start_ids, end_ids = [], [], []
+    for record_batch in read_record_batches(
+        create_path(input_dir, "create_final_relationships"),
+        columns=["id", "source", "target"],
+        batch_size=EXPORT_BATCH_SIZE,
+        clean_columns=RELATIONSHIP_CLEAN_COLUMNS,
+    ):
+        start, end, mask = entity_endpoints(record_batch, names, ids)
+        relationship_ids.append(
+            pc.filter(pc.cast(record_batch.column("id"), pa.string()), mask)
+        )
+        start_ids.append(pc.filter(start, mask))
+        end_ids.append(pc.filter(end, mask))
+    if len(relationship_ids) == 0:
+        return tuple(pa.array([], pa.string()) for _ in range(3))
+    return (
+        pa.concat_arrays(relationship_ids),
+        pa.concat_arrays(start_ids),
+        pa.concat_arrays(end_ids),
+    )
+
+
+def export_communities(
+    input_dir: Path, target_dir: Path, batch_size: int
+) -> List[ExportFile]:
+    project = input_dir.name
+    file = create_path(input_dir, "create_final_communities")
+    reports = read_community_reports(input_dir)
+    relationship_ids, start_ids, end_ids = read_relationship_endpoints(input_dir)
+    community_type = pq.read_schema(file).field("id").type
+    report_columns = [
+        ("rank", pa.float64()),
+        ("rank_explanation", pa.string()),
+        ("full_content", pa.string()),
+        ("summary", pa.string()),
+        ("community_reports_hash", pa.string()),
+    ]
+    with CsvTable(
+        target_dir,
+        "communities",
+        "nodes",
+        "__Community__",
+        [
+            ":ID(Community)",
+            "project",
+            typed_header("community", community_type),
+            "level:long",
+            "title",
+            "communities_hash",
+            *[typed_header(name, data_type) for name, data_type in report_columns],
+        ],
+    ) as communities, CsvTable(
+        target_dir,
+        "findings",
+        "nodes",
+        "Finding",
+        [":ID(Finding)", "project", "id:long", "summary", "explanation"],
+    ) as findings, CsvTable(
+        target_dir,
+        "has_finding",
+        "relationships",
+        "HAS_FINDING",
+        [":START_ID(Community)", ":END_ID(Finding)"],
+    ) as has_finding, CsvTable(
+        target_dir,
+        "in_community",
+        "relationships",
+        "IN_COMMUNITY",
+        [":START_ID(Entity)", ":END_ID(Community)"],
+    ) as in_community:
+
+        def write_findings(community_ids: List[str]):
+            finding_rows = [
+                (community_id, idx, finding)
+                for community_id in community_ids
+                if reports.get(community_id, {}).get("findings") is not None
+                for idx, finding in enumerate(reports[community_id]["findings"])
+            ]
+            finding_ids = pa.array([f"{c}:{i}" for c, i, _ in finding_rows])
+            findings.write(
+                [
+                    finding_ids,
+                    constant(project, len(finding_rows)),
+                    pa.array([i for _, i, _ in finding_rows], pa.int64()),
+                    pa.array([f.get("summary") for _, _, f in finding_rows]),
+                    pa.array([f.get("explanation") for _, _, f in finding_rows]),
+                ]
+            )
+            has_finding.write(
+                [pa.array([c for c, _, _ in finding_rows], pa.string()), finding_ids]
+            )
+
+        def report_arrays(community_ids: List[str]) -> List[pa.Array]:
+            community_reports = [reports.get(c, {}) for c in community_ids]
+            return [
+                pa.array(
+                    [
+                        r.get("content_hash" if name.endswith("_hash") else name)
+                        for r in community_reports
+                    ],
+                    data_type,
+                )
+                for name, data_type in report_columns
+            ]
+
+        exported = set()
+        for record_batch in read_record_batches(file, COMMUNITY_COLUMNS, batch_size):
+            community_ids = pc.cast(record_batch.column("id"), pa.string())
+            ids = community_ids.to_pylist()
+            exported.update(ids)
+            report_levels = [reports.get(c, {}).get("level") for c in ids]
+            report_titles = [reports.get(c, {}).get("title") for c in ids]
+            communities.write(
+                [
+                    community_ids,
+                    constant(project, len(ids)),
+                    record_batch.column("id"),
+                    pc.coalesce(
+                        pa.array(report_levels, record_batch.column("level").type),
+                        record_batch.column("level"),
+                    ),
+                    pc.coalesce(
+                        pa.array(report_titles, pa.string()),
+                        record_batch.column("title"),
+                    ),
+                    content_hashes(record_batch),
+                    *report_arrays(ids),
+                ]
+            )
+            write_findings(ids)
+            # Both entities of every relationship in the community, once each
+            members, member_relationships = explode(
+                record_batch, "id", "relationship_ids"
+            )
+            pairs = pa.table(
+                {
+                    "entity": pa.concat_arrays(
+                        [
+                            lookup(member_relationships, relationship_ids, start_ids),
+                            lookup(member_relationships, relationship_ids, end_ids),
+                        ]
+                    ),
+                    "community": pa.concat_arrays([members, members]),
+                }
+            )
+            pairs = pairs.filter(pc.is_valid(pairs["entity"]))
+            pairs = pairs.group_by(["entity", "community"]).aggregate([])
+            in_community.write([pairs["entity"], pairs["community"]])
+
+        # Reports of communities which are not in the communities table
+        remaining = [c for c in reports if c not in exported]
+        if len(remaining) > 0:
+            communities.write(
+                [
+                    pa.array(remaining),
+                    constant(project, len(remaining)),
+                    pa.array(
+                        [reports[c]["community"] for c in remaining], community_type
+                    ),
+                    pa.array([reports[c]["level"] for c in remaining], pa.int64()),
+                    pa.array([reports[c]["title"] for c in remaining], pa.string()),
+                    pa.nulls(len(remaining), pa.string()),
+                    *report_arrays(remaining),
+                ]
+            )
+            write_findings(remaining)
+    return [
+        communities.export_file,
+        findings.export_file,
+        has_finding.export_file,
+        in_community.export_file,
+    ]
+
+
+def export_covariates(
+    input_dir: Path, target_dir: Path, batch_size: int
+) -> List[ExportFile]:
+    project = input_dir.name
+    file = create_path(input_dir, "create_final_covariates")
+    if not file.exists():
+        return []
+    schema = pq.read_schema(file)
+    properties = [
+        field
+        for field in schema
+        if field.name not in COVARIATE_EXCLUDED_COLUMNS and field.name != "id"
+    ]
+    with CsvTable(
+        target_dir,
+        "covariates",
+        "nodes",
+        "__Covariate__",
+        [
+            ":ID(Covariate)",
+            "project",
+            typed_header("id", schema.field("id").type),
+            *[typed_header(field.name, field.type) for field in properties],
+            "covariates_hash",
+        ],
+    ) as covariates, CsvTable(
+        target_dir,
+        "has_covariate",
+        "relationships",
+        "HAS_COVARIATE",
+        [":START_ID(Chunk)", ":END_ID(Covariate)"],
+    ) as has_covariate:
+        for record_batch in read_record_batches(file, batch_size=batch_size):
+            rows = len(record_batch)
+            covariates.write(
+                [
+                    record_batch.column("id"),
+                    constant(project, rows),
+                    record_batch.column("id"),
+                    *[record_batch.column(field.name) for field in properties],
+                    content_hashes(record_batch),
+                ]
+            )
+            has_covariate.write(
+                [record_batch.column("text_unit_id"), record_batch.column("id")]
+            )
+    return [covariates.export_file, has_covariate.export_file]
+
+
+EXPORTS = [
+    export_documents,
+    export_text_units,
+    export_entities,
+    export_relationships,
+    export_communities,
+    export_covariates,
+]
+
+
+def export_project_node(input_dir: Path, target_dir: Path) -> ExportFile:
+    # Marks the index as synced, so that the next sync only writes the changes
+    with CsvTable(
+        target_dir,
+        "project",
+        "nodes",
+        "__Project__",
+        [":ID(Project)", "name", "index_version", "synced_at:datetime"],
+    ) as project:
+        project.write(
+            [
+                pa.array([input_dir.name]),
+                pa.array([input_dir.name]),
+                pa.array([get_index_version(input_dir)]),
+                pa.array([datetime.now(timezone.utc).isoformat()]),
+            ]
+        )
+    return project.export_file
+
+
+def write_import_arguments(target_dir: Path, export_files: List[ExportFile]) -> Path:
+    arguments = [
+        "--id-type=string",
+        f"--array-delimiter={ARRAY_DELIMITER}",
+        "--multiline-fields=true",
+        "--ignore-empty-strings=true",
+        *[f.argument for f in export_files],
+    ]
+    arguments_file = target_dir / "import.args"
+    arguments_file.write_text("\n".join(arguments) + "\n", "utf-8")
+    return arguments_file
+
+
+def export_project(
+    project_name: str,
+    target_dir: Path = None,
+    workers: int = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> List[ExportFile]:
+    """
+    Writes the nodes and relationships of a project as CSV files for
+    neo4j-admin import, one table per process. Returns the written files.
+    """
+    input_dir = cfg.project_dir / project_name
+    if not (input_dir / "output").exists():
+        raise ValueError(f"{project_name} has no output to export.")
+    target_dir = target_dir or input_dir / EXPORT_FOLDER
+    shutil.rmtree(target_dir, ignore_errors=True)
+    target_dir.mkdir(parents=True)
+    start_s = time.time()
+    export_files = [export_project_node(input_dir, target_dir)]
+    # Spawned processes, as the parent process may hold Neo4J driver threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [
+            executor.submit(export, input_dir, target_dir, batch_size)
+            for export in EXPORTS
+        ]
+        for future in futures:
+            export_files.extend(future.result())
+    for export_file in export_files:
+        logger.info(
+            f"Exported {export_file.rows} {export_file.label} {export_file.kind}."
+        )
+    arguments_file = write_import_arguments(target_dir, export_files)
+    logger.info(
+        f"Exported {project_name} in {time.time() - start_s:.2f} s. Import it with: "
+        f"neo4j-admin database import full --overwrite-destination @{arguments_file} "
+        f"{cfg.neo4j.neo4j_database}"
+    )
+    return export_files
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Exports a project for neo4j-admin database import"
+    )
+    parser.add_argument("project", help="The name of the project")
+    parser.add_argument("--output", type=Path, help="The folder to write the files to")
+    parser.add_argument("--workers", type=int, help="The number of processes")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    export_project(args.project, args.output, args.workers, args.batch_size)
@@ -1,147 +1,714 @@
+import hashlib
+import queue
+import random
+import threading
 import time
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
 
 from graphrag_ui.config import cfg
 from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.graphrag_service import get_index_version
+from graphrag_ui.service.job_service import Job
+from graphrag_ui.service.neo4j_checkpoint_service import (
+    ImportCheckpoint,
+    StageProgress,
+    load_checkpoint,
+    remove_checkpoint,
+)
+from graphrag_ui.service.project_settings_service import update_project_settings
+
+# Size of the read buffer used when streaming parquet files
+PARQUET_BUFFER_SIZE = 8 * 2**20
+# Marks the end of the batches in the import queue
+_END_OF_BATCHES = object()
+# Errors after which the same batch can simply be written again
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+
+def iter_dataframe_batches(
+    df: pd.DataFrame, batch_size: int = 1000
+) -> Iterator[List[dict]]:
+    total = len(df)
+    for start in range(0, total, batch_size):
+        yield df.iloc[start : min(start + batch_size, total)].to_dict("records")
+
 
+def read_record_batches(
+    file: Path,
+    columns: List[str] = None,
+    batch_size: int = 1000,
+    clean_columns: List[str] = (),
+) -> Iterator[pa.RecordBatch]:
+    """
+    Streams the record batches of a parquet file, so that memory use depends
+    on the batch size and not on the size of the table.
+    The double quotes which graphrag leaves around names are removed from the
+    clean_columns here, so that Neo4J can look the names up in its indexes.
+    """
+    # A read buffer streams the column chunks instead of loading whole row groups
+    parquet_file = pq.ParquetFile(
+        file, buffer_size=PARQUET_BUFFER_SIZE, pre_buffer=False
+    )
+    try:
+        for record_batch in parquet_file.iter_batches(
+            batch_size=batch_size, columns=columns
+        ):
+            if len(clean_columns) > 0:
+                record_batch = pa.RecordBatch.from_arrays(
+                    [
+                        (
+                            pc.replace_substring(array, '"', "")
+                            if name in clean_columns
+                            else array
+                        )
+                        for name, array in zip(
+                            record_batch.schema.names, record_batch.columns
+                        )
+                    ],
+                    names=record_batch.schema.names,
+                )
+            yield record_batch
+    finally:
+        parquet_file.close()
+
+
+def read_parquet_batches(
+    file: Path,
+    columns: List[str] = None,
+    batch_size: int = 1000,
+    clean_columns: List[str] = (),
+) -> Iterator[List[dict]]:
+    """
+    Streams the record batches of a parquet file as lists of records.
+    List columns, like the embeddings, are kept as numpy arrays as they are
+    much more compact than lists of Python floats.
+    """
+    for record_batch in read_record_batches(file, columns, batch_size, clean_columns):
+        yield record_batch.to_pandas().to_dict("records")
+
+
+def with_retries(
+    func: Callable[[], Any],
+    description: str,
+    stop: threading.Event = None,
+    max_retries: int = None,
+    backoff_s: float = None,
+) -> Any:
+    """
+    Calls func and calls it again with exponential backoff if it fails with
+    a transient error, like a deadlock or a lost connection.
+    """
+    max_retries = cfg.neo4j.import_max_retries if max_retries is None else max_retries
+    backoff_s = cfg.neo4j.import_retry_backoff if backoff_s is None else backoff_s
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except RETRYABLE_ERRORS as e:
+            if attempt >= max_retries or (stop is not None and stop.is_set()):
+                raise
+            delay = backoff_s * 2**attempt * random.uniform(0.5, 1.5)
+            attempt += 1
+            logger.warning(
+                f"{description} failed ({e}), retry {attempt} of {max_retries} in {delay:.1f} s."
+            )
+            if stop is None:
+                time.sleep(delay)
+            elif stop.wait(delay):
+                raise
 
 
 def batched_import(
-    statement: str, df: pd.DataFrame, batch_size: int = 1000
+    statement: str,
+    rows: Union[pd.DataFrame, Iterable[List[dict]]],
+    batch_size: int = 1000,
+    stage: str = "import",
+    parameters: dict = None,
+    progress: StageProgress = None,
 ) -> int:
     """
-    Imports a dataframe into Neo4j in batches to optimize performance and prevent
+    Imports data into Neo4j in batches to optimize performance and prevent
     memory overload for large datasets.
 
+    The batches are produced by a reader thread into a bounded queue and
+    written concurrently by a pool of workers, each with its own session, so
+    that reading the data overlaps with the Neo4j writes.
+
     Parameters:
     ----------
     statement : str
         The Cypher query to execute for each batch of data. This query should be
         constructed with placeholders for the data that will be UNWOUND.
 
-    df : pd.DataFrame
-        The dataframe to be imported into Neo4j, where each row represents a record.
+    rows : pd.DataFrame or iterable of record lists
+        The data to be imported into Neo4j. Either a dataframe, where each row
+        represents a record, or an iterable of batches of records.
 
     batch_size : int, optional, default=1000
-        The number of rows to process in each batch. Adjust this size based on
-        performance considerations for your system.
+        The number of rows to process in each batch when a dataframe is passed.
+        Adjust this size based on performance considerations for your system.
+
+    stage : str, optional
+        The name of the import stage, used for logging.
+
+    parameters : dict, optional
+        Additional query parameters, like the project name.
+
+    progress : StageProgress, optional
+        Records every committed batch together with the summary counters.
+        Batches which were committed by an interrupted import are skipped, so
+        the batches need to be produced in the same order again.
 
     Returns:
     -------
     total : int
-        The total number of rows processed.
+        The total number of rows written by this call.
     """
-    total = len(df)
+    batches = (
+        iter_dataframe_batches(rows, batch_size)
+        if isinstance(rows, pd.DataFrame)
+        else rows
+    )
+    progress = progress if progress is not None else StageProgress()
+    workers = max(1, cfg.neo4j.import_workers)
+    batch_queue = queue.Queue(maxsize=cfg.neo4j.import_queue_size)
+    stop = threading.Event()
+    total = 0
+    total_lock = threading.Lock()
+    query = "UNWIND $rows AS value " + statement
+    parameters = parameters or {}
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for batch_index, batch in enumerate(batches):
+                if progress.is_committed(batch_index):
+                    continue
+                if len(batch) == 0:
+                    # Committed as well, so that committed_below keeps moving up
+                    progress.commit(batch_index, 0)
+                    continue
+                if not put((batch_index, batch)):
+                    return
+        finally:
+            for _ in range(workers):
+                put(_END_OF_BATCHES)
+
+    def write_batch(tx, batch: List[dict]):
+        return tx.run(query, parameters, rows=batch).consume()
+
+    def write(batch: List[dict]):
+        # A new session per attempt, as a session does not survive a lost connection
+        with cfg.neo4j.driver.session(database=cfg.neo4j.neo4j_database) as session:
+            return session.execute_write(write_batch, batch)
+
+    def consume():
+        nonlocal total
+        while not stop.is_set():
+            try:
+                item = batch_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _END_OF_BATCHES:
+                return
+            batch_index, batch = item
+            try:
+                summary = with_retries(
+                    lambda: write(batch), f"{stage} batch {batch_index}", stop
+                )
+            except Exception:
+                stop.set()
+                raise
+            logger.debug(summary.counters)
+            progress.commit(batch_index, len(batch), summary.counters)
+            with total_lock:
+                total += len(batch)
+
     start_s = time.time()
-    for start in range(0, total, batch_size):
-        batch = df.iloc[start : min(start + batch_size, total)]
-        result = cfg.neo4j.driver.execute_query(
-            "UNWIND $rows AS value " + statement,
-            rows=batch.to_dict("records"),
-            database_=cfg.neo4j.neo4j_database,
-        )
-        logger.info(result.summary.counters)
-    logger.info(f"{total} rows in { time.time() - start_s} s.")
+    with ThreadPoolExecutor(
+        max_workers=workers + 1, thread_name_prefix=f"neo4j-{stage}"
+    ) as executor:
+        producer = executor.submit(produce)
+        consumers = [executor.submit(consume) for _ in range(workers)]
+        done, _ = wait([producer, *consumers], return_when=FIRST_EXCEPTION)
+        for future in done:
+            if future.exception() is not None:
+                stop.set()
+                raise future.exception()
+    elapsed = time.time() - start_s
+    logger.info(
+        f"{stage}: {total} rows in {elapsed:.2f} s ({total / max(elapsed, 1e-6):.0f} rows/s)."
+    )
     return total
 
 
-def create_constraints():
-    statements = """
-create constraint chunk_id if not exists for (c:__Chunk__) require c.id is unique;
-create constraint document_id if not exists for (d:__Document__) require d.id is unique;
-create constraint entity_id if not exists for (c:__Community__) require c.community is unique;
-create constraint entity_id if not exists for (e:__Entity__) require e.id is unique;
-create constraint entity_title if not exists for (e:__Entity__) require e.name is unique;
-create constraint entity_title if not exists for (e:__Covariate__) require e.title is unique;
-create constraint related_id if not exists for ()-[rel:RELATED]->() require rel.id is unique;
-""".split(
-        ";"
-    )
+ENTITY_VECTOR_INDEX = "entity_description_embedding"
+
+SCHEMA_STATEMENTS = """
+drop constraint chunk_id if exists;
+drop constraint document_id if exists;
+drop constraint entity_id if exists;
+drop constraint entity_title if exists;
+drop constraint related_id if exists;
+create constraint project_name if not exists for (p:__Project__) require p.name is unique;
+create constraint document_project_id if not exists for (d:__Document__) require (d.project, d.id) is unique;
+create constraint chunk_project_id if not exists for (c:__Chunk__) require (c.project, c.id) is unique;
+create constraint entity_project_id if not exists for (e:__Entity__) require (e.project, e.id) is unique;
+create constraint community_project_community if not exists for (c:__Community__) require (c.project, c.community) is unique;
+create constraint covariate_project_id if not exists for (c:__Covariate__) require (c.project, c.id) is unique;
+create index entity_project_name if not exists for (e:__Entity__) on (e.project, e.name);
+create index finding_project_id if not exists for (f:Finding) on (f.project, f.id);
+create index document_project if not exists for (d:__Document__) on (d.project);
+create index chunk_project if not exists for (c:__Chunk__) on (c.project);
+create index entity_project if not exists for (e:__Entity__) on (e.project);
+create index community_project if not exists for (c:__Community__) on (c.project);
+create index covariate_project if not exists for (c:__Covariate__) on (c.project);
+create index finding_project if not exists for (f:Finding) on (f.project);
+create index covariate_project_subject if not exists for (c:__Covariate__) on (c.project, c.subject_id);
+create index related_id if not exists for ()-[rel:RELATED]-() on (rel.id);
+"""
+
 
+def read_embedding_dimensions(input_dir: Path) -> Union[int, None]:
+    file = create_path(input_dir, "create_final_entities")
+    if not file.exists():
+        return None
+    parquet_file = pq.ParquetFile(file)
+    try:
+        for record_batch in parquet_file.iter_batches(
+            batch_size=16, columns=["description_embedding"]
+        ):
+            for embedding in record_batch.column(0).to_pylist():
+                if embedding:
+                    return len(embedding)
+    finally:
+        parquet_file.close()
+    return None
+
+
+def provision_schema(input_dir: Path):
+    """
+    Creates the constraints and lookup indexes used by the importers and by
+    the queries, as well as a vector index over the entity description
+    embeddings. Waits until all indexes are online.
+    """
+    start_s = time.time()
+    statements = SCHEMA_STATEMENTS.split(";")
+    dimensions = read_embedding_dimensions(input_dir)
+    if dimensions is not None:
+        statements.append(
+            f"""
+create vector index {ENTITY_VECTOR_INDEX} if not exists
+for (e:__Entity__) on e.description_embedding
+options {{indexConfig: {{`vector.dimensions`: {dimensions}, `vector.similarity_function`: 'cosine'}}}}
+"""
+        )
     for statement in statements:
         if len((statement or "").strip()) > 0:
             logger.info(statement)
-            cfg.neo4j.driver.execute_query(statement)
-
-
-def clear_db():
-    queries = ["match (a) -[r] -> () delete a, r", "match (a) delete a"]
-    for q in queries:
-        cfg.neo4j.driver.execute_query(
-            q,
+            cfg.neo4j.driver.execute_query(
+                statement, database_=cfg.neo4j.neo4j_database
+            )
+    with cfg.neo4j.driver.session(database=cfg.neo4j.neo4j_database) as session:
+        session.run("CALL db.awaitIndexes(600)").consume()
+    logger.info(f"Provisioned the schema in {time.time() - start_s:.2f} s.")
+
+
+# Labels of the project nodes in the order in which they are deleted. Densely
+# connected nodes like documents and communities come last, when most of
+# their relationships are already gone.
+PROJECT_LABELS = [
+    "Finding",
+    "__Covariate__",
+    "__Entity__",
+    "__Chunk__",
+    "__Community__",
+    "__Document__",
+]
+
+
+def count_project_data(project_name: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Counts the nodes and outgoing relationships of a project per label.
+    """
+    counts = {}
+    for label in PROJECT_LABELS:
+        records, _, _ = cfg.neo4j.driver.execute_query(
+            f"""
+MATCH (n:`{label}` {{project: $project}})
+RETURN count(n) AS nodes, sum(COUNT {{ (n)-->() }}) AS relationships
+""",
+            project=project_name,
             database_=cfg.neo4j.neo4j_database,
         )
+        counts[label] = (records[0]["nodes"], records[0]["relationships"])
+    return counts
+
+
+def clear_db(
+    project_name: str, batch_size: int = 10_000, dry_run: bool = False
+) -> Dict[str, int]:
+    """
+    Deletes the data of a project in batches, so that each transaction only
+    holds a bounded number of nodes and their relationships. The synced index
+    version in the project settings and the checkpoint of an interrupted sync
+    are removed as well, so that the next sync starts over.
+
+    Parameters:
+    ----------
+    project_name : str
+        The name of the project whose nodes are deleted.
+
+    batch_size : int, optional, default=10000
+        The number of nodes deleted per transaction.
+
+    dry_run : bool, optional, default=False
+        If True, only counts what would be deleted.
+
+    Returns:
+    -------
+    deleted : dict
+        The number of deleted (or, in a dry run, matching) nodes per label.
+    """
+    counts = count_project_data(project_name)
+    total_nodes = sum(nodes for nodes, _ in counts.values())
+    total_relationships = sum(rels for _, rels in counts.values())
+    logger.info(
+        f"{project_name}: {total_nodes} nodes and {total_relationships} relationships "
+        f"{'would be' if dry_run else 'will be'} deleted."
+    )
+    if dry_run:
+        return {label: nodes for label, (nodes, _) in counts.items()}
+    deleted = {}
+    deleted_total = 0
+    start_s = time.time()
+    for label in PROJECT_LABELS:
+        deleted[label] = 0
+        while True:
+            records, _, _ = cfg.neo4j.driver.execute_query(
+                f"""
+MATCH (n:`{label}` {{project: $project}})
+WITH n LIMIT $batch_size
+DETACH DELETE n
+RETURN count(*) AS deleted
+""",
+                project=project_name,
+                batch_size=batch_size,
+                database_=cfg.neo4j.neo4j_database,
+            )
+            batch_deleted = records[0]["deleted"]
+            if batch_deleted == 0:
+                break
+            deleted[label] += batch_deleted
+            deleted_total += batch_deleted
+            logger.info(
+                f"Deleted {deleted_total}/{total_nodes} nodes of {project_name} "
+                f"({label}: {deleted[label]}) in {time.time() - start_s:.1f} s."
+            )
+    cfg.neo4j.driver.execute_query(
+        "MATCH (p:__Project__ {name: $project}) DETACH DELETE p",
+        project=project_name,
+        database_=cfg.neo4j.neo4j_database,
+    )
+    path = Path(cfg.project_dir / project_name)
+    if path.exists():
+        update_project_settings(path, neo4j_index_version=None, neo4j_synced_at=None)
+        remove_checkpoint(path)
+    return deleted
 
 
 def create_path(input_dir: Path, file: str):
     return input_dir / f"output/{file}.parquet"
 
 
-def import_final_docs(input_dir: Path) -> int:
-    df = pd.read_parquet(
-        create_path(input_dir, "create_final_documents"), columns=["id", "title"]
+def content_hash(record: dict) -> str:
+    sha = hashlib.blake2b(digest_size=16)
+    for key in sorted(record):
+        value = record[key]
+        sha.update(key.encode("utf-8"))
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            sha.update(value.tobytes())
+        elif isinstance(value, np.ndarray):
+            sha.update(repr(value.tolist()).encode("utf-8"))
+        else:
+            sha.update(repr(value).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def fetch_synced_hashes(query: str, project: str) -> Dict[str, str]:
+    records, _, _ = cfg.neo4j.driver.execute_query(
+        query, project=project, database_=cfg.neo4j.neo4j_database
     )
+    return {str(r["id"]): r["hash"] for r in records}
+
+
+def changed_batches(
+    batches: Iterable[List[dict]],
+    id_column: str,
+    synced_hashes: Dict[str, str],
+    seen_ids: set,
+) -> Iterator[List[dict]]:
+    """
+    Adds a content hash to every record and only yields the records which are
+    new or changed since the last sync. The ids of all records are collected
+    in seen_ids, so that the records which were removed can be deleted.
+    """
+    for batch in batches:
+        changed = []
+        for record in batch:
+            record_id = str(record[id_column])
+            seen_ids.add(record_id)
+            record["content_hash"] = content_hash(record)
+            if synced_hashes.get(record_id) != record["content_hash"]:
+                changed.append(record)
+        yield changed
+
+
+def sync_stage(
+    input_dir: Path,
+    stage: str,
+    table: str,
+    statement: str,
+    hash_query: str,
+    delete_statement: str,
+    columns: List[str] = None,
+    id_column: str = "id",
+    clean_columns: List[str] = (),
+    progress: StageProgress = None,
+) -> int:
+    """
+    Upserts the new and changed records of a table and deletes the records
+    which no longer exist. A missing table, like the optional covariates, has
+    no records, so all of its synced records are deleted. Returns the number
+    of upserted records.
+    """
+    project = input_dir.name
+    synced_hashes = fetch_synced_hashes(hash_query, project)
+    seen_ids = set()
+    batch_size = cfg.neo4j.import_batch_size(stage)
+    progress = progress if progress is not None else StageProgress()
+    progress.start(batch_size)
+    table_file = create_path(input_dir, table)
+    batches = (
+        read_parquet_batches(
+            table_file,
+            columns=columns,
+            batch_size=batch_size,
+            clean_columns=clean_columns,
+        )
+        if table_file.exists()
+        else iter([])
+    )
+    batched_import(
+        statement,
+        changed_batches(batches, id_column, synced_hashes, seen_ids),
+        stage=stage,
+        parameters={"project": project},
+        progress=progress,
+    )
+    upserted = progress.rows
+    removed_ids = [{"id": i} for i in synced_hashes.keys() - seen_ids]
+    if len(removed_ids) > 0:
+        # Deleting is idempotent, so it is simply repeated after an interruption
+        deletion = StageProgress()
+        batched_import(
+            delete_statement,
+            iter_batches(removed_ids, batch_size),
+            stage=f"{stage} deletion",
+            parameters={"project": project},
+            progress=deletion,
+        )
+        progress.add_counters(deletion.counters)
+    logger.info(
+        f"{stage}: {upserted} upserted, {len(removed_ids)} deleted, "
+        f"{max(len(seen_ids) - upserted, 0)} unchanged, counters: {progress.counters}."
+    )
+    return upserted
+
+
+def iter_batches(records: List[dict], batch_size: int) -> Iterator[List[dict]]:
+    for start in range(0, len(records), batch_size):
+        yield records[start : start + batch_size]
+
+
+# The columns which are imported from each output table. The content hashes
+# are computed over them, so they must not differ between imports and exports.
+DOCUMENT_COLUMNS = ["id", "title"]
+TEXT_UNIT_COLUMNS = ["id", "text", "n_tokens", "document_ids"]
+ENTITY_COLUMNS = [
+    "name",
+    "type",
+    "description",
+    "human_readable_id",
+    "id",
+    "description_embedding",
+    "text_unit_ids",
+]
+ENTITY_CLEAN_COLUMNS = ["name", "type"]
+RELATIONSHIP_COLUMNS = [
+    "source",
+    "target",
+    "id",
+    "rank",
+    "weight",
+    "human_readable_id",
+    "description",
+    "text_unit_ids",
+]
+RELATIONSHIP_CLEAN_COLUMNS = ["source", "target"]
+COMMUNITY_COLUMNS = ["id", "level", "title", "text_unit_ids", "relationship_ids"]
+COMMUNITY_REPORT_COLUMNS = [
+    "id",
+    "community",
+    "level",
+    "title",
+    "summary",
+    "findings",
+    "rank",
+    "rank_explanation",
+    "full_content",
+]
+# Covariate columns which are only used for relationships
+COVARIATE_EXCLUDED_COLUMNS = ["text_unit_id", "document_ids", "n_tokens"]
+
+
+def import_final_docs(input_dir: Path, progress: StageProgress = None) -> int:
     statement = """
-MERGE (d:__Document__ {id:value.id})
-SET d += value {.title}
+MERGE (d:__Document__ {project: $project, id: value.id})
+SET d += value {.title}, d.documents_hash = value.content_hash
 """
-    return batched_import(statement, df)
+    return sync_stage(
+        input_dir,
+        "documents",
+        "create_final_documents",
+        statement,
+        hash_query="""
+MATCH (d:__Document__ {project: $project}) RETURN d.id AS id, d.documents_hash AS hash
+""",
+        delete_statement="""
+MATCH (d:__Document__ {project: $project, id: value.id}) DETACH DELETE d
+""",
+        columns=DOCUMENT_COLUMNS,
+        progress=progress,
+    )
 
 
-def import_text_units(input_dir: Path) -> int:
-    df = pd.read_parquet(create_path(input_dir, "create_final_text_units"),
-                          columns=["id","text","n_tokens","document_ids"])
+def import_text_units(input_dir: Path, progress: StageProgress = None) -> int:
     statement = """
-MERGE (c:__Chunk__ {id:value.id})
-SET c += value {.text, .n_tokens}
+MERGE (c:__Chunk__ {project: $project, id: value.id})
+SET c += value {.text, .n_tokens}, c.text_units_hash = value.content_hash
 WITH c, value
+CALL { WITH c MATCH (c)-[old:PART_OF]->() DELETE old }
 UNWIND value.document_ids AS document
-MATCH (d:__Document__ {id:document})
+MATCH (d:__Document__ {project: $project, id: document})
 MERGE (c)-[:PART_OF]->(d)
 """
-    return batched_import(statement, df)
+    return sync_stage(
+        input_dir,
+        "text_units",
+        "create_final_text_units",
+        statement,
+        hash_query="""
+MATCH (c:__Chunk__ {project: $project}) RETURN c.id AS id, c.text_units_hash AS hash
+""",
+        delete_statement="""
+MATCH (c:__Chunk__ {project: $project, id: value.id}) DETACH DELETE c
+""",
+        columns=TEXT_UNIT_COLUMNS,
+        progress=progress,
+    )
 
 
-def import_nodes(input_dir: Path) -> int:
-    df = pd.read_parquet(create_path(input_dir, "create_final_entities"),
-                            columns=["name","type","description","human_readable_id","id","description_embedding","text_unit_ids"])
+def import_nodes(input_dir: Path, progress: StageProgress = None) -> int:
     statement = """
-MERGE (e:__Entity__ {id: value.id})
-SET e += value {.human_readable_id, .description, name: replace(value.name, '"', '')}
+MERGE (e:__Entity__ {project: $project, id: value.id})
+SET e += value {.human_readable_id, .description, .name},
+    e.entities_hash = value.content_hash
 WITH e, value
 CALL db.create.setNodeVectorProperty(e, "description_embedding", value.description_embedding)
 WITH e, value,
-     CASE WHEN coalesce(value.type, "") = "" THEN [] ELSE [replace(value.type, '"', '')] END AS labels
+     CASE WHEN coalesce(value.type, "") = "" THEN [] ELSE [value.type] END AS labels
 FOREACH (label IN labels | SET e:`label`)
 WITH e, value
+CALL { WITH e MATCH ()-[old:HAS_ENTITY]->(e) DELETE old }
 UNWIND value.text_unit_ids AS text_unit
-MATCH (c:__Chunk__ {id: text_unit})
+MATCH (c:__Chunk__ {project: $project, id: text_unit})
 MERGE (c)-[:HAS_ENTITY]->(e)
 """
-    return batched_import(statement, df)
+    return sync_stage(
+        input_dir,
+        "entities",
+        "create_final_entities",
+        statement,
+        hash_query="""
+MATCH (e:__Entity__ {project: $project}) RETURN e.id AS id, e.entities_hash AS hash
+""",
+        delete_statement="""
+MATCH (e:__Entity__ {project: $project, id: value.id}) DETACH DELETE e
+""",
+        columns=ENTITY_COLUMNS,
+        clean_columns=ENTITY_CLEAN_COLUMNS,
+        progress=progress,
+    )
+
 
-def import_relationships(input_dir: Path) -> int:
-    df = pd.read_parquet(create_path(input_dir, "create_final_relationships"),
-                         columns=["source","target","id","rank","weight","human_readable_id","description","text_unit_ids"])
+def import_relationships(input_dir: Path, progress: StageProgress = None) -> int:
     rel_statement = """
-    MATCH (source:__Entity__ {name:replace(value.source,'"','')})
-    MATCH (target:__Entity__ {name:replace(value.target,'"','')})
-    // not necessary to merge on id as there is only one relationship per pair
+    MATCH (source:__Entity__ {project: $project, name: value.source})
+    MATCH (target:__Entity__ {project: $project, name: value.target})
+    // a relationship whose source or target changed is linked anew
+    CALL {
+        WITH value, source, target
+        MATCH (:__Entity__ {project: $project})-[old:RELATED {id: value.id}]->()
+        WHERE startNode(old) <> source OR endNode(old) <> target
+        DELETE old
+    }
     MERGE (source)-[rel:RELATED {id: value.id}]->(target)
-    SET rel += value {.rank, .weight, .human_readable_id, .description, .text_unit_ids}
+    SET rel += value {.rank, .weight, .human_readable_id, .description, .text_unit_ids},
+        rel.relationships_hash = value.content_hash
     RETURN count(*) as createdRels
 """
-    return batched_import(rel_statement, df)
+    return sync_stage(
+        input_dir,
+        "relationships",
+        "create_final_relationships",
+        rel_statement,
+        hash_query="""
+MATCH (:__Entity__ {project: $project})-[rel:RELATED]->()
+RETURN rel.id AS id, rel.relationships_hash AS hash
+""",
+        delete_statement="""
+MATCH (:__Entity__ {project: $project})-[rel:RELATED {id: value.id}]->() DELETE rel
+""",
+        columns=RELATIONSHIP_COLUMNS,
+        clean_columns=RELATIONSHIP_CLEAN_COLUMNS,
+        progress=progress,
+    )
 
 
-def import_communities(input_dir: Path) -> int:
-    df = pd.read_parquet(create_path(input_dir, "create_final_communities"), 
-                     columns=["id","level","title","text_unit_ids","relationship_ids"])
+def import_communities(input_dir: Path, progress: StageProgress = None) -> int:
     statement = """
-MERGE (c:__Community__ {community:value.id})
-SET c += value {.level, .title}
+MERGE (c:__Community__ {project: $project, community:value.id})
+SET c += value {.level, .title}, c.communities_hash = value.content_hash
 /*
 UNWIND value.text_unit_ids as text_unit_id
 MATCH (t:__Chunk__ {id:text_unit_id})
@@ -149,78 +716,240 @@ MERGE (c)-[:HAS_CHUNK]->(t)
 WITH distinct c, value
 */
 WITH *
+CALL { WITH c MATCH ()-[old:IN_COMMUNITY]->(c) DELETE old }
 UNWIND value.relationship_ids as rel_id
 MATCH (start:__Entity__)-[:RELATED {id:rel_id}]->(end:__Entity__)
+WHERE start.project = $project
 MERGE (start)-[:IN_COMMUNITY]->(c)
 MERGE (end)-[:IN_COMMUNITY]->(c)
 RETURn count(distinct c) as createdCommunities
 """
-    return batched_import(statement, df)
+    return sync_stage(
+        input_dir,
+        "communities",
+        "create_final_communities",
+        statement,
+        hash_query="""
+MATCH (c:__Community__ {project: $project}) WHERE c.communities_hash IS NOT NULL
+RETURN c.community AS id, c.communities_hash AS hash
+""",
+        delete_statement="""
+MATCH (c:__Community__ {project: $project, community: value.id})
+OPTIONAL MATCH (c)-[:HAS_FINDING]->(f:Finding)
+DETACH DELETE c, f
+""",
+        columns=COMMUNITY_COLUMNS,
+        progress=progress,
+    )
 
 
-def import_community_reports(input_dir: Path) -> int:
-    df = pd.read_parquet(create_path(input_dir, "create_final_community_reports"),
-                               columns=["id","community","level","title","summary", "findings","rank","rank_explanation","full_content"])
+def import_community_reports(input_dir: Path, progress: StageProgress = None) -> int:
     # import communities
     community_statement = """
-MERGE (c:__Community__ {community:value.community})
-SET c += value {.level, .title, .rank, .rank_explanation, .full_content, .summary}
+MERGE (c:__Community__ {project: $project, community:value.community})
+SET c += value {.level, .title, .rank, .rank_explanation, .full_content, .summary},
+    c.community_reports_hash = value.content_hash
 WITH c, value
+CALL { WITH c MATCH (c)-[:HAS_FINDING]->(old:Finding) DETACH DELETE old }
 UNWIND range(0, size(value.findings)-1) AS finding_idx
 WITH c, value, finding_idx, value.findings[finding_idx] as finding
-MERGE (c)-[:HAS_FINDING]->(f:Finding {id:finding_idx})
+MERGE (c)-[:HAS_FINDING]->(f:Finding {project: $project, id:finding_idx})
 SET f += finding
 """
-    return batched_import(community_statement, df)
+    return sync_stage(
+        input_dir,
+        "community_reports",
+        "create_final_community_reports",
+        community_statement,
+        hash_query="""
+MATCH (c:__Community__ {project: $project}) WHERE c.community_reports_hash IS NOT NULL
+RETURN c.community AS id, c.community_reports_hash AS hash
+""",
+        delete_statement="""
+MATCH (c:__Community__ {project: $project, community: value.id})
+OPTIONAL MATCH (c)-[:HAS_FINDING]->(f:Finding)
+DETACH DELETE f
+REMOVE c.rank, c.rank_explanation, c.full_content, c.summary, c.community_reports_hash
+""",
+        columns=COMMUNITY_REPORT_COLUMNS,
+        id_column="community",
+        progress=progress,
+    )
 
 
-def import_covariates(input_dir: Path) -> int:
-    covariates_file = create_path(input_dir, "create_final_covariates")
-    if not covariates_file.exists():
-        return 0
-    df = pd.read_parquet(create_path(input_dir, "create_final_covariates"))
+def import_covariates(input_dir: Path, progress: StageProgress = None) -> int:
     # import covariates
     cov_statement = """
-    MERGE (c:__Covariate__ {id: value.id})
+    MERGE (c:__Covariate__ {project: $project, id: value.id})
     SET c += reduce(
         result = {}, 
         key IN keys(value) | 
         CASE key
-            WHEN  "text_unit_id", "document_ids", "n_tokens"
+            WHEN  "text_unit_id", "document_ids", "n_tokens", "content_hash"
             THEN result
             WHEN value[key] IS NULL OR value[key] = ""
             THEN result
             ELSE result{key: value[key]}
         END
-    )
+    ), c.covariates_hash = value.content_hash
     WITH c, value
-    MATCH (ch:__Chunk__ {id: value.text_unit_id})
+    CALL { WITH c MATCH ()-[old:HAS_COVARIATE]->(c) DELETE old }
+    MATCH (ch:__Chunk__ {project: $project, id: value.text_unit_id})
     MERGE (ch)-[:HAS_COVARIATE]->(c)
 """
-    return batched_import(cov_statement, df)
+    return sync_stage(
+        input_dir,
+        "covariates",
+        "create_final_covariates",
+        cov_statement,
+        hash_query="""
+MATCH (c:__Covariate__ {project: $project}) RETURN c.id AS id, c.covariates_hash AS hash
+""",
+        delete_statement="""
+MATCH (c:__Covariate__ {project: $project, id: value.id}) DETACH DELETE c
+""",
+        progress=progress,
+    )
+
+
+# The import stages with the stages they depend on. Stages whose dependencies
+# have been imported run concurrently.
+IMPORT_STAGES: Dict[str, Tuple[Callable[[Path, StageProgress], int], List[str]]] = {
+    "documents": (import_final_docs, []),
+    "text_units": (import_text_units, ["documents"]),
+    "entities": (import_nodes, ["text_units"]),
+    "covariates": (import_covariates, ["text_units"]),
+    "relationships": (import_relationships, ["entities"]),
+    "communities": (import_communities, ["relationships"]),
+    "community_reports": (import_community_reports, ["communities"]),
+}
+
+
+def run_import_stages(
+    path: Path, checkpoint: ImportCheckpoint = None
+) -> Dict[str, StageProgress]:
+    """
+    Runs the import stages in dependency order. Stages which the checkpoint
+    records as completed are skipped and the others resume after their last
+    committed batch.
+    """
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(index_version=get_index_version(path))
+    imported = {}
+    pending = dict(IMPORT_STAGES)
+    running = {}
+    with ThreadPoolExecutor(thread_name_prefix="neo4j-stage") as executor:
+        while pending or running:
+            for name, (import_function, depends_on) in list(pending.items()):
+                if not all(d in imported for d in depends_on):
+                    continue
+                del pending[name]
+                progress = checkpoint.stage(name)
+                if progress.completed:
+                    logger.info(f"Skipping {name}, completed before.")
+                    imported[name] = progress
+                    continue
+                progress.begin()
+                running[executor.submit(import_function, path, progress)] = name
+            if not running:
+                continue
+            done, _ = wait(running.keys(), return_when=FIRST_EXCEPTION)
+            for future in done:
+                name = running.pop(future)
+                checkpoint.stage(name).finish()
+                future.result()
+                checkpoint.complete_stage(name)
+                imported[name] = checkpoint.stage(name)
+                logger.info(
+                    f"Imported {imported[name].rows} {name}, counters: {imported[name].counters}."
+                )
+    return imported
+
+
+def get_synced_index_version(project_name: str) -> Union[str, None]:
+    records, _, _ = cfg.neo4j.driver.execute_query(
+        "MATCH (p:__Project__ {name: $project}) RETURN p.index_version AS version",
+        project=project_name,
+        database_=cfg.neo4j.neo4j_database,
+    )
+    return records[0]["version"] if len(records) > 0 else None
+
+
+def set_synced_index_version(project_name: str, index_version: str):
+    cfg.neo4j.driver.execute_query(
+        """
+MERGE (p:__Project__ {name: $project})
+SET p.index_version = $index_version, p.synced_at = datetime()
+""",
+        project=project_name,
+        index_version=index_version,
+        database_=cfg.neo4j.neo4j_database,
+    )
 
 
-def generate_neo4j_entities(project_name: str):
-    clear_db()
-    create_constraints()
-    path = Path(cfg.project_dir/project_name)
+def generate_neo4j_entities(
+    project_name: str, force: bool = False, job: Job = None
+) -> Dict[str, StageProgress]:
+    """
+    Synchronizes the graphrag output of a project with Neo4J. All nodes are
+    scoped by a project property, so several projects can live in the same
+    database. Only new or changed records are written and records which no
+    longer exist in the output are deleted.
+    Every committed batch is recorded in a checkpoint file, so an interrupted
+    sync resumes where it stopped when it is run again for the same index.
+    The progress of every stage is published to the job, if there is one.
+    """
+    path = Path(cfg.project_dir / project_name)
     if not path.exists():
         logger.error(f"{path} does not exist. Neo4J entities will not be generated.")
-    imported_docs = import_final_docs(path)
-    logger.info(f"Imported {imported_docs} documents.")
-    imported_texts = import_text_units(path)
-    logger.info(f"Imported {imported_texts} text units.")
-    imported_nodes = import_nodes(path)
-    logger.info(f"Imported {imported_nodes} nodes.")
-    imported_rels = import_relationships(path)
-    logger.info(f"Imported {imported_rels} relationships.")
-    imported_communities = import_communities(path)
-    logger.info(f"Imported {imported_communities} communities.")
-    imported_community_reports = import_community_reports(path)
-    logger.info(f"Imported {imported_community_reports} community reports.")
-    imported_covariates = import_covariates(path)
-    logger.info(f"Imported {imported_covariates} covariates.")
+        return {}
+    if job is not None:
+        job.message = "Creating the Neo4J indexes"
+    provision_schema(path)
+    index_version = get_index_version(path)
+    if not force and get_synced_index_version(project_name) == index_version:
+        logger.info(f"{project_name} is already synced with index {index_version}.")
+        if job is not None:
+            job.message = f"Already synced with index {index_version}"
+        return {}
+    start_s = time.time()
+    checkpoint = load_checkpoint(path, index_version)
+    message = "Syncing"
+    if len(checkpoint.stages) > 0:
+        logger.info(f"Resuming the interrupted sync of {project_name}.")
+        message = "Resuming the interrupted sync"
+    if job is not None:
+        job.message = message
+        job.progress["stages"] = {
+            name: checkpoint.stage(name) for name in IMPORT_STAGES
+        }
+    imported = run_import_stages(path, checkpoint)
+    set_synced_index_version(project_name, index_version)
+    remove_checkpoint(path)
+    logger.info(f"Synced {project_name} in {time.time() - start_s:.2f} s.")
+    if job is not None:
+        job.message = f"Synced index {index_version}"
+    return imported
 
 
 if __name__ == "__main__":
-    generate_neo4j_entities("DWell Full")
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Syncs a project with Neo4J")
+    parser.add_argument("project", help="The name of the project")
+    parser.add_argument(
+        "--clear", action="store_true", help="Delete the project from Neo4J"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only count what would be deleted with --clear",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Sync even if the index is unchanged"
+    )
+    args = parser.parse_args()
+    if args.clear:
+        clear_db(args.project, dry_run=args.dry_run)
+    else:
+        generate_neo4j_entities(args.project, force=args.force)
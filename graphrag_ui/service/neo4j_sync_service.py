@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict
+
+from graphrag_ui.service.job_service import Job, find_job, submit_job
+from graphrag_ui.service.neo4j_checkpoint_service import StageProgress
+from graphrag_ui.service.project_settings_service import update_project_settings
+
+
+def run_neo4j_sync(
+    project_dir: Path, force: bool = False, job: Job = None
+) -> Dict[str, StageProgress]:
+    """
+    Syncs the project with Neo4J and records the synced index version in the
+    project settings, so that the UI can tell whether the sync is up to date.
+    """
+    # Imported here, so that Neo4J is only loaded by the first sync
+    from graphrag_ui.service.neo4j_service import (
+        generate_neo4j_entities,
+        get_synced_index_version,
+    )
+
+    imported = generate_neo4j_entities(project_dir.name, force=force, job=job)
+    update_project_settings(
+        project_dir,
+        neo4j_index_version=get_synced_index_version(project_dir.name),
+        neo4j_synced_at=datetime.now(timezone.utc),
+    )
+    return imported
+
+
+def neo4j_sync_job_name(project_dir: Path) -> str:
+    return f"neo4j-sync:{project_dir.name}"
+
+
+def start_neo4j_sync(project_dir: Path, force: bool = False) -> Job:
+    return submit_job(
+        neo4j_sync_job_name(project_dir), run_neo4j_sync, project_dir, force
+    )
+
+
+def find_neo4j_sync_job(project_dir: Path) -> Job:
+    return find_job(neo4j_sync_job_name(project_dir))
@@ -0,0 +1,276 @@
+"""
+Samples the stacks of the running threads while selected requests run, to see
+where the CPU time of a slow search goes. Profiling is switched on per project
+by an admin. Requests of other projects only pay for a set lookup.
+
+The samples of all busy threads are recorded, so requests which run at the
+same time as the profiled one show up in its profile too. Threads which wait,
+e.g. the event loop while the LLM answers, are left out.
+"""
+
+import json
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from enum import StrEnum
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from xml.sax.saxutils import escape
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.config import cfg
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.project_settings_service import UI_FOLDER
+
+PROFILE_FOLDER = f"{UI_FOLDER}/profiles"
+# Leaf frames of threads which are waiting, as (file name, function name)
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("thread.py", "_worker"),
+}
+FLAME_GRAPH_WIDTH = 1200
+FLAME_GRAPH_ROW_HEIGHT = 16
+
+
+class ProfileFormat(StrEnum):
+    SVG = "svg"
+    FOLDED = "folded"
+    SPEEDSCOPE = "speedscope"
+
+
+# Media type and file suffix of the downloads
+PROFILE_DOWNLOADS = {
+    ProfileFormat.SVG: ("image/svg+xml", ".svg"),
+    ProfileFormat.FOLDED: ("text/plain", ".folded.txt"),
+    ProfileFormat.SPEEDSCOPE: ("application/json", ".speedscope.json"),
+}
+
+
+class Profile(BaseModel):
+    id: str = Field(..., description="The unique identifier of the profile")
+    project: str = Field(..., description="The name of the project")
+    name: str = Field(..., description="What was profiled, e.g. 'global search'")
+    detail: str = Field("", description="The query of the profiled request")
+    started: datetime = Field(..., description="When the request started")
+    seconds: float = Field(..., description="The duration of the request")
+    interval_ms: float = Field(..., description="The time between two samples")
+    samples: int = Field(0, description="The number of samples of busy threads")
+    stacks: Dict[str, int] = Field(
+        default_factory=dict,
+        description="The samples per stack, frames from the thread down separated by ';'",
+    )
+
+
+class SamplingProfiler:
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.stacks: Counter[Tuple[str, ...]] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="graphrag-ui-profiler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = frame_stack(frame)
+                if stack is not None:
+                    self.stacks[(names.get(ident, str(ident)), *stack)] += 1
+
+
+def frame_stack(frame) -> Optional[Tuple[str, ...]]:
+    """The frames from the outermost down, or None if the thread waits."""
+    code = frame.f_code
+    if (Path(code.co_filename).name, code.co_name) in IDLE_FRAMES:
+        return None
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(
+            f"{code.co_qualname} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+_profiled_projects: Set[str] = set()
+
+
+def enable_profiling(project_dir: Path, enabled: bool):
+    if enabled:
+        _profiled_projects.add(project_dir.name)
+    else:
+        _profiled_projects.discard(project_dir.name)
+
+
+def is_profiling(project_dir: Path) -> bool:
+    return project_dir.name in _profiled_projects
+
+
+@contextmanager
+def profiled(project_dir: Path, name: str, detail: str = "") -> Iterator:
+    """Profiles the block if profiling is switched on for the project."""
+    if project_dir.name not in _profiled_projects:
+        yield
+        return
+    profiler = SamplingProfiler(cfg.profile_interval_ms / 1000)
+    started = datetime.now()
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        profile = Profile(
+            id=f"{started:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}",
+            project=project_dir.name,
+            name=name,
+            detail=detail,
+            started=started,
+            seconds=round(time.perf_counter() - start, 3),
+            interval_ms=cfg.profile_interval_ms,
+            samples=sum(profiler.stacks.values()),
+            stacks={";".join(stack): n for stack, n in profiler.stacks.items()},
+        )
+        try:
+            save_profile(project_dir, profile)
+        except OSError as e:
+            logger.error(f"Could not save the profile of {name}: {e}")
+
+
+def save_profile(project_dir: Path, profile: Profile):
+    """Saves the profile and deletes the oldest ones above the maximum count."""
+    profile_dir = project_dir / PROFILE_FOLDER
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    (profile_dir / f"{profile.id}.json").write_text(profile.model_dump_json(), "utf-8")
+    for old in sorted(profile_dir.glob("*.json"))[: -cfg.profile_max_count]:
+        old.unlink(missing_ok=True)
+
+
+def list_profiles(project_dir: Path) -> List[Profile]:
+    """The profiles of the project, the latest first."""
+    profile_dir = project_dir / PROFILE_FOLDER
+    if not profile_dir.exists():
+        return []
+    return [
+        Profile.model_validate_json(f.read_text("utf-8"))
+        for f in sorted(profile_dir.glob("*.json"), reverse=True)
+    ]
+
+
+def read_profile(project_dir: Path, profile_id: str) -> Optional[Profile]:
+    profile_file = project_dir / PROFILE_FOLDER / f"{Path(profile_id).name}.json"
+    if not profile_file.exists():
+        return None
+    return Profile.model_validate_json(profile_file.read_text("utf-8"))
+
+
+def render_profile(profile: Profile, profile_format: ProfileFormat) -> str:
+    match profile_format:
+        case ProfileFormat.SVG:
+            return flame_graph(profile)
+        case ProfileFormat.FOLDED:
+            return folded_stacks(profile)
+        case ProfileFormat.SPEEDSCOPE:
+            return speedscope(profile)
+
+
+def folded_stacks(profile: Profile) -> str:
+    """The collapsed stack format read by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {n}\n" for stack, n in profile.stacks.items())
+
+
+def speedscope(profile: Profile) -> str:
+    frames: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, n in profile.stacks.items():
+        samples.append([frames.setdefault(f, len(frames)) for f in stack.split(";")])
+        weights.append(n * profile.interval_ms)
+    return json.dumps(
+        {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{profile.project}: {profile.name}",
+            "exporter": "graphrag-ui",
+            "shared": {"frames": [{"name": f} for f in frames]},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{profile.name} {profile.detail}".strip(),
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+    )
+
+
+def flame_graph(profile: Profile) -> str:
+    """A static SVG flame graph, the widths are proportional to the samples."""
+    root = {"count": 0, "children": {}}
+    for stack, n in profile.stacks.items():
+        root["count"] += n
+        node = root
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"count": 0, "children": {}})
+            node["count"] += n
+
+    def depth(node) -> int:
+        return 1 + max((depth(c) for c in node["children"].values()), default=0)
+
+    rows = depth(root)
+    height = (rows + 2) * FLAME_GRAPH_ROW_HEIGHT
+    scale = FLAME_GRAPH_WIDTH / max(root["count"], 1)
+    rects = []
+
+    def draw(name: str, node, x: float, level: int):
+        width = node["count"] * scale
+        if width < 0.5:
+            return
+        y = height - (level + 1) * FLAME_GRAPH_ROW_HEIGHT
+        share = node["count"] / max(root["count"], 1) * 100
+        hue = zlib.crc32(name.encode()) % 60
+        label = name if len(name) * 7 < width else name[: int(width / 7) - 2] + ".."
+        rects.append(
+            f'<g><title>{escape(name)} ({node["count"]} samples, {share:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" '
+            f'height="{FLAME_GRAPH_ROW_HEIGHT - 1}" fill="hsl({hue},80%,60%)"/>'
+            + (
+                f'<text x="{x + 3:.1f}" y="{y + 12}">{escape(label)}</text>'
+                if width > 21
+                else ""
+            )
+            + "</g>"
+        )
+        for child_name, child in node["children"].items():
+            draw(child_name, child, x, level + 1)
+            x += child["count"] * scale
+
+    draw(f"all ({profile.seconds} s)", root, 0, 0)
+    title = escape(f"{profile.project}: {profile.name} {profile.detail}".strip())
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAME_GRAPH_WIDTH}" '
+        f'height="{height}" font-family="monospace" font-size="11">'
+        f'<text x="4" y="12">{title}</text>' + "".join(rects) + "</svg>"
+    )
@@ -0,0 +1,57 @@
+from datetime import datetime
+from enum import StrEnum
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+# Project local folder used by the UI to store settings and derived data
+UI_FOLDER = ".graphrag_ui"
+SETTINGS_FILE = f"{UI_FOLDER}/settings.json"
+
+
+class ContextBackend(StrEnum):
+    MEMORY = "memory"
+    NEO4J = "neo4j"
+
+
+class ProjectSettings(BaseModel):
+    context_backend: ContextBackend = Field(
+        ContextBackend.MEMORY,
+        description="Where the local search context is built from: the output files loaded in memory or Neo4J",
+    )
+    community_level: Optional[str] = Field(
+        None,
+        description="The community level of the searches, a level or auto. COMMUNITY_LEVEL if not set",
+    )
+    search_profile: Optional[str] = Field(
+        None,
+        description="The profile of the searches, fast, balanced or thorough. SEARCH_PROFILE if not set",
+    )
+    neo4j_index_version: Optional[str] = Field(
+        None, description="The index version which was last synced to Neo4J"
+    )
+    neo4j_synced_at: Optional[datetime] = Field(
+        None, description="When the project was last synced to Neo4J"
+    )
+
+
+def read_project_settings(project_dir: Path) -> ProjectSettings:
+    settings_file = project_dir / SETTINGS_FILE
+    if not settings_file.exists():
+        return ProjectSettings()
+    return ProjectSettings.model_validate_json(settings_file.read_text("utf-8"))
+
+
+def write_project_settings(project_dir: Path, settings: ProjectSettings):
+    settings_file = project_dir / SETTINGS_FILE
+    settings_file.parent.mkdir(parents=True, exist_ok=True)
+    settings_file.write_text(settings.model_dump_json(indent=2), "utf-8")
+
+
+def update_project_settings(project_dir: Path, **changes) -> ProjectSettings:
+    settings = ProjectSettings.model_validate(
+        {**read_project_settings(project_dir).model_dump(), **changes}
+    )
+    write_project_settings(project_dir, settings)
+    return settings
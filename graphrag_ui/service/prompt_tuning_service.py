@@ -0,0 +1,144 @@
+import difflib
+import hashlib
+import re
+import shutil
+
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.graphrag_service import graphrag_prompt_tuning
+from graphrag_ui.service.job_service import Job, JobStatus, find_job, submit_job
+from graphrag_ui.service.project_settings_service import UI_FOLDER
+
+PROMPT_TUNING_FOLDER = f"{UI_FOLDER}/prompt_tuning"
+PROMPTS_FOLDER = "prompts"
+# Bump this when the prompt tuning command line changes, so that old results are not reused
+PROMPT_TUNING_VERSION = "no-entity-types:1"
+
+
+class PromptDiff(BaseModel):
+    name: str = Field(..., description="The file name of the prompt")
+    is_new: bool = Field(..., description="True if there is no current prompt")
+    diff: List[str] = Field(..., description="The unified diff lines")
+
+    @property
+    def changed(self) -> bool:
+        return self.is_new or len(self.diff) > 0
+
+
+def compute_tuning_key(project_dir: Path) -> str:
+    """
+    Hashes the input corpus and the settings, so that re-tuning an unchanged
+    project can reuse the prompts which were generated before.
+    """
+    sha = hashlib.sha256(PROMPT_TUNING_VERSION.encode("utf-8"))
+    settings_file = project_dir / "settings.yaml"
+    if settings_file.exists():
+        sha.update(settings_file.read_bytes())
+    input_dir = project_dir / "input"
+    if input_dir.exists():
+        for input_file in sorted(f for f in input_dir.rglob("*") if f.is_file()):
+            sha.update(input_file.relative_to(input_dir).as_posix().encode("utf-8"))
+            with open(input_file, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(block)
+    return sha.hexdigest()
+
+
+def tuned_prompts_dir(project_dir: Path, key: str) -> Path:
+    return project_dir / PROMPT_TUNING_FOLDER / key
+
+
+def has_tuned_prompts(prompts_dir: Path) -> bool:
+    return prompts_dir.exists() and any(prompts_dir.glob("*.txt"))
+
+
+def run_prompt_tuning(project_dir: Path, job: Job = None) -> str:
+    """
+    Generates the tuned prompts for a project unless they are already cached.
+    Returns the key under which the prompts are stored.
+    """
+    key = compute_tuning_key(project_dir)
+    target_dir = tuned_prompts_dir(project_dir, key)
+    if has_tuned_prompts(target_dir):
+        logger.info(f"Reusing cached prompts {key} for {project_dir.name}")
+        if job is not None:
+            job.message = "Reused cached prompts"
+        return key
+    if job is not None:
+        job.message = "Tuning prompts"
+    # Generate into a temporary folder first, so that an interrupted run is never cached
+    tmp_dir = target_dir.with_suffix(".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    graphrag_prompt_tuning(
+        project_dir, output=tmp_dir.relative_to(project_dir).as_posix()
+    )
+    if not has_tuned_prompts(tmp_dir):
+        raise RuntimeError("Prompt tuning did not generate any prompts")
+    tmp_dir.rename(target_dir)
+    if job is not None:
+        job.message = "Prompts generated"
+    return key
+
+
+def prompt_tuning_job_name(project_dir: Path) -> str:
+    return f"prompt-tuning:{project_dir.name}"
+
+
+def start_prompt_tuning(project_dir: Path) -> Job:
+    return submit_job(
+        prompt_tuning_job_name(project_dir), run_prompt_tuning, project_dir
+    )
+
+
+def find_prompt_tuning_job(project_dir: Path) -> Job:
+    return find_job(prompt_tuning_job_name(project_dir))
+
+
+def prompt_tuning_diffs(project_dir: Path, job: Job) -> Optional[List[PromptDiff]]:
+    """
+    The diffs of the tuned prompts once the job finished, None before. A job
+    reusing cached prompts is often finished by the time it is first shown.
+    """
+    if job.status != JobStatus.FINISHED:
+        return None
+    return diff_prompts(project_dir, job.result)
+
+
+def diff_prompts(project_dir: Path, key: str) -> List[PromptDiff]:
+    diffs = []
+    current_dir = project_dir / PROMPTS_FOLDER
+    for tuned_file in sorted(tuned_prompts_dir(project_dir, key).glob("*.txt")):
+        current_file = current_dir / tuned_file.name
+        is_new = not current_file.exists()
+        current = [] if is_new else current_file.read_text("utf-8").splitlines()
+        tuned = tuned_file.read_text("utf-8").splitlines()
+        diff = list(
+            difflib.unified_diff(
+                current,
+                tuned,
+                fromfile=f"current/{tuned_file.name}",
+                tofile=f"tuned/{tuned_file.name}",
+                lineterm="",
+            )
+        )
+        diffs.append(PromptDiff(name=tuned_file.name, is_new=is_new, diff=diff))
+    return diffs
+
+
+def apply_prompts(project_dir: Path, key: str) -> List[str]:
+    if re.fullmatch("[0-9a-f]{64}", key) is None:
+        raise ValueError(f"Invalid prompt tuning key: {key}")
+    source_dir = tuned_prompts_dir(project_dir, key)
+    if not has_tuned_prompts(source_dir):
+        raise ValueError(f"No tuned prompts found for {key}")
+    target_dir = project_dir / PROMPTS_FOLDER
+    target_dir.mkdir(parents=True, exist_ok=True)
+    applied = []
+    for tuned_file in sorted(source_dir.glob("*.txt")):
+        shutil.copyfile(tuned_file, target_dir / tuned_file.name)
+        applied.append(tuned_file.name)
+    return applied
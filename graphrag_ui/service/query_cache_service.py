@@ -0,0 +1,451 @@
+"""
+Keeps the search data of the recently used projects loaded: the converted
+output tables and the context builders of the searches built from them.
+Otherwise every search reads and converts all output tables again.
+
+Projects are loaded by their first search, ahead of it when their page is
+opened, and optionally at startup for the most recently used ones. The loads
+ahead of a search are speculative, so they only run if the project fits into
+the memory budget next to the projects which are already loaded. The data is
+loaded per community level, the loads ahead of a search load the project's
+default level.
+
+The footprint of every loaded project is measured per component after each
+load. When the loaded projects exceed the memory budget, the least recently
+used ones are dropped.
+"""
+
+import threading
+import time
+
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.config import cfg
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.community_level_service import resolve_community_level
+from graphrag_ui.service.graphrag_constants import (
+    COMMUNITY_LEVEL,
+    COMMUNITY_REPORT_TABLE,
+    ENTITY_TABLE,
+    ENTITY_EMBEDDING_TABLE,
+    RELATIONSHIP_TABLE,
+    COVARIATE_TABLE,
+    TEXT_UNIT_TABLE,
+    SearchType,
+)
+from graphrag_ui.service.graphrag_service import (
+    get_index_version,
+    get_project_status,
+    ProjectStatus,
+)
+from graphrag_ui.service.job_service import Job, submit_job
+from graphrag_ui.service.memory_service import MemoryComponent, measure_footprint
+from graphrag_ui.service.metrics_service import (
+    Counter,
+    Gauge,
+    register,
+    register_collector,
+    timed,
+    stage_timing,
+)
+from graphrag_ui.service.project_settings_service import (
+    UI_FOLDER,
+    ContextBackend,
+    read_project_settings,
+)
+
+# Touched whenever the search data of a project is used, to find the recent ones
+USAGE_FILE = f"{UI_FOLDER}/last_used"
+MB = 1024 * 1024
+# The search types loaded ahead of a search. The fast global search is not,
+# as its first build embeds the community reports
+PRELOADED_SEARCH_TYPES = [SearchType.GLOBAL, SearchType.LOCAL]
+
+EVICTIONS = register(
+    Counter(
+        "graphrag_ui_query_cache_evictions_total",
+        "Projects whose search data was dropped to stay within the limits",
+        ["reason"],
+    )
+)
+
+
+class QueryData:
+    """
+    The search data of a project for one index version. The data of a
+    community level is loaded and the context builder of a search type at a
+    level is built by their first search.
+    """
+
+    def __init__(
+        self,
+        project: str,
+        index_version: str,
+        context_backend: ContextBackend,
+    ):
+        self.project = project
+        self.index_version = index_version
+        self.context_backend = context_backend
+        self.project_data: Dict[int, Any] = {}
+        self.context_builders: Dict[Tuple[SearchType, int], Any] = {}
+        self.footprint: Dict[MemoryComponent, int] = {}
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(self.footprint.values())
+
+
+class LoadedProject(BaseModel):
+    project: str = Field(..., description="The name of the project")
+    index_version: str = Field(..., description="The loaded index version")
+    context_backend: ContextBackend = Field(
+        ..., description="The context backend the data was loaded for"
+    )
+    search_types: List[SearchType] = Field(
+        ..., description="The search types whose context builders are built"
+    )
+    community_levels: List[int] = Field(..., description="The loaded community levels")
+    loaded_at: datetime = Field(..., description="When the project was loaded")
+    last_used: datetime = Field(..., description="When a search last used it")
+    footprint: Dict[MemoryComponent, int] = Field(
+        ..., description="The estimated bytes per component"
+    )
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(self.footprint.values())
+
+
+_cache: OrderedDict[str, QueryData] = OrderedDict()
+_project_locks: Dict[str, threading.Lock] = {}
+# The last measured size per project, index version and context backend
+_measured_sizes: Dict[str, Tuple[str, ContextBackend, int]] = {}
+_lock = threading.Lock()
+
+
+def query_tables(context_backend: ContextBackend) -> List[str]:
+    """The output tables which are loaded for the searches."""
+    tables = [ENTITY_TABLE, ENTITY_EMBEDDING_TABLE, COMMUNITY_REPORT_TABLE]
+    if context_backend == ContextBackend.MEMORY:
+        tables += [RELATIONSHIP_TABLE, TEXT_UNIT_TABLE, COVARIATE_TABLE]
+    return tables
+
+
+def estimate_size(project_dir: Path, context_backend: ContextBackend) -> int:
+    """
+    The uncompressed size of the loaded output tables in bytes, read from the
+    parquet metadata without loading the tables. The loaded objects take more
+    memory, so the measured size of an earlier load is preferred.
+    """
+    # Imported here, so that the parquet reader is only loaded by the first load
+    import pyarrow.parquet as pq
+
+    size = 0
+    for table in query_tables(context_backend):
+        file = project_dir / "output" / f"{table}.parquet"
+        if file.exists():
+            metadata = pq.ParquetFile(file).metadata
+            size += sum(
+                metadata.row_group(i).total_byte_size
+                for i in range(metadata.num_row_groups)
+            )
+    return size
+
+
+def _current(project_dir: Path) -> Optional[QueryData]:
+    """The cached data of the project, if it was built for the current index."""
+    with _lock:
+        query_data = _cache.get(project_dir.name)
+    if query_data is None:
+        return None
+    if (
+        query_data.index_version != get_index_version(project_dir)
+        or query_data.context_backend
+        != read_project_settings(project_dir).context_backend
+    ):
+        return None
+    return query_data
+
+
+def is_loaded(project_dir: Path, community_level: Optional[int] = None) -> bool:
+    """
+    Whether the context builders of the preloaded search types are ready at
+    the community level, by default the project's level.
+    """
+    query_data = _current(project_dir)
+    if query_data is None:
+        return False
+    if community_level is None:
+        community_level = resolve_community_level(project_dir)
+    return all(
+        (search_type, community_level) in query_data.context_builders
+        for search_type in PRELOADED_SEARCH_TYPES
+    )
+
+
+def expected_size(project_dir: Path, context_backend: ContextBackend) -> int:
+    """The size of the project once loaded, as measured before or estimated."""
+    measured = _measured_sizes.get(project_dir.name)
+    if measured is not None and measured[:2] == (
+        get_index_version(project_dir),
+        context_backend,
+    ):
+        return measured[2]
+    return estimate_size(project_dir, context_backend)
+
+
+def loaded_projects() -> List[LoadedProject]:
+    """The loaded projects, the most recently used first."""
+    with _lock:
+        cached = list(reversed(_cache.values()))
+    return [
+        LoadedProject(
+            project=query_data.project,
+            index_version=query_data.index_version,
+            context_backend=query_data.context_backend,
+            search_types=list(
+                dict.fromkeys(
+                    search_type for search_type, _ in query_data.context_builders
+                )
+            ),
+            community_levels=sorted(query_data.project_data),
+            loaded_at=datetime.fromtimestamp(query_data.loaded_at),
+            last_used=datetime.fromtimestamp(query_data.last_used),
+            footprint=dict(query_data.footprint),
+        )
+        for query_data in cached
+    ]
+
+
+def loaded_size(except_project: Optional[str] = None) -> int:
+    with _lock:
+        return sum(
+            query_data.size_bytes
+            for project, query_data in _cache.items()
+            if project != except_project
+        )
+
+
+def _project_lock(project_dir: Path) -> threading.Lock:
+    with _lock:
+        return _project_locks.setdefault(project_dir.name, threading.Lock())
+
+
+def _record_usage(project_dir: Path):
+    usage_file = project_dir / USAGE_FILE
+    try:
+        usage_file.parent.mkdir(parents=True, exist_ok=True)
+        usage_file.touch()
+    except OSError as e:
+        logger.warning(f"Could not record the usage of {project_dir.name}: {e}")
+
+
+def get_context_builder(
+    project_dir: Path, search_type: SearchType, community_level: int = COMMUNITY_LEVEL
+) -> Any:
+    """
+    Returns the context builder of the search type at the community level for
+    the project, loading the project if needed. A search which comes in while
+    the project is being preloaded waits for the preload instead of loading it
+    a second time.
+    """
+    # Imported here, so that graphrag is only loaded by the first load
+    from graphrag_ui.service.graphrag_query import build_context_builder
+
+    _record_usage(project_dir)
+    with _project_lock(project_dir):
+        query_data = _current(project_dir)
+        if query_data is None:
+            query_data = QueryData(
+                project=project_dir.name,
+                index_version=get_index_version(project_dir),
+                context_backend=read_project_settings(project_dir).context_backend,
+            )
+        if community_level not in query_data.project_data:
+            _load(project_dir, query_data, community_level)
+        key = (search_type, community_level)
+        if key not in query_data.context_builders:
+            with timed("build_context_builder"):
+                query_data.context_builders[key] = build_context_builder(
+                    project_dir,
+                    search_type,
+                    query_data.project_data[community_level],
+                    community_level,
+                )
+            _measure(query_data)
+        query_data.last_used = time.time()
+        with _lock:
+            _cache[project_dir.name] = query_data
+            _cache.move_to_end(project_dir.name)
+            _evict()
+        return query_data.context_builders[key]
+
+
+def _load(project_dir: Path, query_data: QueryData, community_level: int):
+    # Imported here, so that graphrag is only loaded by the first load
+    from graphrag_ui.service.graphrag_query import load_project_data
+
+    start = time.perf_counter()
+    query_data.project_data[community_level] = load_project_data(
+        project_dir, community_level
+    )
+    _measure(query_data)
+    logger.info(
+        f"Loaded the search data of {project_dir.name} at community level "
+        f"{community_level} ({query_data.size_bytes / MB:.1f} MB in total) "
+        f"in {time.perf_counter() - start:.2f} s"
+    )
+
+
+def _measure(query_data: QueryData):
+    levels = query_data.project_data.values()
+    with timed("measure_footprint"):
+        query_data.footprint = measure_footprint(
+            (
+                [report for reports, _ in levels for report in reports],
+                [entity for _, entities in levels for entity in entities],
+            ),
+            query_data.context_builders.values(),
+        )
+    _measured_sizes[query_data.project] = (
+        query_data.index_version,
+        query_data.context_backend,
+        query_data.size_bytes,
+    )
+    if query_data.size_bytes > cfg.query_memory_mb * MB:
+        logger.warning(
+            f"The search data of {query_data.project} alone takes "
+            f"{query_data.size_bytes / MB:.1f} MB, more than QUERY_MEMORY_MB"
+        )
+
+
+def _evict():
+    """
+    Drops the least recently used projects until the others fit into the
+    limits. The most recently used project is kept, even if it alone does not.
+    Called with the lock held.
+    """
+    budget = cfg.query_memory_mb * MB
+    while len(_cache) > 1:
+        if len(_cache) > cfg.query_cache_size:
+            reason = "count"
+        elif sum(query_data.size_bytes for query_data in _cache.values()) > budget:
+            reason = "memory"
+        else:
+            return
+        project, query_data = _cache.popitem(last=False)
+        EVICTIONS.inc(reason=reason)
+        logger.info(
+            f"Dropped the search data of {project} ({query_data.size_bytes / MB:.1f} MB) "
+            f"to stay within the {reason} limit"
+        )
+
+
+def drop_project(project_dir: Path):
+    with _lock:
+        _cache.pop(project_dir.name, None)
+
+
+def fits_memory_budget(project_dir: Path) -> bool:
+    """Whether the project fits into the memory budget next to the loaded projects."""
+    context_backend = read_project_settings(project_dir).context_backend
+    size = expected_size(project_dir, context_backend)
+    # An outdated version of the project is replaced by the load
+    if loaded_size(except_project=project_dir.name) + size > cfg.query_memory_mb * MB:
+        logger.info(
+            f"Not preloading {project_dir.name}: {size / MB:.1f} MB do not fit into "
+            f"the memory budget of {cfg.query_memory_mb:g} MB"
+        )
+        return False
+    return True
+
+
+def preload(project_dir: Path, job: Job = None) -> bool:
+    """
+    Loads the search data of the project at its community level ahead of a
+    search, if it is not loaded yet and fits into the memory budget next to
+    the loaded projects, so that a speculative load does not drop them.
+    Returns whether the project was loaded.
+    """
+    community_level = resolve_community_level(project_dir)
+    if is_loaded(project_dir, community_level) or not fits_memory_budget(project_dir):
+        return False
+    with stage_timing("preload", project_dir.name):
+        for search_type in PRELOADED_SEARCH_TYPES:
+            get_context_builder(project_dir, search_type, community_level)
+    return True
+
+
+def schedule_preload(project_dir: Path) -> Optional[Job]:
+    """
+    Preloads the project in the background, unless it is loaded already or
+    does not fit into the memory budget, so that page views of such projects
+    do not occupy the job pool. The preload is speculative, so its errors
+    never fail the request.
+    """
+    try:
+        if is_loaded(project_dir) or not fits_memory_budget(project_dir):
+            return None
+        return submit_job(f"preload:{project_dir.name}", preload, project_dir)
+    except Exception as e:
+        logger.error(f"Could not preload {project_dir.name}: {e}")
+        return None
+
+
+def recent_projects(count: int) -> List[Path]:
+    """The indexed projects whose search data was used last, the latest first."""
+    used = []
+    for project_dir in cfg.project_dir.glob("*"):
+        usage_file = project_dir / USAGE_FILE
+        if usage_file.exists():
+            used.append((usage_file.stat().st_mtime, project_dir))
+    return [
+        project_dir
+        for _, project_dir in sorted(used, reverse=True)
+        if get_project_status(project_dir) == ProjectStatus.INDEXED
+    ][:count]
+
+
+def warm_up(job: Job = None) -> List[str]:
+    """Preloads the most recently used projects, the latest first."""
+    warmed_up = []
+    for project_dir in recent_projects(cfg.warm_up_projects):
+        try:
+            if preload(project_dir):
+                warmed_up.append(project_dir.name)
+        except Exception as e:
+            logger.error(f"Could not preload {project_dir.name}: {e}")
+    return warmed_up
+
+
+def start_warm_up():
+    if cfg.warm_up_projects > 0:
+        logger.info(f"Preloading the {cfg.warm_up_projects} most recent projects")
+        submit_job("warm-up", warm_up)
+
+
+def collect_metrics():
+    memory = Gauge(
+        "graphrag_ui_query_memory_bytes",
+        "Estimated memory of the loaded search data",
+        ["project", "component"],
+    )
+    for loaded_project in loaded_projects():
+        for component, size in loaded_project.footprint.items():
+            memory.set(size, project=loaded_project.project, component=component)
+    budget = Gauge(
+        "graphrag_ui_query_memory_budget_bytes",
+        "Memory budget of the loaded search data",
+    )
+    budget.set(cfg.query_memory_mb * MB)
+    return [memory, budget]
+
+
+register_collector(collect_metrics)
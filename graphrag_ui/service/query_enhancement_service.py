@@ -1,10 +1,16 @@
+from functools import cache
 from typing import List
 from pydantic import BaseModel, Field
-from openai import OpenAI
 
 from graphrag_ui.config import cfg
 
-client = OpenAI(api_key=cfg.openai_api_key)
+
+@cache
+def openai_client():
+    # Created on first use, so that openai is only imported when it is needed
+    from openai import OpenAI
+
+    return OpenAI(api_key=cfg.openai_api_key)
 
 
 class Intent(BaseModel):
@@ -61,7 +67,7 @@ Here is the query:
         },
     ]
 
-    completion = client.beta.chat.completions.parse(
+    completion = openai_client().beta.chat.completions.parse(
         model=cfg.open_ai_model,
         messages=search_messages,
         response_format=QueryMetadata,
@@ -0,0 +1,190 @@
+"""
+Selects the community reports which are relevant to a query for the fast
+global search. The global search maps every report of the community level,
+one LLM call per batch of reports, so its cost grows with the corpus. The fast
+global search ranks the reports by the similarity of their embeddings to the
+query embedding and by their rank, and only maps the best ones.
+
+The report embeddings are computed once per index version and stored in the
+UI folder of the project, so that restarts and reloads do not pay for them.
+"""
+
+import math
+
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.config import cfg
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.graphrag_service import get_index_version
+from graphrag_ui.service.project_settings_service import UI_FOLDER
+from graphrag_ui.service.query_enhancement_service import openai_client
+
+REPORT_EMBEDDING_FOLDER = f"{UI_FOLDER}/report_embeddings"
+# Texts per embedding request
+EMBEDDING_BATCH_SIZE = 100
+# Characters of the report content which are embedded if it has no summary
+MAX_EMBEDDED_CHARS = 4000
+
+
+class ReportSelection(BaseModel):
+    total_reports: int = Field(..., description="The reports of the community level")
+    selected_reports: int = Field(..., description="The reports which were mapped")
+    relevant_reports: int = Field(
+        ..., description="The reports whose score reached the threshold"
+    )
+    min_score: float = Field(..., description="The relevance threshold")
+    top_score: float = Field(..., description="The score of the best report")
+    fallback: bool = Field(
+        False,
+        description="Whether all reports were mapped, as too few were relevant",
+    )
+    full_map_calls: int = Field(
+        ..., description="The estimated map calls of a search over all reports"
+    )
+    map_calls: int = Field(0, description="The map calls of the search")
+
+    @property
+    def reports_saved(self) -> int:
+        return self.total_reports - self.selected_reports
+
+    @property
+    def llm_calls_saved(self) -> int:
+        return max(0, self.full_map_calls - self.map_calls)
+
+
+def report_text(report) -> str:
+    return (
+        f"{report.title}\n{report.summary or report.full_content[:MAX_EMBEDDED_CHARS]}"
+    )
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """The normalized embeddings of the texts, one row per text."""
+    vectors = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        response = openai_client().embeddings.create(
+            model=cfg.open_ai_model_embedding,
+            input=texts[start : start + EMBEDDING_BATCH_SIZE],
+        )
+        vectors += [
+            item.embedding for item in sorted(response.data, key=lambda d: d.index)
+        ]
+    embeddings = np.array(vectors, dtype=np.float32).reshape(len(texts), -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def load_report_embeddings(project_dir: Path, reports: list) -> np.ndarray:
+    """
+    The embeddings of the reports, in their order. Only the reports which were
+    not embedded for the current index version before are sent to the API.
+    """
+    embedding_dir = project_dir / REPORT_EMBEDDING_FOLDER
+    embedding_file = embedding_dir / f"{get_index_version(project_dir)}.npz"
+    stored = {}
+    if embedding_file.exists():
+        with np.load(embedding_file) as data:
+            stored = dict(zip(data["ids"].tolist(), data["embeddings"]))
+    missing = [report for report in reports if report.id not in stored]
+    if missing:
+        logger.info(f"Embedding {len(missing)} community reports of {project_dir.name}")
+        stored.update(
+            zip(
+                [report.id for report in missing],
+                embed_texts([report_text(report) for report in missing]),
+            )
+        )
+        embedding_dir.mkdir(parents=True, exist_ok=True)
+        ids = list(stored)
+        np.savez(
+            embedding_file,
+            ids=np.array(ids),
+            embeddings=np.array([stored[i] for i in ids]),
+        )
+        # The embeddings of older index versions are not used anymore
+        for old in embedding_dir.glob("*.npz"):
+            if old != embedding_file:
+                old.unlink(missing_ok=True)
+    return np.array([stored[report.id] for report in reports], dtype=np.float32)
+
+
+class ReportIndex:
+    """The community reports of a project with their embeddings and token counts."""
+
+    def __init__(self, reports: list, entities: list, report_embeddings: np.ndarray):
+        self.reports = reports
+        self.entities = entities
+        self.report_embeddings = report_embeddings
+        self.report_tokens = np.array(
+            [len(cfg.token_encoder.encode(report.full_content)) for report in reports]
+        )
+        self.summary_tokens = np.array(
+            [len(cfg.token_encoder.encode(report.summary or "")) for report in reports]
+        )
+        ranks = np.array([report.rank or 0 for report in reports], dtype=np.float32)
+        self.ranks = ranks / ranks.max() if len(ranks) and ranks.max() > 0 else ranks
+
+    def map_calls(
+        self, indices: np.ndarray, max_tokens: int, use_summary: bool = False
+    ) -> int:
+        """The estimated number of batches the reports are mapped in."""
+        tokens = self.summary_tokens if use_summary else self.report_tokens
+        return math.ceil(int(tokens[indices].sum()) / max_tokens)
+
+    def select(
+        self,
+        query_embedding: np.ndarray,
+        max_tokens: int,
+        top_n: int = None,
+        min_score: float = None,
+        min_reports: int = None,
+        rank_weight: float = None,
+        fallback: bool = None,
+        use_summary: bool = False,
+    ) -> Tuple[list, ReportSelection]:
+        """
+        The reports scoring at least min_score, at most top_n of them. If
+        fewer than min_reports score high enough, all reports are selected
+        with fallback, else the best min_reports. The map calls are estimated
+        for the summaries with use_summary.
+        """
+        top_n = cfg.fast_global_top_n if top_n is None else top_n
+        min_score = cfg.fast_global_min_score if min_score is None else min_score
+        min_reports = (
+            cfg.fast_global_min_reports if min_reports is None else min_reports
+        )
+        rank_weight = (
+            cfg.fast_global_rank_weight if rank_weight is None else rank_weight
+        )
+        fallback = cfg.fast_global_fallback if fallback is None else fallback
+
+        similarity = self.report_embeddings @ query_embedding
+        scores = (1 - rank_weight) * similarity + rank_weight * self.ranks
+        order = np.argsort(-scores, kind="stable")
+        relevant = order[scores[order] >= min_score]
+        selected = relevant[:top_n]
+        too_few = len(selected) < min(min_reports, len(order))
+        if too_few:
+            selected = order if fallback else order[:min_reports]
+        selection = ReportSelection(
+            total_reports=len(self.reports),
+            selected_reports=len(selected),
+            relevant_reports=len(relevant),
+            min_score=min_score,
+            top_score=round(float(scores[order[0]]), 3) if len(order) else 0,
+            fallback=too_few and fallback,
+            full_map_calls=self.map_calls(order, max_tokens, use_summary),
+        )
+        return [self.reports[i] for i in sorted(selected)], selection
+
+
+def build_report_index(
+    project_dir: Path, project_data: Tuple[list, list]
+) -> ReportIndex:
+    reports, entities = project_data
+    return ReportIndex(reports, entities, load_report_embeddings(project_dir, reports))
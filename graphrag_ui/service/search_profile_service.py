@@ -0,0 +1,138 @@
+"""
+Named bundles of the search settings, which trade the depth of the answers
+for latency and tokens. The fast profile builds smaller contexts and maps the
+report summaries instead of the full reports, the thorough profile builds
+larger contexts and longer answers.
+
+The profile of the searches is configured by SEARCH_PROFILE, can be set per
+project and chosen per search.
+"""
+
+from enum import StrEnum
+from pathlib import Path
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from graphrag_ui.config import cfg
+from graphrag_ui.service.graphrag_constants import GLOBAL_MAX_TOKENS
+from graphrag_ui.service.project_settings_service import read_project_settings
+
+# The choice of the project's profile, or of the configured profile for a project
+DEFAULT_PROFILE = "default"
+
+
+class SearchProfileName(StrEnum):
+    FAST = "fast"
+    BALANCED = "balanced"
+    THOROUGH = "thorough"
+
+
+class SearchProfile(BaseModel):
+    name: SearchProfileName = Field(..., description="The name of the profile")
+    description: str = Field(..., description="What the profile trades")
+    local_max_tokens: int = Field(
+        ..., description="The tokens of the local search context"
+    )
+    top_k_mapped_entities: int = Field(
+        ..., description="The entities the local search maps the query to"
+    )
+    top_k_relationships: int = Field(
+        ..., description="The out-of-network relationships of the local search context"
+    )
+    local_response_max_tokens: int = Field(
+        ..., description="The tokens of the local search answer"
+    )
+    use_community_summary: bool = Field(
+        ..., description="Whether the global search maps the report summaries"
+    )
+    global_max_tokens: int = Field(
+        ..., description="The report tokens of one map call of the global search"
+    )
+    map_max_tokens: int = Field(..., description="The tokens of a map answer")
+    reduce_max_tokens: int = Field(
+        ..., description="The tokens of the global search answer"
+    )
+    reduce_max_data_tokens: int = Field(
+        ..., description="The tokens of the map answers which are reduced"
+    )
+    concurrent_coroutines: int = Field(
+        ..., description="The map calls of the global search running at once"
+    )
+
+
+SEARCH_PROFILES: Dict[SearchProfileName, SearchProfile] = {
+    profile.name: profile
+    for profile in [
+        SearchProfile(
+            name=SearchProfileName.FAST,
+            description="Report summaries and small contexts, the lowest latency",
+            local_max_tokens=5_000,
+            top_k_mapped_entities=5,
+            top_k_relationships=5,
+            local_response_max_tokens=1_000,
+            use_community_summary=True,
+            global_max_tokens=8_000,
+            map_max_tokens=500,
+            reduce_max_tokens=1_000,
+            reduce_max_data_tokens=8_000,
+            concurrent_coroutines=32,
+        ),
+        SearchProfile(
+            name=SearchProfileName.BALANCED,
+            description="Full reports and medium contexts",
+            local_max_tokens=12_000,
+            top_k_mapped_entities=10,
+            top_k_relationships=10,
+            local_response_max_tokens=2_000,
+            use_community_summary=False,
+            global_max_tokens=GLOBAL_MAX_TOKENS,
+            map_max_tokens=1_000,
+            reduce_max_tokens=2_000,
+            reduce_max_data_tokens=12_000,
+            concurrent_coroutines=32,
+        ),
+        SearchProfile(
+            name=SearchProfileName.THOROUGH,
+            description="Full reports, large contexts and long answers",
+            local_max_tokens=20_000,
+            top_k_mapped_entities=20,
+            top_k_relationships=20,
+            local_response_max_tokens=3_000,
+            use_community_summary=False,
+            global_max_tokens=16_000,
+            map_max_tokens=1_500,
+            reduce_max_tokens=3_000,
+            reduce_max_data_tokens=20_000,
+            # Fewer at once, as every call sends more tokens
+            concurrent_coroutines=16,
+        ),
+    ]
+}
+
+
+def default_profile_choice(project_dir: Path) -> str:
+    """The profile of the project's searches."""
+    return read_project_settings(project_dir).search_profile or cfg.search_profile
+
+
+def profile_setting(choice: str) -> Optional[SearchProfileName]:
+    """The profile stored for a project, None for the configured default."""
+    if choice in ("", DEFAULT_PROFILE):
+        return None
+    try:
+        return SearchProfileName(choice)
+    except ValueError:
+        raise ValueError(f"Invalid search profile: {choice}")
+
+
+def resolve_search_profile(
+    project_dir: Path, choice: Optional[str] = None
+) -> SearchProfile:
+    """The profile of a search: the chosen one, else the project's."""
+    if choice in (None, "", DEFAULT_PROFILE):
+        choice = default_profile_choice(project_dir)
+    try:
+        return SEARCH_PROFILES[SearchProfileName(choice)]
+    except ValueError:
+        raise ValueError(f"Invalid search profile: {choice}")
@@ -0,0 +1,300 @@
+"""
+Runs the searches as tasks which are cancelled when the client disconnects or
+the user cancels them, so that no LLM calls are spent on answers which nobody
+waits for anymore.
+
+Identical searches which run at the same time are coalesced: only the first
+one runs and the others wait for its result. The search stops only when all
+of its waiters are gone.
+"""
+
+import asyncio
+import time
+import uuid
+
+from enum import StrEnum
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from starlette.requests import Request
+
+from graphrag_ui.logger_factory import logger
+from graphrag_ui.service.metrics_service import (
+    Counter,
+    Gauge,
+    Metric,
+    register_collector,
+)
+
+# Seconds between the checks whether the client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class CancelReason(StrEnum):
+    DISCONNECTED = "disconnected"
+    USER = "user"
+    SUPERSEDED = "superseded"
+
+
+class SearchCancelled(Exception):
+    def __init__(self, reason: CancelReason):
+        super().__init__(f"Search cancelled: {reason}")
+        self.reason = reason
+
+
+class SearchUsage(BaseModel):
+    completed: int = Field(0, description="The number of completed searches")
+    llm_calls: int = Field(0, description="The LLM calls of the completed searches")
+    prompt_tokens: int = Field(
+        0, description="The prompt tokens of the completed searches"
+    )
+    seconds: float = Field(0, description="The duration of the completed searches")
+
+    def add(self, result: Any, seconds: float):
+        self.completed += 1
+        self.llm_calls += getattr(result, "llm_calls", 0) or 0
+        self.prompt_tokens += getattr(result, "prompt_tokens", 0) or 0
+        self.seconds += seconds
+
+    def remaining(self, elapsed: float) -> float:
+        """The share of an average search which still had to run after elapsed seconds."""
+        if self.completed == 0 or self.seconds == 0:
+            return 0
+        return max(0.0, 1 - elapsed / (self.seconds / self.completed))
+
+
+class SearchMetrics(BaseModel):
+    started: int = Field(0, description="The number of started searches")
+    coalesced: int = Field(
+        0, description="The number of requests which waited for an identical search"
+    )
+    coalesced_llm_calls_saved: int = Field(
+        0, description="The LLM calls which the coalesced requests did not make"
+    )
+    coalesced_tokens_saved: int = Field(
+        0, description="The prompt tokens which the coalesced requests did not send"
+    )
+    completed: int = Field(0, description="The number of completed searches")
+    failed: int = Field(0, description="The number of failed searches")
+    cancelled: Dict[CancelReason, int] = Field(
+        default_factory=dict, description="The number of cancelled searches by reason"
+    )
+    cancelled_seconds: float = Field(
+        0, description="The time spent on searches before they were cancelled"
+    )
+    llm_calls_saved: float = Field(
+        0, description="The estimated LLM calls which cancelled searches did not make"
+    )
+    tokens_saved: float = Field(
+        0,
+        description="The estimated prompt tokens which cancelled searches did not send",
+    )
+    usage: Dict[str, SearchUsage] = Field(
+        default_factory=dict, description="The usage of completed searches by kind"
+    )
+
+    def record_cancellation(
+        self, kind: str, reason: CancelReason, elapsed: float, stopped: bool = True
+    ):
+        """
+        Counts a cancelled request. Only if this stopped the search, the
+        savings are estimated from the average search of the same kind.
+        """
+        self.cancelled[reason] = self.cancelled.get(reason, 0) + 1
+        if not stopped:
+            logger.info(f"Cancelled {kind} search ({reason}), still awaited by others")
+            return
+        usage = self.usage.get(kind, SearchUsage())
+        remaining = usage.remaining(elapsed)
+        llm_calls_saved = remaining * usage.llm_calls / max(usage.completed, 1)
+        tokens_saved = remaining * usage.prompt_tokens / max(usage.completed, 1)
+        self.cancelled_seconds += elapsed
+        self.llm_calls_saved += llm_calls_saved
+        self.tokens_saved += tokens_saved
+        logger.info(
+            f"Cancelled {kind} search ({reason}) after {elapsed:.1f}s, "
+            f"saved ~{llm_calls_saved:.1f} LLM calls and ~{tokens_saved:.0f} tokens"
+        )
+
+
+class Flight:
+    """A running search with the requests waiting for it."""
+
+    def __init__(self, kind: str, task: asyncio.Task):
+        self.kind = kind
+        self.task = task
+        self.started_at = time.time()
+        self.waiters = 0
+        self.coalesced = 0
+        task.add_done_callback(self.finished)
+
+    def leave(self, reason: CancelReason):
+        self.waiters -= 1
+        stopped = self.waiters == 0 and not self.task.done()
+        if stopped:
+            self.task.cancel()
+        metrics.record_cancellation(
+            self.kind, reason, time.time() - self.started_at, stopped
+        )
+
+    def finished(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            metrics.failed += 1
+            return
+        result = task.result()
+        metrics.completed += 1
+        metrics.usage.setdefault(self.kind, SearchUsage()).add(
+            result, time.time() - self.started_at
+        )
+        metrics.coalesced_llm_calls_saved += self.coalesced * (
+            getattr(result, "llm_calls", 0) or 0
+        )
+        metrics.coalesced_tokens_saved += self.coalesced * (
+            getattr(result, "prompt_tokens", 0) or 0
+        )
+
+
+class RunningSearch:
+    """A request waiting for a flight, which it can leave without stopping it."""
+
+    def __init__(self, flight: Flight):
+        self.flight = flight
+        self.task = asyncio.shield(flight.task)
+        self.reason = None
+        flight.waiters += 1
+
+    def cancel(self, reason: CancelReason):
+        if not self.task.done() and self.reason is None:
+            self.reason = reason
+            self.task.cancel()
+            self.flight.leave(reason)
+
+
+metrics = SearchMetrics()
+_running: Dict[Tuple[str, str], RunningSearch] = {}
+_flights: Dict[Hashable, Flight] = {}
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+def search_key(project_dir: Path, kind: str, query: str, **params) -> Tuple:
+    """The key under which identical searches are coalesced."""
+    return (
+        str(project_dir),
+        str(kind),
+        normalize_query(query),
+        tuple(sorted((name, str(value)) for name, value in params.items())),
+    )
+
+
+def join_flight(
+    kind: str, search: Callable[[], Awaitable[Any]], key: Optional[Hashable]
+) -> Flight:
+    flight = _flights.get(key) if key is not None else None
+    if flight is not None and not flight.task.done():
+        flight.coalesced += 1
+        metrics.coalesced += 1
+        logger.info(f"Coalesced {kind} search with {flight.waiters} waiting requests")
+        return flight
+    flight = Flight(kind, asyncio.ensure_future(search()))
+    metrics.started += 1
+    if key is not None:
+        _flights[key] = flight
+        flight.task.add_done_callback(
+            lambda _: _flights.pop(key) if _flights.get(key) is flight else None
+        )
+    return flight
+
+
+async def run_search(
+    request: Request,
+    search_id: str,
+    kind: str,
+    search: Callable[[], Awaitable[Any]],
+    key: Optional[Hashable] = None,
+) -> Any:
+    """
+    Runs the search until it finishes, the client disconnects or the search is
+    cancelled with cancel_searches. A new search of the same kind and search id,
+    e.g. the same search form, supersedes a running one. If a search with the
+    same key is running already, its result is awaited instead.
+    Raises SearchCancelled if the search did not finish.
+    """
+    running_key = (search_id or uuid.uuid4().hex, kind)
+    running = RunningSearch(join_flight(kind, search, key))
+    if (previous := _running.get(running_key)) is not None:
+        previous.cancel(CancelReason.SUPERSEDED)
+    _running[running_key] = running
+    try:
+        while not running.task.done():
+            await asyncio.wait({running.task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if not running.task.done() and await request.is_disconnected():
+                running.cancel(CancelReason.DISCONNECTED)
+        return await running.task
+    except asyncio.CancelledError:
+        if running.reason is None:
+            # The request itself was cancelled, e.g. on shutdown
+            running.cancel(CancelReason.DISCONNECTED)
+            raise
+        raise SearchCancelled(running.reason)
+    finally:
+        if _running.get(running_key) is running:
+            del _running[running_key]
+
+
+def collect_metrics() -> List[Metric]:
+    searches = Counter(
+        "graphrag_ui_searches_total",
+        "Executed searches by outcome, coalesced requests are not counted",
+        ["outcome"],
+    )
+    searches.inc(metrics.started, outcome="started")
+    searches.inc(metrics.completed, outcome="completed")
+    searches.inc(metrics.failed, outcome="failed")
+    cancelled = Counter(
+        "graphrag_ui_search_cancellations_total",
+        "Search requests cancelled before the search finished",
+        ["reason"],
+    )
+    for reason, count in metrics.cancelled.items():
+        cancelled.inc(count, reason=reason)
+    coalesced = Counter(
+        "graphrag_ui_search_coalesced_total",
+        "Search requests which waited for an identical running search",
+    )
+    coalesced.inc(metrics.coalesced)
+    saved_tokens = Counter(
+        "graphrag_ui_search_saved_prompt_tokens_total",
+        "Prompt tokens not sent thanks to cancelled (estimated) and coalesced searches",
+        ["cause"],
+    )
+    saved_tokens.inc(metrics.tokens_saved, cause="cancelled")
+    saved_tokens.inc(metrics.coalesced_tokens_saved, cause="coalesced")
+    saved_calls = Counter(
+        "graphrag_ui_search_saved_llm_calls_total",
+        "LLM calls not made thanks to cancelled (estimated) and coalesced searches",
+        ["cause"],
+    )
+    saved_calls.inc(metrics.llm_calls_saved, cause="cancelled")
+    saved_calls.inc(metrics.coalesced_llm_calls_saved, cause="coalesced")
+    running = Gauge("graphrag_ui_searches_running", "Searches running right now")
+    running.set(len({running.flight for running in _running.values()}))
+    return [searches, cancelled, coalesced, saved_tokens, saved_calls, running]
+
+
+register_collector(collect_metrics)
+
+
+def cancel_searches(search_id: str) -> int:
+    """Cancels the running searches of the search id and returns their number."""
+    cancelled = 0
+    for (running_id, _), running in list(_running.items()):
+        if running_id == search_id and not running.task.done():
+            running.cancel(CancelReason.USER)
+            cancelled += 1
+    return cancelled
@@ -0,0 +1,71 @@
+import gzip
+import os
+
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from graphrag_ui.ui.assets import (
+    PageGZipMiddleware,
+    choose_encoding,
+    gzip_content,
+    load_asset,
+    precompress_assets,
+)
+
+
+def write_asset(assets_dir: Path) -> Path:
+    css_file = assets_dir / "css/main.css"
+    css_file.parent.mkdir(parents=True)
+    css_file.write_text("body { color: white; }\n" * 100)
+    return css_file
+
+
+def test_load_asset(tmp_path: Path):
+    write_asset(tmp_path)
+    asset = load_asset("css/main.css", tmp_path)
+    assert asset.name == "css/main.css"
+    assert asset.hashed_name == f"css/main.{asset.content_hash[:10]}.css"
+    assert asset.etag() != asset.etag("gzip")
+    assert load_asset("../outside.css", tmp_path / "css") is None
+    assert load_asset("css/missing.css", tmp_path) is None
+
+
+def test_precompressed_variants(tmp_path: Path):
+    css_file = write_asset(tmp_path)
+    written = precompress_assets(tmp_path)
+    assert css_file.with_name("main.css.gz") in written
+    asset = load_asset("css/main.css", tmp_path)
+    assert choose_encoding(asset, "gzip, deflate") == "gzip"
+    assert choose_encoding(asset, "gzip;q=0, deflate") is None
+    assert choose_encoding(asset, "") is None
+    # A variant older than the asset is stale
+    stat = css_file.stat()
+    os.utime(css_file, (stat.st_atime, stat.st_mtime + 10))
+    assert choose_encoding(load_asset("css/main.css", tmp_path), "gzip") is None
+
+
+def test_assets_without_variants_are_gzipped(tmp_path: Path):
+    css_file = write_asset(tmp_path)
+    asset = load_asset("css/main.css", tmp_path)
+    assert choose_encoding(asset, "gzip") is None
+    assert gzip.decompress(gzip_content(asset, "gzip")) == css_file.read_bytes()
+    assert gzip_content(asset, "br") is None
+    assert gzip_content(asset, "gzip;q=0") is None
+
+
+def test_middleware_leaves_the_assets_alone():
+    def large(request):
+        return PlainTextResponse("x" * 5000, headers={"ETag": '"0123"'})
+
+    app = Starlette(routes=[Route("/page", large), Route("/css/main.css", large)])
+    app.add_middleware(PageGZipMiddleware, minimum_size=100)
+    client = TestClient(app)
+    page = client.get("/page", headers={"Accept-Encoding": "gzip"})
+    assert page.headers["Content-Encoding"] == "gzip"
+    asset = client.get("/css/main.css", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in asset.headers
+    assert asset.headers["ETag"] == '"0123"'
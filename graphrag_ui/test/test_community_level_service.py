@@ -0,0 +1,96 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from graphrag.query.indexer_adapters import read_indexer_reports
+
+from graphrag_ui.benchmark.synthetic_project import generate_project, ProjectScale
+from graphrag_ui.config import cfg
+from graphrag_ui.service import community_level_service
+from graphrag_ui.service.community_level_service import (
+    AUTO_LEVEL,
+    LEVELS_FILE,
+    CommunityLevel,
+    auto_level,
+    community_levels,
+    level_setting,
+    resolve_community_level,
+)
+from graphrag_ui.service.graphrag_constants import COMMUNITY_REPORT_TABLE, ENTITY_TABLE
+from graphrag_ui.service.project_settings_service import update_project_settings
+
+SCALE = ProjectScale(
+    entities=60, relationships=80, reports=21, text_units=20, dimensions=8
+)
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path) -> Path:
+    return generate_project(tmp_path / "p", SCALE)
+
+
+def test_levels_are_counted_like_the_reports_are_read(project_dir: Path):
+    levels = community_levels(project_dir)
+    report_df = pd.read_parquet(
+        project_dir / "output" / f"{COMMUNITY_REPORT_TABLE}.parquet"
+    )
+    node_df = pd.read_parquet(project_dir / "output" / f"{ENTITY_TABLE}.parquet")
+    assert [level.level for level in levels] == [0, 1, 2]
+    for level in levels:
+        reports = read_indexer_reports(report_df, node_df.copy(), level.level)
+        assert level.reports == len(reports)
+        assert level.tokens == sum(
+            len(cfg.token_encoder.encode(report.full_content)) for report in reports
+        )
+        assert 0 < level.summary_tokens < level.tokens
+
+
+def test_levels_are_counted_once_per_index_version(project_dir: Path, monkeypatch):
+    levels = community_levels(project_dir)
+    assert (project_dir / LEVELS_FILE).exists()
+
+    def count_levels(*_):
+        raise AssertionError("counted again")
+
+    monkeypatch.setattr(community_level_service, "count_levels", count_levels)
+    assert community_levels(project_dir) == levels
+
+
+def test_auto_level_is_the_deepest_level_within_the_budgets(monkeypatch):
+    levels = [
+        CommunityLevel(level=0, reports=3, tokens=5_000, summary_tokens=500),
+        CommunityLevel(level=1, reports=10, tokens=30_000, summary_tokens=3_000),
+        CommunityLevel(level=2, reports=40, tokens=110_000, summary_tokens=11_000),
+    ]
+    monkeypatch.setattr(cfg, "auto_level_max_map_calls", 3)
+    monkeypatch.setattr(cfg, "auto_level_max_tokens", 0)
+    assert auto_level(levels, max_tokens=10_000) == 1
+    assert auto_level(levels, max_tokens=40_000) == 2
+    monkeypatch.setattr(cfg, "auto_level_max_tokens", 20_000)
+    assert auto_level(levels, max_tokens=40_000) == 0
+    monkeypatch.setattr(cfg, "auto_level_max_map_calls", 0)
+    monkeypatch.setattr(cfg, "auto_level_max_tokens", 1_000)
+    assert auto_level(levels) == 0
+
+
+def test_resolve_community_level(project_dir: Path, monkeypatch):
+    monkeypatch.setattr(cfg, "community_level", "2")
+    assert resolve_community_level(project_dir) == 2
+    assert resolve_community_level(project_dir, "1") == 1
+    update_project_settings(project_dir, community_level="0")
+    assert resolve_community_level(project_dir) == 0
+    update_project_settings(project_dir, community_level=AUTO_LEVEL)
+    monkeypatch.setattr(cfg, "auto_level_max_map_calls", 1_000)
+    assert resolve_community_level(project_dir) == 2
+    with pytest.raises(ValueError):
+        resolve_community_level(project_dir, "deepest")
+
+
+def test_only_levels_and_auto_are_stored():
+    assert level_setting("1") == "1"
+    assert level_setting(AUTO_LEVEL) == AUTO_LEVEL
+    assert level_setting("") is None
+    for choice in ["deep", "-1", "1.5"]:
+        with pytest.raises(ValueError):
+            level_setting(choice)
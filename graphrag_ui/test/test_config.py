@@ -1,8 +1,14 @@
+import json
 import os
+import subprocess
+import sys
+
 import pytest
+
 from graphrag_ui.config import Config, cfg
 from graphrag.query.llm.oai.chat_openai import ChatOpenAI
 from graphrag.query.llm.oai.typing import OpenaiApiType
+from graphrag_ui.benchmark.startup_benchmark import DEFERRED_MODULES
 
 
 def test_config_initialization():
@@ -46,3 +52,21 @@ def test_environment_variables(env_var):
 def test_config_singleton():
     new_config = Config()
     assert new_config is cfg, "Config should be a singleton"
+
+
+def test_startup_does_not_load_deferred_modules(tmp_path):
+    # A fresh process, as the tests have loaded all modules already
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, json; import graphrag_ui.ui.main; "
+            f"print(json.dumps([m for m in {DEFERRED_MODULES} if m in sys.modules]))",
+        ],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert json.loads(loaded.splitlines()[-1]) == []
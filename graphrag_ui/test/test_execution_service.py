@@ -0,0 +1,40 @@
+import asyncio
+import os
+import time
+
+from contextvars import ContextVar
+
+from graphrag_ui.service.execution_service import run_blocking, run_in_process
+
+request_id: ContextVar[str] = ContextVar("request_id", default="")
+
+
+def test_run_blocking_keeps_the_loop_responsive():
+    def blocking_read() -> str:
+        time.sleep(0.3)
+        return request_id.get()
+
+    async def main():
+        request_id.set("request-1")
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        result = await run_blocking(blocking_read)
+        ticker.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(main())
+    # The context variables are passed on to the thread
+    assert result == "request-1"
+    assert ticks > 10
+
+
+def test_run_in_process():
+    pid = asyncio.run(run_in_process(os.getpid))
+    assert pid != os.getpid()
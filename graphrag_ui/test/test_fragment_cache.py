@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from fasthtml.common import Div
+
+from graphrag_ui.ui.fragment_cache import cached, cached_fragment, invalidate_project
+
+
+def test_cached_until_invalidated(tmp_path: Path):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cached(tmp_path, "value", compute) == 1
+    assert cached(tmp_path, "value", compute) == 1
+    assert cached(tmp_path, "value", compute, "other") == 2
+    invalidate_project(tmp_path)
+    assert cached(tmp_path, "value", compute) == 3
+
+
+def test_cached_until_project_changes(tmp_path: Path):
+    calls = []
+    (tmp_path / "output").mkdir()
+
+    def render():
+        calls.append(1)
+        return [Div(f.name) for f in (tmp_path / "output").iterdir()]
+
+    assert str(cached_fragment(tmp_path, "files", render)) == ""
+    (tmp_path / "output" / "entities.parquet").touch()
+    assert "entities.parquet" in cached_fragment(tmp_path, "files", render)
+    cached_fragment(tmp_path, "files", render)
+    assert len(calls) == 2
@@ -0,0 +1,31 @@
+import threading
+import time
+
+from graphrag_ui.service import job_service
+from graphrag_ui.service.job_service import find_job, get_job, submit_job
+
+
+def wait(job):
+    for _ in range(100):
+        if job.done:
+            return
+        time.sleep(0.01)
+
+
+def test_running_job_is_reused():
+    release = threading.Event()
+    job = submit_job("test:running", lambda job: release.wait(5))
+    assert submit_job("test:running", lambda job: None) is job
+    release.set()
+    wait(job)
+
+
+def test_only_the_latest_job_of_a_name_is_kept():
+    jobs = []
+    for i in range(3):
+        jobs.append(submit_job("test:latest", lambda job, i=i: i))
+        wait(jobs[-1])
+    assert find_job("test:latest") is jobs[-1]
+    assert jobs[-1].result == 2
+    assert [get_job(job.id) for job in jobs[:-1]] == [None, None]
+    assert sum(job.name == "test:latest" for job in job_service._jobs.values()) == 1
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from graphrag_ui.service.loop_lag_service import LoopLagMonitor
+
+
+def test_loop_lag_monitor_measures_blocking():
+    monitor = LoopLagMonitor(interval_s=0.01)
+
+    async def block():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)
+        await asyncio.sleep(0.05)
+        monitor.stop()
+
+    asyncio.run(block())
+    stats = monitor.stats()
+    assert stats.samples > 1
+    assert stats.max_ms >= 150
+    assert stats.p50_ms < stats.max_ms
+    assert not monitor.running
+    monitor.reset()
+    assert monitor.stats().samples == 0
+
+
+def test_loop_lag_monitor_logs_blocking_stack(caplog):
+    monitor = LoopLagMonitor(interval_s=0.01, block_threshold_s=0.05)
+
+    async def block():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)
+        await asyncio.sleep(0.05)
+        monitor.stop()
+
+    with caplog.at_level("WARNING"):
+        asyncio.run(block())
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("has been blocked" in m and "in block" in m for m in messages)
+    assert any(m.startswith("The event loop was blocked for") for m in messages)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from graphrag_ui.service.memory_service import (
+    SAMPLE_SIZE,
+    MemoryComponent,
+    deep_size,
+    measure_footprint,
+)
+
+
+class Entity:
+    def __init__(self, description: str, dimensions: int):
+        self.description = description
+        self.description_embedding = [float(i) for i in range(dimensions)]
+
+
+class LocalContext:
+    def __init__(self, text_units: list):
+        self.text_units = {i: unit for i, unit in enumerate(text_units)}
+        self.relationships = {}
+        self.covariates = {"claims": []}
+
+
+def test_deep_size_counts_shared_objects_once():
+    text = "x" * 10_000
+    assert 10_000 < deep_size([text]) < 11_000
+    assert 10_000 < deep_size([text, text, {"a": text}]) < 11_000
+    embeddings = np.zeros((100, 10))
+    assert deep_size(embeddings[:50]) >= embeddings.nbytes
+
+
+def test_deep_size_extrapolates_long_lists():
+    items = [str(i).zfill(1000) for i in range(SAMPLE_SIZE * 10)]
+    exact = sum(len(item) for item in items)
+    assert 0.95 * exact < deep_size(items) < 1.1 * exact
+
+
+def test_measure_footprint():
+    entities = [Entity(f"entity {i}" * 100, 100) for i in range(50)]
+    footprint = measure_footprint(
+        ([], entities), [LocalContext(text_units=["text unit" * 1000])]
+    )
+    assert set(footprint) == set(MemoryComponent)
+    # 100 floats of 24 bytes and the list, per entity
+    assert 50 * 100 * 24 < footprint[MemoryComponent.EMBEDDINGS] < 50 * 100 * 40
+    assert 50 * 800 < footprint[MemoryComponent.ENTITIES] < 50 * 2000
+    assert 9000 < footprint[MemoryComponent.TEXT_UNITS] < 10_000
+    assert footprint[MemoryComponent.REPORTS] == 0
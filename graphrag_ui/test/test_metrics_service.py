@@ -0,0 +1,53 @@
+import logging
+
+from graphrag_ui.service.metrics_service import (
+    Counter,
+    Histogram,
+    stage_timing,
+    timed,
+    STAGE_SECONDS,
+)
+
+
+def test_render_histogram_and_counter():
+    histogram = Histogram("test_seconds", "Test durations", ["stage"], [0.1, 1])
+    histogram.observe(0.05, stage="load")
+    histogram.observe(0.5, stage="load")
+    histogram.observe(2, stage="load")
+    counter = Counter("test_total", "Test counter", ["project"])
+    counter.inc(3, project='a "quoted" name')
+    lines = histogram.render() + counter.render()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{stage="load",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="load",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="load",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{stage="load"} 2.55' in lines
+    assert 'test_total{project="a \\"quoted\\" name"} 3' in lines
+
+
+def test_stage_timing(caplog):
+    class Result:
+        llm_calls = 3
+        prompt_tokens = 1200
+
+    with caplog.at_level(logging.INFO, logger="graphrag_ui.timing"):
+        with stage_timing("search", "timing-project", "global") as timing:
+            with timed("load_project_data"):
+                pass
+            for _ in range(2):
+                with timed("llm"):
+                    pass
+            timing.record_usage(Result())
+    assert timing.counts == {"load_project_data": 1, "llm": 2, "total": 1}
+    line = caplog.records[-1].getMessage()
+    assert line.startswith('search project="timing-project" search_type=global')
+    assert "llm_count=2" in line and "prompt_tokens=1200" in line
+    rendered = "\n".join(STAGE_SECONDS.render())
+    assert (
+        'graphrag_ui_stage_seconds_count{stage="llm",project="timing-project",search_type="global"} 2'
+        in rendered
+    )
+    assert (
+        'graphrag_ui_stage_seconds_count{stage="search",project="timing-project",search_type="global"} 1'
+        in rendered
+    )
@@ -0,0 +1,163 @@
+import pandas as pd
+import pytest
+
+from graphrag_ui.config import cfg
+from graphrag_ui.service.neo4j_context_builder import (
+    CLAIM_QUERY,
+    ENTITY_QUERY,
+    PROJECT_ENTITY_QUERY,
+    RELATIONSHIP_QUERY,
+    REPORT_QUERY,
+    TEXT_UNIT_QUERY,
+    Neo4jLocalSearchContext,
+)
+
+
+class WordEncoder:
+    """Counts the words as tokens, so that the budgets are easy to follow."""
+
+    def encode(self, text: str) -> list:
+        return text.split()
+
+
+class Embedder:
+    def embed(self, text: str) -> list:
+        return [0.1, 0.2]
+
+
+class Record:
+    def __init__(self, values: list):
+        self._values = values
+
+    def values(self) -> list:
+        return self._values
+
+
+class FakeDriver:
+    """Answers the Cypher queries of the context builder with fixed rows."""
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+        self.queries = []
+
+    def execute_query(self, query: str, **parameters):
+        self.queries.append((query, parameters))
+        keys, rows = self.tables[query]
+        return [Record(row) for row in rows], None, keys
+
+
+ENTITIES = (
+    ["id", "human_readable_id", "entity", "description", "rank"],
+    [["e1", 1, "ALICE", "a person", 2], ["e2", 2, "BOB", "another person", 1]],
+)
+
+TABLES = {
+    ENTITY_QUERY: ENTITIES,
+    PROJECT_ENTITY_QUERY: ENTITIES,
+    REPORT_QUERY: (
+        ["id", "title", "summary", "content", "rank", "matches"],
+        [["7", "Friends", "short summary", "the full report", 5.0, 2]],
+    ),
+    RELATIONSHIP_QUERY: (
+        ["id", "source", "target", "description", "weight", "rank", "in_network"],
+        [[3, "ALICE", "BOB", "knows", 1.0, 3, True]],
+    ),
+    CLAIM_QUERY: (
+        ["id", "entity", "object", "type", "status", "description"],
+        [],
+    ),
+    TEXT_UNIT_QUERY: (["id", "text", "matches"], [["t1", "Alice knows Bob", 2]]),
+}
+
+
+@pytest.fixture
+def driver(monkeypatch) -> FakeDriver:
+    driver = FakeDriver(dict(TABLES))
+    # Set on the instance, as reading the cached driver connects to Neo4J
+    monkeypatch.setitem(vars(cfg.neo4j), "driver", driver)
+    return driver
+
+
+def create_builder(community_level: int = 1) -> Neo4jLocalSearchContext:
+    return Neo4jLocalSearchContext(
+        project="p",
+        text_embedder=Embedder(),
+        token_encoder=WordEncoder(),
+        community_level=community_level,
+    )
+
+
+def test_sections_are_built_in_order(driver: FakeDriver):
+    context, context_data = create_builder().build_context("Who knows Bob?")
+    headers = [line for line in context.splitlines() if line.startswith("-----")]
+    assert headers == [
+        "-----Reports-----",
+        "-----Entities-----",
+        "-----Relationships-----",
+        "-----Sources-----",
+    ]
+    assert list(context_data) == ["reports", "entities", "relationships", "sources"]
+    assert "7|Friends|the full report" in context
+    assert "1|ALICE|a person|2" in context
+
+
+def test_reports_are_those_of_the_community_level(driver: FakeDriver):
+    create_builder(community_level=1).build_context("Who knows Bob?")
+    parameters = dict(driver.queries)[REPORT_QUERY]
+    assert parameters["level"] == 1
+    assert parameters["ids"] == ["e1", "e2"]
+
+
+def test_community_summaries_are_used(driver: FakeDriver):
+    context, _ = create_builder().build_context(
+        "Who knows Bob?", use_community_summary=True
+    )
+    assert "7|Friends|short summary" in context
+    assert "the full report" not in context
+
+
+def test_no_entities_build_no_context(driver: FakeDriver):
+    driver.tables[ENTITY_QUERY] = (ENTITIES[0], [])
+    driver.tables[PROJECT_ENTITY_QUERY] = (ENTITIES[0], [])
+    assert create_builder().build_context("Who knows Bob?") == ("", {})
+    assert [query for query, _ in driver.queries] == [
+        ENTITY_QUERY,
+        PROJECT_ENTITY_QUERY,
+    ]
+
+
+def test_entities_of_a_small_project_are_found(driver: FakeDriver):
+    # All candidates of the vector index belong to other projects
+    driver.tables[ENTITY_QUERY] = (ENTITIES[0], [])
+    context, _ = create_builder().build_context("Who knows Bob?")
+    assert "1|ALICE|a person|2" in context
+    parameters = dict(driver.queries)[PROJECT_ENTITY_QUERY]
+    assert parameters["project"] == "p" and parameters["top_k"] == 10
+
+
+def test_enough_candidates_are_not_searched_again(driver: FakeDriver):
+    create_builder().build_context("Who knows Bob?", top_k_mapped_entities=2)
+    assert PROJECT_ENTITY_QUERY not in dict(driver.queries)
+
+
+def test_sections_stay_within_their_tokens():
+    builder = create_builder()
+    df = pd.DataFrame({"id": ["1", "2", "3"], "text": ["a b", "c d", "e f"]})
+    context, context_data = [], {}
+    # The header and two rows of two words each
+    assert (
+        builder._add_section(
+            context, context_data, "Sources", df, ["id", "text"], 6, "|"
+        )
+        == 6
+    )
+    assert context == ["-----Sources-----\nid|text\n1|a b\n2|c d"]
+    assert len(context_data["sources"]) == 2
+    # Not even one row fits, so the section is left out
+    assert (
+        builder._add_section(
+            context, context_data, "Entities", df, ["id", "text"], 3, "|"
+        )
+        == 0
+    )
+    assert len(context) == 1 and "entities" not in context_data
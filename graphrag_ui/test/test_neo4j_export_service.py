@@ -0,0 +1,116 @@
+import csv
+
+from pathlib import Path
+
+import pandas as pd
+
+from graphrag_ui.service.neo4j_export_service import EXPORTS
+from graphrag_ui.service.neo4j_service import (
+    ENTITY_CLEAN_COLUMNS,
+    ENTITY_COLUMNS,
+    content_hash,
+    read_parquet_batches,
+)
+
+
+def write_output(project_dir: Path):
+    output_dir = project_dir / "output"
+    output_dir.mkdir(parents=True)
+    tables = {
+        "create_final_documents": {"id": ["d1"], "title": ["doc.txt"]},
+        "create_final_text_units": {
+            "id": ["t1", "t2"],
+            "text": ['First "chunk"\nwith a new line', "Second chunk"],
+            "n_tokens": [10, 20],
+            "document_ids": [["d1"], ["d1"]],
+        },
+        "create_final_entities": {
+            "name": ['"ALICE"', '"BOB"'],
+            "type": ['"PERSON"', ""],
+            "description": ["Alice", "Bob"],
+            "human_readable_id": [0, 1],
+            "id": ["e1", "e2"],
+            "description_embedding": [[0.25, 0.5], [0.125, 1.0]],
+            "text_unit_ids": [["t1"], ["t1", "t2"]],
+        },
+        "create_final_relationships": {
+            "source": ['"ALICE"'],
+            "target": ['"BOB"'],
+            "id": ["r1"],
+            "rank": [2],
+            "weight": [1.5],
+            "human_readable_id": [0],
+            "description": ["Alice knows Bob"],
+            "text_unit_ids": [["t1"]],
+        },
+        "create_final_communities": {
+            "id": ["0"],
+            "level": [0],
+            "title": ["Community 0"],
+            "text_unit_ids": [["t1"]],
+            "relationship_ids": [["r1"]],
+        },
+        "create_final_community_reports": {
+            "id": ["c1"],
+            "community": ["0"],
+            "level": [0],
+            "title": ["Alice and Bob"],
+            "summary": ["Summary"],
+            "findings": [[{"summary": "S", "explanation": "E"}]],
+            "rank": [7.5],
+            "rank_explanation": ["Important"],
+            "full_content": ["Full content"],
+        },
+    }
+    for name, table in tables.items():
+        pd.DataFrame(table).to_parquet(output_dir / f"{name}.parquet")
+
+
+def read_rows(file: Path):
+    with open(file, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_export_tables(tmp_path: Path):
+    project_dir = tmp_path / "project"
+    target_dir = tmp_path / "export"
+    target_dir.mkdir()
+    write_output(project_dir)
+    export_files = {
+        f.label: f for export in EXPORTS for f in export(project_dir, target_dir, 1)
+    }
+    assert {label: f.rows for label, f in export_files.items()} == {
+        "__Document__": 1,
+        "__Chunk__": 2,
+        "PART_OF": 2,
+        "__Entity__": 2,
+        "HAS_ENTITY": 3,
+        "RELATED": 1,
+        "__Community__": 1,
+        "Finding": 1,
+        "HAS_FINDING": 1,
+        "IN_COMMUNITY": 2,
+    }
+    entities = export_files["__Entity__"]
+    header = read_rows(entities.header_file)[0]
+    assert "description_embedding:float[]" in header
+    rows = [dict(zip(header, row)) for row in read_rows(entities.data_file)]
+    assert rows[0]["name"] == "ALICE"
+    assert rows[0][":LABEL"] == "PERSON"
+    assert rows[1][":LABEL"] == ""
+    assert rows[0]["description_embedding:float[]"] == "0.25;0.5"
+    # The hashes match the ones of the sync, so a later sync skips the entities
+    records = next(
+        read_parquet_batches(
+            project_dir / "output/create_final_entities.parquet",
+            ENTITY_COLUMNS,
+            clean_columns=ENTITY_CLEAN_COLUMNS,
+        )
+    )
+    assert rows[0]["entities_hash"] == content_hash(records[0])
+    chunks = read_rows(export_files["__Chunk__"].data_file)
+    assert chunks[0][3] == 'First "chunk"\nwith a new line'
+    assert sorted(read_rows(export_files["IN_COMMUNITY"].data_file)) == [
+        ["e1", "0"],
+        ["e2", "0"],
+    ]
@@ -1,4 +1,199 @@
+from datetime import datetime, timezone
 from pathlib import Path
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from neo4j.exceptions import ClientError, TransientError
+
 from graphrag_ui.config import cfg
+from graphrag_ui.service.neo4j_checkpoint_service import (
+    StageProgress,
+    load_checkpoint,
+)
+from graphrag_ui.service.neo4j_service import (
+    batched_import,
+    clear_db,
+    content_hash,
+    changed_batches,
+    import_covariates,
+    read_parquet_batches,
+    with_retries,
+)
+from graphrag_ui.service.project_settings_service import (
+    read_project_settings,
+    update_project_settings,
+)
+
+
+class FakeSummary:
+    counters = {}
+
+
+class FakeDriver:
+    """Records the written batches and answers the hash queries with hashes."""
+
+    def __init__(self, hashes: dict):
+        self.hashes = hashes
+        self.writes = []
+
+    def execute_query(self, query: str, **parameters):
+        records = [{"id": i, "hash": h} for i, h in self.hashes.items()]
+        return records, None, ["id", "hash"]
+
+    def session(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute_write(self, transaction_function, *args):
+        return transaction_function(self, *args)
+
+    def run(self, query: str, parameters: dict = None, **kwargs):
+        self.writes.append((query, kwargs["rows"]))
+        return self
+
+    def consume(self):
+        return FakeSummary()
+
+
+@pytest.fixture
+def driver(monkeypatch) -> FakeDriver:
+    driver = FakeDriver({})
+    # Set on the instance, as reading the cached driver connects to Neo4J
+    monkeypatch.setitem(vars(cfg.neo4j), "driver", driver)
+    return driver
+
+
+def test_content_hash_stable():
+    record = {"id": "1", "title": "Title", "embedding": np.array([0.1, 0.2])}
+    assert content_hash(record) == content_hash(dict(record))
+
+
+def test_content_hash_changes():
+    record = {"id": "1", "text_unit_ids": np.array(["a", "b"], dtype=object)}
+    changed = {"id": "1", "text_unit_ids": np.array(["a", "c"], dtype=object)}
+    assert content_hash(record) != content_hash(changed)
+
+
+def test_changed_batches():
+    unchanged = {"id": "1", "title": "Unchanged"}
+    synced_hashes = {"1": content_hash(unchanged), "2": "old hash", "3": "removed"}
+    batches = [[dict(unchanged), {"id": "2", "title": "Changed"}], [{"id": "4"}]]
+    seen_ids = set()
+    changed = [
+        [r["id"] for r in batch]
+        for batch in changed_batches(batches, "id", synced_hashes, seen_ids)
+    ]
+    assert changed == [["2"], ["4"]]
+    assert seen_ids == {"1", "2", "4"}
+    assert synced_hashes.keys() - seen_ids == {"3"}
+
+
+def test_read_parquet_batches_cleans_names(tmp_path: Path):
+    file = tmp_path / "create_final_relationships.parquet"
+    pa_table = pa.table(
+        {"source": ['"ALICE"', "BOB"], "target": ['"BOB"', None], "weight": [1, 2]}
+    )
+    pq.write_table(pa_table, file)
+    batches = list(
+        read_parquet_batches(file, batch_size=1, clean_columns=["source", "target"])
+    )
+    assert [r["source"] for batch in batches for r in batch] == ["ALICE", "BOB"]
+    assert [r["target"] for batch in batches for r in batch] == ["BOB", None]
+
+
+def test_with_retries_retries_transient_errors():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TransientError("Deadlock detected")
+        return "written"
+
+    assert with_retries(flaky, "batch", max_retries=3, backoff_s=0) == "written"
+    assert len(attempts) == 3
+
+
+def test_with_retries_raises_other_errors():
+    def invalid():
+        raise ClientError("Syntax error")
+
+    with pytest.raises(ClientError):
+        with_retries(invalid, "batch", max_retries=3, backoff_s=0)
+
+
+def test_stage_progress_commits():
+    progress = StageProgress()
+    progress.start(100)
+    for batch_index in [0, 2, 1, 4]:
+        progress.commit(batch_index, 100, {"nodes_created": 10})
+    assert progress.committed_below == 3
+    assert progress.committed == [4]
+    assert progress.is_committed(1) and progress.is_committed(4)
+    assert not progress.is_committed(3)
+    assert progress.rows == 400
+    assert progress.counters["nodes_created"] == 40
+    progress.start(200)
+    assert not progress.is_committed(1)
+
+
+def test_load_checkpoint(tmp_path: Path):
+    checkpoint = load_checkpoint(tmp_path, "version-1")
+    checkpoint.stage("documents").commit(0, 10)
+    assert load_checkpoint(tmp_path, "version-1").stage("documents").rows == 10
+    assert load_checkpoint(tmp_path, "version-2").stages == {}
+
+
+def test_stage_progress_timing():
+    progress = StageProgress(rows=100, seconds=2)
+    assert progress.rows_per_second == 50
+    progress.begin()
+    assert progress.running and progress.elapsed >= 2
+    progress.finish()
+    assert not progress.running and progress.seconds >= 2
+
+
+def test_covariates_of_a_missing_table_are_deleted(tmp_path: Path, driver):
+    driver.hashes.update({"c1": "hash 1", "c2": "hash 2"})
+    assert import_covariates(tmp_path / "project") == 0
+    [(query, rows)] = driver.writes
+    assert "DETACH DELETE" in query
+    assert sorted(row["id"] for row in rows) == ["c1", "c2"]
+
+
+def test_empty_batches_are_committed(driver):
+    progress = StageProgress()
+    progress.start(2)
+    batches = [[], [{"id": "1"}], [], [], [{"id": "2"}], []]
+    assert batched_import("RETURN value", batches, progress=progress) == 2
+    assert progress.committed_below == 6
+    assert progress.committed == []
+    assert len(driver.writes) == 2
+
 
+def test_clear_db_forgets_the_sync(tmp_path: Path, monkeypatch, driver):
+    driver.execute_query = lambda query, **parameters: (
+        [{"nodes": 0, "relationships": 0, "deleted": 0}],
+        None,
+        [],
+    )
+    monkeypatch.setattr(cfg, "project_dir", tmp_path)
+    project_dir = tmp_path / "project"
+    update_project_settings(
+        project_dir,
+        neo4j_index_version="version-1",
+        neo4j_synced_at=datetime.now(timezone.utc),
+    )
+    load_checkpoint(project_dir, "version-1").stage("documents").commit(0, 10)
+    clear_db("project")
+    settings = read_project_settings(project_dir)
+    assert settings.neo4j_index_version is None and settings.neo4j_synced_at is None
+    assert load_checkpoint(project_dir, "version-1").stages == {}
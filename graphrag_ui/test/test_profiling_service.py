@@ -0,0 +1,59 @@
+import json
+import time
+
+from pathlib import Path
+
+from graphrag_ui.service.profiling_service import (
+    ProfileFormat,
+    enable_profiling,
+    list_profiles,
+    profiled,
+    read_profile,
+    render_profile,
+)
+
+
+def spin(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profiled_only_when_enabled(tmp_path: Path):
+    project_dir = tmp_path / "project"
+    with profiled(project_dir, "global search"):
+        spin(0.05)
+    assert list_profiles(project_dir) == []
+
+    enable_profiling(project_dir, True)
+    try:
+        with profiled(project_dir, "global search", "What are the main topics?"):
+            spin(0.2)
+    finally:
+        enable_profiling(project_dir, False)
+    [profile] = list_profiles(project_dir)
+    assert profile.detail == "What are the main topics?"
+    assert profile.samples > 0
+    assert any("spin" in stack for stack in profile.stacks)
+    assert read_profile(project_dir, profile.id) == profile
+
+
+def test_render_profile(tmp_path: Path):
+    project_dir = tmp_path / "project"
+    enable_profiling(project_dir, True)
+    try:
+        with profiled(project_dir, "local search"):
+            spin(0.1)
+    finally:
+        enable_profiling(project_dir, False)
+    [profile] = list_profiles(project_dir)
+    folded = render_profile(profile, ProfileFormat.FOLDED)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in folded.splitlines()) == (
+        profile.samples
+    )
+    speedscope = json.loads(render_profile(profile, ProfileFormat.SPEEDSCOPE))
+    assert speedscope["profiles"][0]["endValue"] == (
+        profile.samples * profile.interval_ms
+    )
+    svg = render_profile(profile, ProfileFormat.SVG)
+    assert svg.startswith("<svg") and "spin" in svg
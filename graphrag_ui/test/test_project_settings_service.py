@@ -0,0 +1,18 @@
+from pathlib import Path
+
+from graphrag_ui.service.project_settings_service import (
+    ContextBackend,
+    ProjectSettings,
+    read_project_settings,
+    update_project_settings,
+)
+
+
+def test_read_default_settings(tmp_path: Path):
+    assert read_project_settings(tmp_path) == ProjectSettings()
+
+
+def test_update_project_settings(tmp_path: Path):
+    update_project_settings(tmp_path, context_backend="neo4j")
+    settings = read_project_settings(tmp_path)
+    assert settings.context_backend == ContextBackend.NEO4J
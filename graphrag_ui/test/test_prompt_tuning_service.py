@@ -0,0 +1,94 @@
+import time
+
+from pathlib import Path
+
+import pytest
+
+from graphrag_ui.service import prompt_tuning_service
+from graphrag_ui.service.job_service import JobStatus
+from graphrag_ui.service.prompt_tuning_service import (
+    compute_tuning_key,
+    tuned_prompts_dir,
+    diff_prompts,
+    apply_prompts,
+    prompt_tuning_diffs,
+    start_prompt_tuning,
+)
+
+
+def create_project(project_dir: Path) -> Path:
+    (project_dir / "input").mkdir(parents=True)
+    (project_dir / "input" / "doc.txt").write_text("Some text")
+    (project_dir / "settings.yaml").write_text("llm:\n  model: gpt-4o\n")
+    return project_dir
+
+
+def test_compute_tuning_key_stable(tmp_path: Path):
+    project_dir = create_project(tmp_path / "project")
+    assert compute_tuning_key(project_dir) == compute_tuning_key(project_dir)
+
+
+def test_compute_tuning_key_changes_with_input(tmp_path: Path):
+    project_dir = create_project(tmp_path / "project")
+    key = compute_tuning_key(project_dir)
+    (project_dir / "input" / "doc.txt").write_text("Some other text")
+    assert compute_tuning_key(project_dir) != key
+
+
+def test_compute_tuning_key_changes_with_settings(tmp_path: Path):
+    project_dir = create_project(tmp_path / "project")
+    key = compute_tuning_key(project_dir)
+    (project_dir / "settings.yaml").write_text("llm:\n  model: gpt-4o-mini\n")
+    assert compute_tuning_key(project_dir) != key
+
+
+def test_diff_and_apply_prompts(tmp_path: Path):
+    project_dir = create_project(tmp_path / "project")
+    key = compute_tuning_key(project_dir)
+    tuned_dir = tuned_prompts_dir(project_dir, key)
+    tuned_dir.mkdir(parents=True)
+    (tuned_dir / "entity_extraction.txt").write_text("line 1\nline 2 tuned\n")
+    (tuned_dir / "community_report.txt").write_text("report\n")
+    (project_dir / "prompts").mkdir()
+    (project_dir / "prompts" / "entity_extraction.txt").write_text("line 1\nline 2\n")
+    (project_dir / "prompts" / "community_report.txt").write_text("report\n")
+
+    diffs = {d.name: d for d in diff_prompts(project_dir, key)}
+    assert diffs["entity_extraction.txt"].changed
+    assert "+line 2 tuned" in diffs["entity_extraction.txt"].diff
+    assert not diffs["community_report.txt"].changed
+
+    applied = apply_prompts(project_dir, key)
+    assert sorted(applied) == ["community_report.txt", "entity_extraction.txt"]
+    assert (
+        project_dir / "prompts" / "entity_extraction.txt"
+    ).read_text() == "line 1\nline 2 tuned\n"
+
+
+def test_apply_prompts_rejects_invalid_key(tmp_path: Path):
+    project_dir = create_project(tmp_path / "project")
+    with pytest.raises(ValueError):
+        apply_prompts(project_dir, "../../etc")
+
+
+def test_cached_prompts_are_diffed_when_the_job_finished(tmp_path: Path, monkeypatch):
+    project_dir = create_project(tmp_path / "cached")
+    tuned_dir = tuned_prompts_dir(project_dir, compute_tuning_key(project_dir))
+    tuned_dir.mkdir(parents=True)
+    (tuned_dir / "entity_extraction.txt").write_text("tuned\n")
+
+    def graphrag_prompt_tuning(*_, **__):
+        raise AssertionError("tuned again")
+
+    monkeypatch.setattr(
+        prompt_tuning_service, "graphrag_prompt_tuning", graphrag_prompt_tuning
+    )
+    job = start_prompt_tuning(project_dir)
+    for _ in range(100):
+        if job.done:
+            break
+        time.sleep(0.01)
+    assert job.status == JobStatus.FINISHED
+    assert job.message == "Reused cached prompts"
+    diffs = prompt_tuning_diffs(project_dir, job)
+    assert [d.name for d in diffs if d.changed] == ["entity_extraction.txt"]
@@ -0,0 +1,161 @@
+import os
+
+from collections import OrderedDict
+from pathlib import Path
+
+import pytest
+
+from graphrag_ui.benchmark.synthetic_project import generate_project, ProjectScale
+from graphrag_ui.config import cfg
+from graphrag_ui.service import graphrag_query, query_cache_service
+from graphrag_ui.service.graphrag_constants import ENTITY_TABLE, SearchType
+from graphrag_ui.service.project_settings_service import (
+    ContextBackend,
+    update_project_settings,
+)
+from graphrag_ui.service.query_cache_service import (
+    USAGE_FILE,
+    MB,
+    estimate_size,
+    get_context_builder,
+    is_loaded,
+    preload,
+    schedule_preload,
+    recent_projects,
+    drop_project,
+    loaded_projects,
+)
+from graphrag_ui.service.memory_service import MemoryComponent
+from graphrag_ui.service.metrics_service import render_metrics
+
+SCALE = ProjectScale(
+    entities=50, relationships=80, reports=14, text_units=20, dimensions=8
+)
+KB = 1024
+# The measured size of a loaded project, more than the estimated size
+PROJECT_SIZE = 300 * KB
+
+
+class Entity:
+    def __init__(self, description: str):
+        self.description = description
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Records the loads instead of building the context builders."""
+    loads = []
+
+    def load_project_data(project_dir: Path, community_level: int):
+        loads.append(project_dir.name)
+        return [], [Entity(project_dir.name * PROJECT_SIZE)]
+
+    def build_context_builder(project_dir: Path, search_type: SearchType, *_):
+        loads.append(f"{project_dir.name} {search_type}")
+        return f"{search_type} {project_dir.name}"
+
+    monkeypatch.setattr(graphrag_query, "load_project_data", load_project_data)
+    monkeypatch.setattr(graphrag_query, "build_context_builder", build_context_builder)
+    monkeypatch.setattr(query_cache_service, "_cache", OrderedDict())
+    return loads
+
+
+def test_project_is_loaded_once_per_index_version(tmp_path: Path, loads):
+    project_dir = generate_project(tmp_path / "p", SCALE)
+    assert get_context_builder(project_dir, SearchType.GLOBAL) == "global p"
+    assert get_context_builder(project_dir, SearchType.GLOBAL) == "global p"
+    assert get_context_builder(project_dir, SearchType.LOCAL) == "local p"
+    assert loads == ["p", "p global", "p local"]
+    assert is_loaded(project_dir)
+    assert (project_dir / USAGE_FILE).exists()
+
+    entity_file = project_dir / "output" / f"{ENTITY_TABLE}.parquet"
+    mtime = entity_file.stat().st_mtime_ns + 1_000_000_000
+    os.utime(entity_file, ns=(mtime, mtime))
+    assert not is_loaded(project_dir)
+    get_context_builder(project_dir, SearchType.GLOBAL)
+    assert loads[3:] == ["p", "p global"]
+
+
+def test_community_levels_are_loaded_separately(tmp_path: Path, loads):
+    project_dir = generate_project(tmp_path / "p", SCALE)
+    get_context_builder(project_dir, SearchType.GLOBAL, 2)
+    get_context_builder(project_dir, SearchType.GLOBAL, 1)
+    get_context_builder(project_dir, SearchType.GLOBAL, 1)
+    assert loads == ["p", "p global", "p", "p global"]
+    assert loaded_projects()[0].community_levels == [1, 2]
+    assert not is_loaded(project_dir, 1)
+    get_context_builder(project_dir, SearchType.LOCAL, 1)
+    assert is_loaded(project_dir, 1)
+
+
+def test_least_recently_used_project_is_dropped(tmp_path: Path, loads, monkeypatch):
+    monkeypatch.setattr(cfg, "query_cache_size", 2)
+    a, b, c = (generate_project(tmp_path / name, SCALE) for name in "abc")
+    for project_dir in [a, b, a, c]:
+        get_context_builder(project_dir, SearchType.GLOBAL)
+    assert [d.name for d in [a, b, c] if query_cache_service._current(d)] == ["a", "c"]
+    drop_project(a)
+    assert query_cache_service._current(a) is None
+
+
+def test_projects_over_the_memory_budget_are_dropped(
+    tmp_path: Path, loads, monkeypatch
+):
+    monkeypatch.setattr(cfg, "query_memory_mb", 2.5 * PROJECT_SIZE / MB)
+    a, b, c = (generate_project(tmp_path / name, SCALE) for name in "abc")
+    for project_dir in [a, b, c]:
+        get_context_builder(project_dir, SearchType.GLOBAL)
+    loaded = loaded_projects()
+    assert [p.project for p in loaded] == ["c", "b"]
+    assert PROJECT_SIZE < loaded[0].footprint[MemoryComponent.ENTITIES]
+    assert loaded[0].size_bytes < PROJECT_SIZE + 10 * KB
+    assert loaded[0].search_types == [SearchType.GLOBAL]
+    assert 'graphrag_ui_query_memory_bytes{project="b",component="entities"}' in (
+        render_metrics()
+    )
+
+
+def test_preload_respects_the_memory_budget(tmp_path: Path, loads, monkeypatch):
+    a, b = (generate_project(tmp_path / name, SCALE) for name in "ab")
+    size = estimate_size(a, ContextBackend.MEMORY)
+    assert 0 < size < PROJECT_SIZE
+    assert estimate_size(a, ContextBackend.NEO4J) < size
+    monkeypatch.setattr(cfg, "query_memory_mb", 1.8 * PROJECT_SIZE / MB)
+    assert preload(a)
+    assert not preload(a)
+    drop_project(a)
+    assert preload(b)
+    # The size measured by the first load is expected now
+    assert not preload(a)
+    assert loads == ["a", "a global", "a local", "b", "b global", "b local"]
+
+
+def test_preload_is_not_scheduled_over_the_memory_budget(
+    tmp_path: Path, loads, monkeypatch
+):
+    project_dir = generate_project(tmp_path / "p", SCALE)
+    size = estimate_size(project_dir, ContextBackend.MEMORY)
+    monkeypatch.setattr(cfg, "query_memory_mb", 0.5 * size / MB)
+    assert schedule_preload(project_dir) is None
+    assert loads == []
+
+
+def test_schedule_preload_never_fails(tmp_path: Path, loads):
+    project_dir = generate_project(tmp_path / "p", SCALE)
+    get_context_builder(project_dir, SearchType.GLOBAL)
+    # Stored by an earlier version or by hand
+    update_project_settings(project_dir, community_level="deep")
+    assert schedule_preload(project_dir) is None
+    assert loads == ["p", "p global"]
+
+
+def test_recent_projects(tmp_path: Path, loads, monkeypatch):
+    monkeypatch.setattr(cfg, "project_dir", tmp_path)
+    a, b, _ = (generate_project(tmp_path / name, SCALE) for name in "abc")
+    get_context_builder(a, SearchType.GLOBAL)
+    get_context_builder(b, SearchType.GLOBAL)
+    os.utime(a / USAGE_FILE, (0, 2_000_000_000))
+    os.utime(b / USAGE_FILE, (0, 1_000_000_000))
+    assert recent_projects(5) == [a, b]
+    assert recent_projects(1) == [a]
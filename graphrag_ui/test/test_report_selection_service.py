@@ -0,0 +1,101 @@
+import os
+
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from graphrag_ui.benchmark.synthetic_project import generate_project, ProjectScale
+from graphrag_ui.service import report_selection_service
+from graphrag_ui.service.graphrag_constants import ENTITY_TABLE
+from graphrag_ui.service.report_selection_service import (
+    REPORT_EMBEDDING_FOLDER,
+    ReportIndex,
+    load_report_embeddings,
+)
+
+SCALE = ProjectScale(
+    entities=50, relationships=80, reports=14, text_units=20, dimensions=8
+)
+
+
+class Report:
+    def __init__(self, id: str, rank: float = 1.0):
+        self.id = id
+        self.title = f"Report {id}"
+        self.summary = f"Summary of report {id}"
+        self.full_content = "content " * 100
+        self.rank = rank
+
+
+def report_index(similarities: List[float], ranks: List[float] = None) -> ReportIndex:
+    """Reports whose embeddings have the given similarities to the query [1, 0]."""
+    ranks = ranks or [1.0] * len(similarities)
+    embeddings = np.array([[s, np.sqrt(1 - s * s)] for s in similarities])
+    reports = [Report(str(i), rank) for i, rank in enumerate(ranks)]
+    return ReportIndex(reports, [], embeddings)
+
+
+QUERY = np.array([1.0, 0.0])
+
+
+def test_select_relevant_reports():
+    index = report_index([0.9, 0.1, 0.8, 0.2, 0.7])
+    reports, selection = index.select(
+        QUERY, max_tokens=250, top_n=2, min_score=0.5, min_reports=1, rank_weight=0
+    )
+    assert [report.id for report in reports] == ["0", "2"]
+    assert selection.relevant_reports == 3
+    assert selection.reports_saved == 3
+    assert not selection.fallback
+    assert selection.top_score == 0.9
+    # 5 reports of about 100 tokens in batches of 250 tokens
+    assert selection.full_map_calls == 2
+    selection.map_calls = 1
+    assert selection.llm_calls_saved == 1
+
+
+def test_rank_weight():
+    index = report_index([0.6, 0.5], ranks=[1, 10])
+    reports, _ = index.select(
+        QUERY, max_tokens=1000, top_n=1, min_score=0, min_reports=1, rank_weight=0.5
+    )
+    assert [report.id for report in reports] == ["1"]
+
+
+def test_fallback_when_too_few_reports_are_relevant():
+    index = report_index([0.9, 0.1, 0.2, 0.3])
+    args = dict(max_tokens=1000, top_n=10, min_score=0.5, min_reports=2, rank_weight=0)
+    reports, selection = index.select(QUERY, fallback=True, **args)
+    assert len(reports) == 4
+    assert selection.fallback
+    assert selection.reports_saved == 0
+
+    reports, selection = index.select(QUERY, fallback=False, **args)
+    assert [report.id for report in reports] == ["0", "3"]
+    assert not selection.fallback
+
+
+def test_report_embeddings_are_computed_once_per_index_version(
+    tmp_path: Path, monkeypatch
+):
+    embedded = []
+
+    def embed_texts(texts: List[str]) -> np.ndarray:
+        embedded.append(len(texts))
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    monkeypatch.setattr(report_selection_service, "embed_texts", embed_texts)
+    project_dir = generate_project(tmp_path / "p", SCALE)
+    reports = [Report(str(i)) for i in range(5)]
+    assert load_report_embeddings(project_dir, reports).shape == (5, 4)
+    assert load_report_embeddings(project_dir, reports[:3]).shape == (3, 4)
+    load_report_embeddings(project_dir, reports + [Report("5")])
+    assert embedded == [5, 1]
+
+    entity_file = project_dir / "output" / f"{ENTITY_TABLE}.parquet"
+    mtime = entity_file.stat().st_mtime_ns + 1_000_000_000
+    os.utime(entity_file, ns=(mtime, mtime))
+    load_report_embeddings(project_dir, reports)
+    assert embedded == [5, 1, 5]
+    assert len(list((project_dir / REPORT_EMBEDDING_FOLDER).glob("*.npz"))) == 1
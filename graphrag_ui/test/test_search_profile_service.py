@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import pytest
+
+from graphrag_ui.config import cfg
+from graphrag_ui.service.community_level_service import CommunityLevel, auto_level
+from graphrag_ui.service.project_settings_service import update_project_settings
+from graphrag_ui.service.search_profile_service import (
+    DEFAULT_PROFILE,
+    SEARCH_PROFILES,
+    SearchProfileName,
+    profile_setting,
+    resolve_search_profile,
+)
+
+
+def test_resolve_search_profile(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(cfg, "search_profile", "balanced")
+    assert resolve_search_profile(tmp_path).name == SearchProfileName.BALANCED
+    assert resolve_search_profile(tmp_path, "fast").name == SearchProfileName.FAST
+    update_project_settings(tmp_path, search_profile="thorough")
+    assert resolve_search_profile(tmp_path).name == SearchProfileName.THOROUGH
+    assert (
+        resolve_search_profile(tmp_path, DEFAULT_PROFILE).name
+        == SearchProfileName.THOROUGH
+    )
+    with pytest.raises(ValueError):
+        resolve_search_profile(tmp_path, "fastest")
+    update_project_settings(tmp_path, search_profile="fastest")
+    with pytest.raises(ValueError):
+        resolve_search_profile(tmp_path)
+
+
+def test_only_known_profiles_are_stored():
+    assert profile_setting("fast") == SearchProfileName.FAST
+    assert profile_setting(DEFAULT_PROFILE) is None
+    assert profile_setting("") is None
+    with pytest.raises(ValueError):
+        profile_setting("bogus")
+
+
+def test_fast_profile_trades_depth_for_latency():
+    fast = SEARCH_PROFILES[SearchProfileName.FAST]
+    balanced = SEARCH_PROFILES[SearchProfileName.BALANCED]
+    thorough = SEARCH_PROFILES[SearchProfileName.THOROUGH]
+    assert fast.use_community_summary and not balanced.use_community_summary
+    for field in ["local_max_tokens", "top_k_mapped_entities", "reduce_max_tokens"]:
+        assert getattr(fast, field) < getattr(balanced, field)
+        assert getattr(balanced, field) < getattr(thorough, field)
+
+
+def test_auto_level_of_the_fast_profile_maps_the_summaries(monkeypatch):
+    levels = [
+        CommunityLevel(level=0, reports=3, tokens=5_000, summary_tokens=500),
+        CommunityLevel(level=1, reports=10, tokens=30_000, summary_tokens=3_000),
+        CommunityLevel(level=2, reports=40, tokens=110_000, summary_tokens=11_000),
+    ]
+    monkeypatch.setattr(cfg, "auto_level_max_map_calls", 2)
+    monkeypatch.setattr(cfg, "auto_level_max_tokens", 0)
+    fast = SEARCH_PROFILES[SearchProfileName.FAST]
+    balanced = SEARCH_PROFILES[SearchProfileName.BALANCED]
+    assert auto_level(levels, balanced.global_max_tokens) == 0
+    assert auto_level(levels, fast.global_max_tokens, fast.use_community_summary) == 2
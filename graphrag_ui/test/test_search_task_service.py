@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from graphrag_ui.service import search_task_service
+from graphrag_ui.service.search_task_service import (
+    run_search,
+    search_key,
+    cancel_searches,
+    CancelReason,
+    SearchCancelled,
+    SearchMetrics,
+)
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+class FakeResult:
+    llm_calls = 4
+    prompt_tokens = 1000
+
+
+async def fake_search(seconds: float, started: list = None):
+    if started is not None:
+        started.append(1)
+    await asyncio.sleep(seconds)
+    return FakeResult()
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(search_task_service, "metrics", SearchMetrics())
+    monkeypatch.setattr(search_task_service, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+
+def test_search_cancelled_on_disconnect():
+    async def scenario():
+        request = FakeRequest()
+        await run_search(request, "form", "global", lambda: fake_search(0))
+
+        async def disconnect():
+            await asyncio.sleep(0.05)
+            request.disconnected = True
+
+        asyncio.create_task(disconnect())
+        with pytest.raises(SearchCancelled) as e:
+            await run_search(request, "form", "global", lambda: fake_search(10))
+        assert e.value.reason == CancelReason.DISCONNECTED
+
+    asyncio.run(scenario())
+    metrics = search_task_service.metrics
+    assert metrics.completed == 1
+    assert metrics.cancelled == {CancelReason.DISCONNECTED: 1}
+    assert metrics.usage["global"].prompt_tokens == 1000
+
+
+def test_cancel_searches():
+    async def scenario():
+        started = []
+        search = asyncio.create_task(
+            run_search(FakeRequest(), "form", "local", lambda: fake_search(10, started))
+        )
+        while not started:
+            await asyncio.sleep(0.01)
+        assert cancel_searches("other") == 0
+        assert cancel_searches("form") == 1
+        with pytest.raises(SearchCancelled):
+            await search
+
+    asyncio.run(scenario())
+    assert search_task_service.metrics.cancelled == {CancelReason.USER: 1}
+
+
+def test_estimated_savings():
+    metrics = SearchMetrics()
+    metrics.usage["global"] = search_task_service.SearchUsage(
+        completed=2, llm_calls=20, prompt_tokens=40_000, seconds=20
+    )
+    metrics.record_cancellation("global", CancelReason.USER, 2.5)
+    assert metrics.llm_calls_saved == pytest.approx(7.5)
+    assert metrics.tokens_saved == pytest.approx(15_000)
+    metrics.record_cancellation("local", CancelReason.USER, 2.5)
+    assert metrics.tokens_saved == pytest.approx(15_000)
+
+
+def test_identical_searches_coalesced():
+    calls = []
+
+    async def search():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return FakeResult()
+
+    async def scenario():
+        keys = [
+            search_key("p", "global", query)
+            for query in ["Main topics?", " main  TOPICS? ", "Other"]
+        ]
+        return await asyncio.gather(
+            *[run_search(FakeRequest(), "", "global", search, key) for key in keys]
+        )
+
+    first, second, third = asyncio.run(scenario())
+    assert first is second and first is not third
+    assert len(calls) == 2
+    metrics = search_task_service.metrics
+    assert metrics.coalesced == 1
+    assert metrics.coalesced_tokens_saved == 1000
+
+
+def test_coalesced_search_runs_until_last_waiter_leaves():
+    async def scenario():
+        key = search_key("p", "global", "query")
+        leaving = asyncio.create_task(
+            run_search(FakeRequest(), "a", "global", lambda: fake_search(0.1), key)
+        )
+        staying = asyncio.create_task(
+            run_search(FakeRequest(), "b", "global", lambda: fake_search(0.1), key)
+        )
+        await asyncio.sleep(0.02)
+        cancel_searches("a")
+        with pytest.raises(SearchCancelled):
+            await leaving
+        return await staying
+
+    assert isinstance(asyncio.run(scenario()), FakeResult)
+    metrics = search_task_service.metrics
+    assert metrics.completed == 1
+    assert metrics.cancelled == {CancelReason.USER: 1}
+    assert metrics.tokens_saved == 0
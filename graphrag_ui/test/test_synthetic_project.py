@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from graphrag_ui.benchmark.synthetic_project import (
+    generate_project,
+    communities_per_level,
+    ProjectScale,
+)
+from graphrag_ui.service.graphrag_query import load_project_data
+from graphrag_ui.service.graphrag_service import get_project_status, ProjectStatus
+
+
+def test_communities_per_level():
+    assert communities_per_level(70, 3) == [10, 20, 40]
+    assert sum(communities_per_level(5, 3)) == 5
+
+
+def test_generate_project(tmp_path: Path):
+    project_dir = generate_project(
+        tmp_path / "synthetic",
+        ProjectScale(
+            entities=50, relationships=80, reports=14, text_units=20, dimensions=8
+        ),
+    )
+    assert get_project_status(project_dir) == ProjectStatus.INDEXED
+    reports, entities = load_project_data(project_dir)
+    assert len(entities) == 50
+    assert 0 < len(reports) <= 14
+    assert len(entities[0].description_embedding) == 8
@@ -0,0 +1,229 @@
+import re
+import secrets
+
+from urllib.parse import quote_plus, unquote_plus
+
+from fasthtml.common import (
+    Form,
+    Label,
+    Input,
+    Hidden,
+    Button,
+    Div,
+    Title,
+    Main,
+    H2,
+    P,
+    A,
+    Table,
+    Thead,
+    Tbody,
+    Tr,
+    Th,
+    Td,
+    RedirectResponse,
+)
+from starlette.responses import Response
+
+from graphrag_ui.config import cfg
+from graphrag_ui.service.graphrag_service import list_projects, get_project_dir
+from graphrag_ui.service.memory_service import MemoryComponent
+from graphrag_ui.service.query_cache_service import MB, loaded_projects
+from graphrag_ui.service.profiling_service import (
+    ProfileFormat,
+    PROFILE_DOWNLOADS,
+    enable_profiling,
+    is_profiling,
+    list_profiles,
+    read_profile,
+    render_profile,
+)
+from graphrag_ui.ui.project import app
+from graphrag_ui.ui.snippets import title_group
+
+SESSION_ADMIN = "admin"
+ID_PROFILING_FORM = "profiling-form"
+
+
+def is_admin(session) -> bool:
+    return cfg.admin_token is not None and session.get(SESSION_ADMIN, False)
+
+
+def profiling_form(projectTitle: str) -> Form:
+    enabled = is_profiling(get_project_dir(projectTitle))
+    form_id = f"{ID_PROFILING_FORM}-{re.sub(r'\W', '-', projectTitle)}"
+    return Form(
+        P("Searches are profiled." if enabled else "Searches are not profiled."),
+        Hidden(value=str(not enabled), id="enabled", name="enabled"),
+        Hidden(value=projectTitle, id="projectTitle", name="projectTitle"),
+        Button(
+            "Stop profiling" if enabled else "Profile searches",
+            cls="short",
+        ),
+        hx_put="/admin/profiling",
+        target_id=form_id,
+        hx_swap="outerHTML",
+        id=form_id,
+    )
+
+
+def profiles_table(projectTitle: str) -> Table:
+    profiles = list_profiles(get_project_dir(projectTitle))
+    if len(profiles) == 0:
+        return P("No profiles yet.")
+    return Table(
+        Thead(
+            Tr(
+                Th("Started"),
+                Th("Request"),
+                Th("Query"),
+                Th("Time"),
+                Th("Samples"),
+                Th("Download"),
+            )
+        ),
+        Tbody(
+            *[
+                Tr(
+                    Td(f"{profile.started:%Y-%m-%d %H:%M:%S}"),
+                    Td(profile.name),
+                    Td(profile.detail),
+                    Td(f"{profile.seconds:.2f} s"),
+                    Td(profile.samples),
+                    Td(
+                        *[
+                            A(
+                                label,
+                                href=f"/admin/profiles/{quote_plus(projectTitle)}/{profile.id}/{profile_format.value}",
+                                style="margin-right: 1em;",
+                            )
+                            for profile_format, label in [
+                                (ProfileFormat.SVG, "Flame graph"),
+                                (ProfileFormat.SPEEDSCOPE, "Speedscope"),
+                                (ProfileFormat.FOLDED, "Folded stacks"),
+                            ]
+                        ]
+                    ),
+                )
+                for profile in profiles
+            ]
+        ),
+    )
+
+
+def memory_table() -> Div:
+    projects = loaded_projects()
+    used = sum(project.size_bytes for project in projects)
+    summary = P(
+        f"{used / MB:.1f} MB of {cfg.query_memory_mb:g} MB used by the search data "
+        f"of {len(projects)} loaded projects. The least recently used projects are "
+        "dropped to stay within the budget."
+    )
+    if len(projects) == 0:
+        return Div(summary)
+    return Div(
+        summary,
+        Table(
+            Thead(
+                Tr(
+                    Th("Project"),
+                    Th("Searches"),
+                    Th("Levels"),
+                    Th("Last used"),
+                    *[
+                        Th(component.replace("_", " ").capitalize())
+                        for component in MemoryComponent
+                    ],
+                    Th("Total"),
+                )
+            ),
+            Tbody(
+                *[
+                    Tr(
+                        Td(project.project),
+                        Td(", ".join(project.search_types)),
+                        Td(", ".join(str(level) for level in project.community_levels)),
+                        Td(f"{project.last_used:%Y-%m-%d %H:%M:%S}"),
+                        *[
+                            Td(f"{project.footprint.get(component, 0) / MB:.1f} MB")
+                            for component in MemoryComponent
+                        ],
+                        Td(f"{project.size_bytes / MB:.1f} MB"),
+                    )
+                    for project in projects
+                ]
+            ),
+        ),
+    )
+
+
+@app.route("/admin")
+def get(session):
+    title = "Admin"
+    if cfg.admin_token is None:
+        content = P("The admin page is disabled. Set ADMIN_TOKEN to enable it.")
+    elif not is_admin(session):
+        content = Form(
+            Label(
+                "Admin token",
+                Input(type="password", id="token", name="token", required=True),
+            ),
+            Button("Log in"),
+            method="post",
+            action="/admin/login",
+        )
+    else:
+        content = Div(
+            H2("Memory"),
+            memory_table(),
+            H2("Profiling"),
+            P(
+                "Profiled searches sample the stacks of the busy threads every "
+                f"{cfg.profile_interval_ms:g} ms. The last {cfg.profile_max_count} "
+                "profiles of a project are kept."
+            ),
+            *[
+                Div(
+                    Label(project.name),
+                    profiling_form(project.name),
+                    profiles_table(project.name),
+                    style="margin-top: 1em",
+                )
+                for project in list_projects()
+            ],
+        )
+    return Title(title), Main(title_group(title), content, cls="container")
+
+
+@app.route("/admin/login")
+def post(session, token: str):
+    if cfg.admin_token is not None and secrets.compare_digest(
+        token.encode(), cfg.admin_token.encode()
+    ):
+        session[SESSION_ADMIN] = True
+    return RedirectResponse("/admin", status_code=303)
+
+
+@app.route("/admin/profiling")
+def put(session, projectTitle: str, enabled: str):
+    if not is_admin(session):
+        return Response("Please log in as admin.", status_code=403)
+    enable_profiling(get_project_dir(projectTitle), enabled.lower() == "true")
+    return profiling_form(projectTitle)
+
+
+@app.route("/admin/profiles/{projectTitle}/{profileId}/{profileFormat}")
+def get(session, projectTitle: str, profileId: str, profileFormat: str):
+    if not is_admin(session):
+        return Response("Please log in as admin.", status_code=403)
+    projectTitle = unquote_plus(projectTitle)
+    profile = read_profile(get_project_dir(projectTitle), profileId)
+    if profile is None or profileFormat not in list(ProfileFormat):
+        return Response(f"Profile {profileId} not found.", status_code=404)
+    profile_format = ProfileFormat(profileFormat)
+    media_type, suffix = PROFILE_DOWNLOADS[profile_format]
+    return Response(
+        render_profile(profile, profile_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{profile.id}{suffix}"'},
+    )
@@ -0,0 +1,248 @@
+"""
+Serves the static assets with validators and long-lived caching.
+
+The pages link to the assets with content-hashed URLs, like
+/css/main.0123456789.css, which can be cached forever. Precompressed gzip and
+brotli variants next to the assets are served to the browsers which accept
+them, other compressible assets are compressed in memory. Generate the variants
+after changing the assets with:
+
+python -m graphrag_ui.ui.assets
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field, PrivateAttr
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from graphrag_ui.config import cfg
+from graphrag_ui.logger_factory import logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Independent of the working directory the app is started from
+ASSETS_DIR = Path(__file__).resolve().parents[2] / "assets"
+HASH_LENGTH = 10
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Content encodings in order of preference with the suffix of their files
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".html", ".txt", ".map"}
+HASHED_NAME = re.compile(rf"(?P<stem>.+)\.(?P<hash>[0-9a-f]{{{HASH_LENGTH}}})")
+# The paths of the asset route, with the extensions of the FastHTML static route
+ASSET_PATH = re.compile(
+    r"/.+\.(ico|gif|jpg|jpeg|webm|css|js|woff|png|svg|mp4|webp|ttf|otf|eot|woff2|txt|html|map)"
+)
+
+
+class Asset(BaseModel):
+    name: str = Field(..., description="The path relative to the assets folder")
+    path: Path = Field(..., description="The file of the asset")
+    content_hash: str = Field(..., description="The sha256 of the file content")
+    modified: float = Field(..., description="The modification time of the file")
+    size: int = Field(..., description="The size of the file")
+    encodings: Dict[str, Path] = Field(
+        default_factory=dict, description="The precompressed variants by encoding"
+    )
+    _gzipped: Optional[bytes] = PrivateAttr(None)
+
+    @property
+    def hashed_name(self) -> str:
+        stem, dot, suffix = self.name.rpartition(".")
+        return f"{stem}.{self.content_hash[:HASH_LENGTH]}.{suffix}"
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        # Each representation needs its own strong ETag
+        tag = self.content_hash[:32]
+        return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+_assets: Dict[Path, Asset] = {}
+
+
+def load_asset(name: str, assets_dir: Path = ASSETS_DIR) -> Optional[Asset]:
+    """
+    Returns the asset with its content hash, which is only computed again
+    when the file changes, or None if there is no such asset.
+    """
+    assets_dir = assets_dir.resolve()
+    path = (assets_dir / name).resolve()
+    if not path.is_relative_to(assets_dir) or not path.is_file():
+        return None
+    stat = path.stat()
+    asset = _assets.get(path)
+    if asset is None or asset.modified != stat.st_mtime or asset.size != stat.st_size:
+        asset = Asset(
+            name=path.relative_to(assets_dir).as_posix(),
+            path=path,
+            content_hash=hashlib.sha256(path.read_bytes()).hexdigest(),
+            modified=stat.st_mtime,
+            size=stat.st_size,
+        )
+        _assets[path] = asset
+    # Variants older than the asset are stale and not served
+    asset.encodings = {
+        encoding: variant
+        for encoding, suffix in ENCODINGS.items()
+        if (variant := path.with_name(path.name + suffix)).is_file()
+        and variant.stat().st_mtime >= asset.modified
+    }
+    return asset
+
+
+def asset_url(name: str) -> str:
+    """Returns the content-hashed URL of an asset."""
+    asset = load_asset(name)
+    if asset is None:
+        logger.warning(f"Asset {name} not found.")
+        return f"/{name}"
+    return f"/{asset.hashed_name}"
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Returns the quality of every coding in an Accept-Encoding header."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(asset: Asset, accept_encoding: str) -> Optional[str]:
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0))
+        if quality > 0 and encoding in asset.encodings:
+            return encoding
+    return None
+
+
+def gzip_content(asset: Asset, accept_encoding: str) -> Optional[bytes]:
+    """
+    Returns the gzipped content of a compressible asset without precompressed
+    variants, compressed once per content, or None if it is sent as it is.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    if (
+        accepted.get("gzip", accepted.get("*", 0)) <= 0
+        or asset.path.suffix not in COMPRESSIBLE_SUFFIXES
+        or asset.size < cfg.compression_min_size
+    ):
+        return None
+    if asset._gzipped is None:
+        asset._gzipped = gzip.compress(
+            asset.path.read_bytes(), compresslevel=cfg.compression_level, mtime=0
+        )
+    return asset._gzipped
+
+
+def is_not_modified(request: Request, etag: str, modified: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def asset_response(request: Request, fname: str, ext: str) -> Response:
+    name = f"{fname}.{ext}"
+    cache_control = REVALIDATE_CACHE_CONTROL
+    asset = load_asset(name)
+    if asset is None and (match := HASHED_NAME.fullmatch(fname)) is not None:
+        asset = load_asset(f"{match['stem']}.{ext}")
+        # An outdated hash still gets the current content, but not forever
+        if asset is not None and asset.content_hash.startswith(match["hash"]):
+            cache_control = IMMUTABLE_CACHE_CONTROL
+    if asset is None:
+        return Response("Not found", status_code=404)
+    accept_encoding = request.headers.get("accept-encoding", "")
+    encoding = choose_encoding(asset, accept_encoding)
+    gzipped = None
+    if encoding is None:
+        gzipped = gzip_content(asset, accept_encoding)
+        encoding = "gzip" if gzipped is not None else None
+    headers = {
+        "ETag": asset.etag(encoding),
+        "Last-Modified": formatdate(asset.modified, usegmt=True),
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if is_not_modified(request, headers["ETag"], asset.modified):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    media_type, _ = mimetypes.guess_type(asset.name)
+    if gzipped is not None:
+        return Response(gzipped, headers=headers, media_type=media_type)
+    return FileResponse(
+        asset.encodings[encoding] if encoding else asset.path,
+        headers=headers,
+        media_type=media_type,
+    )
+
+
+class PageGZipMiddleware(GZipMiddleware):
+    """
+    Compresses the responses except those of the assets, which are encoded by
+    asset_response, as every encoding of an asset needs its own ETag.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and ASSET_PATH.fullmatch(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def precompress_assets(assets_dir: Path = ASSETS_DIR) -> List[Path]:
+    """Writes the gzip, and if brotli is installed, the brotli variants."""
+    written = []
+    for path in sorted(assets_dir.rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        content = path.read_bytes()
+        variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(content, quality=11)
+        for suffix, compressed in variants.items():
+            variant = path.with_name(path.name + suffix)
+            if len(compressed) >= len(content):
+                variant.unlink(missing_ok=True)
+                continue
+            variant.write_bytes(compressed)
+            os.utime(variant, (path.stat().st_atime, path.stat().st_mtime))
+            written.append(variant)
+    if brotli is None:
+        logger.warning("brotli is not installed, only gzip variants were written.")
+    return written
+
+
+if __name__ == "__main__":
+    for variant in precompress_assets():
+        logger.info(f"Wrote {variant}")
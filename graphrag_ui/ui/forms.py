@@ -1,4 +1,9 @@
 from pathlib import Path
+from typing import List, Optional
+from urllib.parse import quote_plus
+
+import uuid
+
 from fasthtml.common import (
     Form,
     Label,
@@ -7,12 +12,47 @@ from fasthtml.common import (
     Button,
     Div,
     P,
+    B,
+    H3,
+    Pre,
+    Span,
+    Table,
+    Thead,
+    Tbody,
+    Tr,
+    Th,
+    Td,
+    Select,
+    Option,
 )
-from graphrag_ui.service.graphrag_query import SearchType
+from graphrag_ui.config import cfg
+from graphrag_ui.service.community_level_service import (
+    AUTO_LEVEL,
+    DEFAULT_LEVEL,
+    auto_level,
+    community_levels,
+    default_level_choice,
+)
+from graphrag_ui.service.graphrag_constants import SearchType
 from graphrag_ui.service.graphrag_service import (
     has_claims,
     get_project_dir,
     has_claims_flag,
+    get_index_version,
+)
+from graphrag_ui.service.job_service import Job, JobStatus
+from graphrag_ui.service.prompt_tuning_service import PromptDiff
+from graphrag_ui.service.report_selection_service import ReportSelection
+from graphrag_ui.service.search_profile_service import (
+    DEFAULT_PROFILE,
+    SEARCH_PROFILES,
+    SearchProfile,
+    default_profile_choice,
+    resolve_search_profile,
+)
+from graphrag_ui.service.project_settings_service import (
+    ContextBackend,
+    read_project_settings,
 )
 from graphrag_ui.ui.webapp import (
     ID_SPINNER,
@@ -27,34 +67,69 @@ from graphrag_ui.ui.ids import (
     ID_TUNING_SPINNER,
     ID_PROMPT_TUNING_FORM,
     ID_CONVERSION_SPINNER,
+    ID_PROMPT_TUNING_STATUS,
+    ID_PROMPT_APPLY_SPINNER,
+    ID_CONTEXT_BACKEND_FORM,
+    ID_CONTEXT_BACKEND_SPINNER,
+    ID_COMMUNITY_LEVEL_FORM,
+    ID_COMMUNITY_LEVEL_SPINNER,
+    ID_SEARCH_PROFILE_FORM,
+    ID_SEARCH_PROFILE_SPINNER,
+    ID_NEO4J_SYNC_FORM,
+    ID_NEO4J_SYNC_SPINNER,
+    ID_NEO4J_SYNC_STATUS,
 )
 
 
 def search_form(projectTitle: str) -> Form:
-    searchType = (
-        Div(
-            Input(
-                "Global",
-                type="radio",
-                id="search-type",
-                name="searchType",
-                value=SearchType.GLOBAL.value,
-                checked=True,
-            ),
+    search_types = [
+        ("Global", SearchType.GLOBAL),
+        ("Fast global", SearchType.FAST_GLOBAL),
+    ]
+    # The local search needs the claims
+    if has_claims(get_project_dir(projectTitle)):
+        search_types.append(("Local", SearchType.LOCAL))
+    searchType = Div(
+        *[
             Input(
-                "Local",
+                label,
                 type="radio",
                 id="search-type",
                 name="searchType",
-                value=SearchType.LOCAL.value,
-            ),
-            cls="search-type",
-        )
-        if has_claims(get_project_dir(projectTitle))
-        else Hidden(SearchType.GLOBAL.value, id="search-type", name="searchType")
+                value=search_type.value,
+                checked=search_type == SearchType.GLOBAL,
+            )
+            for label, search_type in search_types
+        ],
+        cls="search-type",
     )
+    project_dir = get_project_dir(projectTitle)
     return Form(
         searchType,
+        Label(
+            "Search profile",
+            Select(
+                *search_profile_options(
+                    DEFAULT_PROFILE,
+                    f"Project default ({default_profile_choice(project_dir)})",
+                ),
+                id="searchProfile",
+                name="searchProfile",
+            ),
+        ),
+        Label(
+            "Community level",
+            Select(
+                *community_level_options(
+                    project_dir,
+                    DEFAULT_LEVEL,
+                    f"Project default ({default_level_choice(project_dir)})",
+                    resolve_search_profile(project_dir),
+                ),
+                id="communityLevel",
+                name="communityLevel",
+            ),
+        ),
         Label(
             "Global search query",
             Input(
@@ -65,9 +140,17 @@ def search_form(projectTitle: str) -> Form:
             ),
         ),
         Hidden(value=projectTitle, id="projectTitle"),
+        # Identifies the searches of this form, so that they can be cancelled
+        Hidden(value=uuid.uuid4().hex, id="searchId"),
         Div(
             Button("Search"),
-            Button("Clear", type="reset", id="global-search-reset-button"),
+            Button(
+                "Clear",
+                type="reset",
+                id="global-search-reset-button",
+                hx_post="/project/search/cancel",
+                hx_swap="none",
+            ),
             cls="search-form-buttons",
         ),
         Div(
@@ -82,7 +165,98 @@ def search_form(projectTitle: str) -> Form:
     )
 
 
-def generate_question_form(projectTitle: str, query: str) -> Form:
+def search_profile_options(selected: str, default_label: str) -> List[Option]:
+    """The default and the profiles with what they trade."""
+    return [
+        Option(
+            default_label, value=DEFAULT_PROFILE, selected=selected == DEFAULT_PROFILE
+        ),
+        *[
+            Option(
+                f"{profile.name.capitalize()}: {profile.description}",
+                value=profile.name.value,
+                selected=selected == profile.name,
+            )
+            for profile in SEARCH_PROFILES.values()
+        ],
+    ]
+
+
+def community_level_options(
+    project_dir: Path, selected: str, default_label: str, profile: SearchProfile
+) -> List[Option]:
+    """
+    The default, auto and the levels of the project with their reports and
+    the map calls of the profile.
+    """
+    levels = community_levels(project_dir)
+    budget = dict(
+        max_tokens=profile.global_max_tokens,
+        use_summary=profile.use_community_summary,
+    )
+    return [
+        Option(default_label, value=DEFAULT_LEVEL, selected=selected == DEFAULT_LEVEL),
+        Option(
+            f"Auto (level {auto_level(levels, **budget)})",
+            value=AUTO_LEVEL,
+            selected=selected == AUTO_LEVEL,
+        ),
+        *[
+            Option(
+                f"Level {level.level}: {level.reports} reports, "
+                f"{level.map_calls(**budget)} global map call"
+                + ("" if level.map_calls(**budget) == 1 else "s"),
+                value=str(level.level),
+                selected=selected == str(level.level),
+            )
+            for level in levels
+        ],
+    ]
+
+
+def search_note(
+    profile: SearchProfile,
+    community_level: int,
+    level_choice: str,
+    result,
+    seconds: float,
+) -> P:
+    """The profile and community level of an answer with its usage and latency."""
+    llm_calls = getattr(result, "llm_calls", 0) or 0
+    prompt_tokens = getattr(result, "prompt_tokens", 0) or 0
+    return P(
+        f"{profile.name.capitalize()} profile, community level {community_level}"
+        + (" (auto)" if level_choice == AUTO_LEVEL else "")
+        + f": {llm_calls} LLM call"
+        + ("" if llm_calls == 1 else "s")
+        + f", {prompt_tokens:,} prompt tokens, {seconds:.1f} seconds.",
+        cls="search-note",
+    )
+
+
+def report_selection_note(selection: ReportSelection) -> P:
+    if selection.fallback:
+        return P(
+            f"Only {selection.relevant_reports} of {selection.total_reports} reports "
+            f"were relevant to the query, so all of them were mapped.",
+            cls="search-note",
+        )
+    return P(
+        f"Mapped the {selection.selected_reports} most relevant of "
+        f"{selection.total_reports} reports in {selection.map_calls} LLM calls, "
+        f"saving {selection.reports_saved} reports and "
+        f"{selection.llm_calls_saved} LLM calls.",
+        cls="search-note",
+    )
+
+
+def generate_question_form(
+    projectTitle: str,
+    query: str,
+    searchId: str = "",
+    communityLevel: str = "",
+    searchProfile: str = "",
+) -> Form:
     return Form(
         Button("Generate other questions"),
         Div(
@@ -92,6 +266,9 @@ def generate_question_form(projectTitle: str, query: str) -> Form:
         ),
         Hidden(value=projectTitle, id="projectTitle", name="projectTitle"),
         Hidden(value=query, id="query", name="query"),
+        Hidden(value=searchId, id="searchId", name="searchId"),
+        Hidden(value=communityLevel, id="communityLevel", name="communityLevel"),
+        Hidden(value=searchProfile, id="searchProfile", name="searchProfile"),
         hx_post=f"/project/generate-question",
         hx_indicator=f"#{ID_GENERATION_SPINNER}",
         target_id=ID_GGENERATE_FORM,
@@ -137,6 +314,267 @@ def prompt_tuning_form(projectTitle: str) -> Form:
     )
 
 
+def prompt_tuning_status(
+    projectTitle: str, job: Job, diffs: Optional[List[PromptDiff]]
+):
+    # The diffs are None until the job finished, also if it finished since
+    if job.status == JobStatus.RUNNING or (
+        job.status == JobStatus.FINISHED and diffs is None
+    ):
+        return Div(
+            P(f"Tuning prompts automatically ({int(job.elapsed)} s). Please wait ..."),
+            hx_get=f"/project/prompt-tuning/status?projectTitle={quote_plus(projectTitle)}",
+            hx_trigger="every 2s",
+            hx_swap="outerHTML",
+            id=ID_PROMPT_TUNING_STATUS,
+        )
+    if job.status == JobStatus.FAILED:
+        return Div(
+            P(f"Failed to tune prompts: {job.message}"), id=ID_PROMPT_TUNING_STATUS
+        )
+    changed = [d for d in diffs if d.changed]
+    if len(changed) == 0:
+        return Div(
+            P(
+                "Prompt tuning for project ",
+                B(projectTitle),
+                " finished. The tuned prompts are the same as the current ones.",
+            ),
+            id=ID_PROMPT_TUNING_STATUS,
+        )
+    return Div(
+        P(
+            "Prompt tuning for project ",
+            B(projectTitle),
+            f" finished in {int(job.elapsed)} s. {job.message}. Please review the changes before applying them.",
+        ),
+        *[prompt_diff_view(d) for d in changed],
+        prompt_apply_form(projectTitle, job.result),
+        id=ID_PROMPT_TUNING_STATUS,
+    )
+
+
+def prompt_diff_view(prompt_diff: PromptDiff) -> Div:
+    def diff_line(line: str):
+        if line.startswith("+") and not line.startswith("+++"):
+            return Span(line, cls="diff-added")
+        if line.startswith("-") and not line.startswith("---"):
+            return Span(line, cls="diff-removed")
+        return Span(line)
+
+    return Div(
+        H3(prompt_diff.name + (" (new)" if prompt_diff.is_new else "")),
+        Pre(*[diff_line(line) for line in prompt_diff.diff], cls="prompt-diff"),
+    )
+
+
+def prompt_apply_form(projectTitle: str, key: str) -> Form:
+    return Form(
+        Hidden(value=projectTitle, id="projectTitle", name="projectTitle"),
+        Hidden(value=key, id="key", name="key"),
+        Button("Apply tuned prompts"),
+        Div(
+            P("Applying prompts. Please wait ..."),
+            cls="htmx-indicator",
+            id=ID_PROMPT_APPLY_SPINNER,
+        ),
+        hx_post="/project/prompt-tuning/apply",
+        hx_indicator=f"#{ID_PROMPT_APPLY_SPINNER}",
+        target_id=ID_PROMPT_TUNING_STATUS,
+    )
+
+
+def context_backend_form(projectTitle: str) -> Form:
+    settings = read_project_settings(get_project_dir(projectTitle))
+    return Form(
+        Label("Local search context"),
+        Div(
+            Input(
+                "In memory",
+                type="radio",
+                name="contextBackend",
+                value=ContextBackend.MEMORY.value,
+                checked=settings.context_backend == ContextBackend.MEMORY,
+            ),
+            Input(
+                "Neo4J (the project needs to be synced to Neo4J)",
+                type="radio",
+                name="contextBackend",
+                value=ContextBackend.NEO4J.value,
+                checked=settings.context_backend == ContextBackend.NEO4J,
+            ),
+            cls="search-type",
+        ),
+        Hidden(value=projectTitle, id="projectTitle", name="projectTitle"),
+        Button("Save"),
+        Div(
+            P("Saving. Please wait ..."),
+            cls="htmx-indicator",
+            id=ID_CONTEXT_BACKEND_SPINNER,
+        ),
+        hx_put="/project/context-backend",
+        hx_indicator=f"#{ID_CONTEXT_BACKEND_SPINNER}",
+        target_id=ID_CONTEXT_BACKEND_FORM,
+        hx_swap="outerHTML",
+        id=ID_CONTEXT_BACKEND_FORM,
+        style="margin-top: 1em",
+    )
+
+
+def community_level_form(projectTitle: str, error: str = "") -> Form:
+    project_dir = get_project_dir(projectTitle)
+    settings = read_project_settings(project_dir)
+    return Form(
+        Label(
+            "Community level of the searches",
+            Select(
+                *community_level_options(
+                    project_dir,
+                    settings.community_level or DEFAULT_LEVEL,
+                    f"Configured default ({cfg.community_level})",
+                    resolve_search_profile(project_dir),
+                ),
+                name="communityLevel",
+            ),
+        ),
+        P(error) if error else None,
+        Hidden(value=projectTitle, id="projectTitle", name="projectTitle"),
+        Button("Save"),
+        Div(
+            P("Saving. Please wait ..."),
+            cls="htmx-indicator",
+            id=ID_COMMUNITY_LEVEL_SPINNER,
+        ),
+        hx_put="/project/community-level",
+        hx_indicator=f"#{ID_COMMUNITY_LEVEL_SPINNER}",
+        target_id=ID_COMMUNITY_LEVEL_FORM,
+        hx_swap="outerHTML",
+        id=ID_COMMUNITY_LEVEL_FORM,
+        style="margin-top: 1em",
+    )
+
+
+def search_profile_form(projectTitle: str, error: str = "") -> Form:
+    settings = read_project_settings(get_project_dir(projectTitle))
+    return Form(
+        Label(
+            "Profile of the searches",
+            Select(
+                *search_profile_options(
+                    settings.search_profile or DEFAULT_PROFILE,
+                    f"Configured default ({cfg.search_profile})",
+                ),
+                name="searchProfile",
+            ),
+        ),
+        P(error) if error else None,
+        Hidden(value=projectTitle, id="projectTitle", name="projectTitle"),
+        Button("Save"),
+        Div(
+            P("Saving. Please wait ..."),
+            cls="htmx-indicator",
+            id=ID_SEARCH_PROFILE_SPINNER,
+        ),
+        hx_put="/project/search-profile",
+        hx_indicator=f"#{ID_SEARCH_PROFILE_SPINNER}",
+        target_id=ID_SEARCH_PROFILE_FORM,
+        hx_swap="outerHTML",
+        id=ID_SEARCH_PROFILE_FORM,
+        style="margin-top: 1em",
+    )
+
+
+def neo4j_sync_form(projectTitle: str, job: Job = None) -> Div:
+    if not cfg.neo4j.configured:
+        return Div(
+            Label("Neo4J"),
+            P(
+                "Neo4J is not configured. Set NEO4J_URI, NEO4J_USERNAME, "
+                "NEO4J_PASSWORD and NEO4J_DATABASE to sync projects."
+            ),
+            id=ID_NEO4J_SYNC_FORM,
+            style="margin-top: 1em",
+        )
+    project_dir = get_project_dir(projectTitle)
+    settings = read_project_settings(project_dir)
+    if settings.neo4j_index_version is None:
+        sync_message = "The project has not been synced to Neo4J yet."
+    else:
+        synced_at = settings.neo4j_synced_at.strftime("%Y-%m-%d %H:%M")
+        up_to_date = settings.neo4j_index_version == get_index_version(project_dir)
+        sync_message = (
+            f"Synced index {settings.neo4j_index_version} to Neo4J on {synced_at}"
+            + (
+                ". It is up to date."
+                if up_to_date
+                else ". The index has changed since."
+            )
+        )
+    return Div(
+        Form(
+            Label("Neo4J"),
+            P(sync_message),
+            Label(
+                Input(type="checkbox", name="force", value="true"),
+                "Sync even if the index has not changed",
+            ),
+            Hidden(value=projectTitle, id="projectTitle", name="projectTitle"),
+            Button("Sync to Neo4J"),
+            Div(
+                P("Starting the sync. Please wait ..."),
+                cls="htmx-indicator",
+                id=ID_NEO4J_SYNC_SPINNER,
+            ),
+            hx_put="/project/neo4j-sync",
+            hx_indicator=f"#{ID_NEO4J_SYNC_SPINNER}",
+            target_id=ID_NEO4J_SYNC_STATUS,
+            hx_swap="outerHTML",
+        ),
+        (
+            neo4j_sync_status(projectTitle, job)
+            if job is not None
+            else Div(id=ID_NEO4J_SYNC_STATUS)
+        ),
+        id=ID_NEO4J_SYNC_FORM,
+        style="margin-top: 1em",
+    )
+
+
+def neo4j_sync_status(projectTitle: str, job: Job) -> Div:
+    stages = job.progress.get("stages", {})
+    stage_table = Table(
+        Thead(Tr(Th("Stage"), Th("Status"), Th("Rows"), Th("Rows/s"), Th("Time"))),
+        Tbody(
+            *[
+                Tr(
+                    Td(name),
+                    Td(
+                        "done"
+                        if progress.completed
+                        else "running" if progress.running else "pending"
+                    ),
+                    Td(f"{progress.rows:,}"),
+                    Td(f"{progress.rows_per_second:,.0f}"),
+                    Td(f"{progress.elapsed:.1f} s"),
+                )
+                for name, progress in stages.items()
+            ]
+        ),
+    )
+    content = [P(f"{job.message} ({int(job.elapsed)} s)."), stage_table]
+    if job.status == JobStatus.RUNNING:
+        return Div(
+            *content,
+            hx_get=f"/project/neo4j-sync/status?projectTitle={quote_plus(projectTitle)}",
+            hx_trigger="every 2s",
+            hx_swap="outerHTML",
+            id=ID_NEO4J_SYNC_STATUS,
+        )
+    if job.status == JobStatus.FAILED:
+        content[0] = P(f"Failed to sync with Neo4J: {job.message}")
+    return Div(*content, id=ID_NEO4J_SYNC_STATUS)
+
+
 def create_csv_conversion_form(projectTitle: str) -> Form:
     project_dir = get_project_dir(projectTitle)
     results = []
@@ -0,0 +1,79 @@
+"""
+Caches rendered fragments of the project pages, like the list of output
+files, which otherwise need several filesystem calls on every page view.
+
+A fragment is keyed by the project state: the modification times of the
+project files it depends on and a generation which the routes bump when they
+change the project. So fragments are never served for an outdated state, even
+when the project is changed outside of the UI, e.g. by an indexing process.
+"""
+
+import threading
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+from fasthtml.common import NotStr, to_xml
+
+from graphrag_ui.config import cfg
+from graphrag_ui.service.project_settings_service import SETTINGS_FILE
+
+# The files and folders whose changes change the state of a project
+STATE_PATHS = ["", "output", "settings.yaml", ".env", SETTINGS_FILE]
+
+_cache: OrderedDict[Tuple, Any] = OrderedDict()
+_generations: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def project_state(project_dir: Path) -> Tuple:
+    state = [_generations.get(project_dir.name, 0)]
+    for name in STATE_PATHS:
+        try:
+            state.append((project_dir / name).stat().st_mtime_ns)
+        except OSError:
+            state.append(None)
+    return tuple(state)
+
+
+def invalidate_project(project_dir: Path):
+    """Drops the fragments of a project after the UI changed it."""
+    with _lock:
+        _generations[project_dir.name] = _generations.get(project_dir.name, 0) + 1
+        for key in [k for k in _cache if k[0] == project_dir.name]:
+            del _cache[key]
+
+
+def cached(project_dir: Path, name: str, compute: Callable[[], Any], *key) -> Any:
+    """
+    Returns the value computed for the current project state, computing it
+    only if it is not cached. The extra key distinguishes the variants of a
+    fragment, like the file of an output preview.
+    """
+    cache_key = (project_dir.name, name, key, project_state(project_dir))
+    with _lock:
+        if cache_key in _cache:
+            _cache.move_to_end(cache_key)
+            return _cache[cache_key]
+    value = compute()
+    with _lock:
+        _cache[cache_key] = value
+        while len(_cache) > cfg.fragment_cache_size:
+            _cache.popitem(last=False)
+    return value
+
+
+def cached_fragment(
+    project_dir: Path, name: str, render: Callable[[], Any], *key
+) -> NotStr:
+    """Renders the fragment to HTML once per project state."""
+
+    def render_html() -> NotStr:
+        fragment = render()
+        # to_xml renders tuples of components, but not lists
+        return NotStr(
+            to_xml(tuple(fragment) if isinstance(fragment, list) else fragment)
+        )
+
+    return cached(project_dir, name, render_html, *key)
@@ -7,3 +7,14 @@ ID_GENERATION_SPINNER = "generation-spinner"
 ID_TUNING_SPINNER = "tuning-spinner"
 ID_PROMPT_TUNING_FORM = "prompt-tuning-form"
 ID_CONVERSION_SPINNER = "conversion-spinner"
+ID_PROMPT_TUNING_STATUS = "prompt-tuning-status"
+ID_PROMPT_APPLY_SPINNER = "prompt-apply-spinner"
+ID_CONTEXT_BACKEND_FORM = "context-backend-form"
+ID_CONTEXT_BACKEND_SPINNER = "context-backend-spinner"
+ID_COMMUNITY_LEVEL_FORM = "community-level-form"
+ID_COMMUNITY_LEVEL_SPINNER = "community-level-spinner"
+ID_SEARCH_PROFILE_FORM = "search-profile-form"
+ID_SEARCH_PROFILE_SPINNER = "search-profile-spinner"
+ID_NEO4J_SYNC_FORM = "neo4j-sync-form"
+ID_NEO4J_SYNC_SPINNER = "neo4j-sync-spinner"
+ID_NEO4J_SYNC_STATUS = "neo4j-sync-status"
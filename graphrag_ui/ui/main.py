@@ -1,5 +1,5 @@
 from fasthtml.common import serve
-from graphrag_ui.ui.project import app
+from graphrag_ui.ui.admin import app
 
 
 if __name__ == "__main__":
@@ -1,3 +1,7 @@
+import importlib
+import time
+
+from pathlib import Path
 from urllib.parse import quote_plus, unquote_plus
 
 from fasthtml.common import (
@@ -23,6 +27,8 @@ from fasthtml.common import (
     Group,
     Small,
 )
+from markdown import markdown
+from starlette.requests import Request
 
 from graphrag_ui.service.graphrag_service import (
     list_output_files,
@@ -30,18 +36,52 @@ from graphrag_ui.service.graphrag_service import (
     set_api_key,
     get_project_dir,
     activate_claims,
-    graphrag_prompt_tuning,
     ProjectStatus,
     convert_to_csv,
     STATUS_MESSAGES,
 )
-from graphrag_ui.service.graphrag_query import query_rag, generate_questions, SearchType
+from graphrag_ui.service.prompt_tuning_service import (
+    start_prompt_tuning,
+    find_prompt_tuning_job,
+    prompt_tuning_diffs,
+    apply_prompts,
+)
+from graphrag_ui.service.neo4j_sync_service import (
+    start_neo4j_sync,
+    find_neo4j_sync_job,
+)
+from graphrag_ui.service.project_settings_service import (
+    ContextBackend,
+    update_project_settings,
+)
+from graphrag_ui.service.graphrag_constants import SearchType
+from graphrag_ui.service.community_level_service import (
+    level_choice,
+    level_setting,
+    resolve_community_level,
+)
+from graphrag_ui.service.search_profile_service import (
+    profile_setting,
+    resolve_search_profile,
+)
+from graphrag_ui.service.search_task_service import (
+    run_search,
+    search_key,
+    cancel_searches,
+    metrics as search_metrics,
+    SearchCancelled,
+)
+from graphrag_ui.service.profiling_service import profiled
+from graphrag_ui.service.query_cache_service import schedule_preload
+from graphrag_ui.service.execution_service import run_blocking, run_in_process
 from graphrag_ui.config import cfg
 from graphrag_ui.ui.snippets import (
     title_group,
     create_project_title_status,
     REFRESH_LINK,
 )
+from graphrag_ui.ui.assets import asset_url
+from graphrag_ui.ui.fragment_cache import cached_fragment, invalidate_project
 from graphrag_ui.ui.webapp import (
     app,
     ID_CONFIG_FORM,
@@ -56,7 +96,15 @@ from graphrag_ui.ui.forms import (
     prompt_tuning_form,
     search_form,
     generate_question_form,
+    report_selection_note,
+    search_note,
+    community_level_form,
+    search_profile_form,
     create_csv_conversion_form,
+    prompt_tuning_status,
+    context_backend_form,
+    neo4j_sync_form,
+    neo4j_sync_status,
 )
 
 SESSION_ASKED_QUESTIONS = "asked_questions"
@@ -123,6 +171,9 @@ def get(projectTitle: str):
         form_components.append(index_form)
         status_group.append(status)
     elif project_status == ProjectStatus.INDEXED:
+        if cfg.preload_on_open:
+            # Loads the search data while the user types the first query
+            schedule_preload(get_project_dir(projectTitle))
         form_components.append(search_form(projectTitle))
         status_group.append(
             Group(
@@ -149,32 +200,27 @@ def get(projectTitle: str):
     title, project_status, project_dir, projectTitle = create_project_title_status(
         projectTitle
     )
-    output_files_components = []
+    output_files_container = None
     csv_conversion_form = []
     if project_status == ProjectStatus.INDEXED:
-        output_files = list_output_files(project_dir)
-        for output_file in output_files:
-            output_files_components.append(
-                Div(
-                    A(
-                        Img(src="/file-zipper-svgrepo-com.svg", width=20, height=20),
-                        output_file.name,
-                        href=f"/project/output/{quote_plus(projectTitle)}/{quote_plus(output_file.name)}",
-                    )
-                )
-            )
-        output_files_container = (
-            Div(
-                H2("Output files"),
-                Div(
-                    *output_files_components,
-                    cls="grid-container-1-2",
-                ),
+        output_files_container = cached_fragment(
+            project_dir,
+            "output-files",
+            lambda: output_files_list(projectTitle, project_dir),
+        )
+        csv_conversion_form.append(
+            cached_fragment(
+                project_dir,
+                "csv-conversion",
+                lambda: create_csv_conversion_form(projectTitle),
             )
-            if len(output_files_components) > 0
-            else None
         )
-        csv_conversion_form.extend(create_csv_conversion_form(projectTitle))
+        csv_conversion_form.append(context_backend_form(projectTitle))
+        csv_conversion_form.append(community_level_form(projectTitle))
+        csv_conversion_form.append(search_profile_form(projectTitle))
+        csv_conversion_form.append(
+            neo4j_sync_form(projectTitle, find_neo4j_sync_job(project_dir))
+        )
     return Title(title), Main(
         title_group(title),
         output_files_container,
@@ -183,11 +229,87 @@ def get(projectTitle: str):
     )
 
 
+def output_files_list(projectTitle: str, project_dir: Path):
+    output_files_components = []
+    for output_file in list_output_files(project_dir):
+        output_files_components.append(
+            Div(
+                A(
+                    Img(
+                        src=asset_url("file-zipper-svgrepo-com.svg"),
+                        width=20,
+                        height=20,
+                    ),
+                    output_file.name,
+                    href=f"/project/output/{quote_plus(projectTitle)}/{quote_plus(output_file.name)}",
+                )
+            )
+        )
+    if len(output_files_components) == 0:
+        return None
+    return Div(
+        H2("Output files"),
+        Div(
+            *output_files_components,
+            cls="grid-container-1-2",
+        ),
+    )
+
+
+@app.route("/project/context-backend")
+async def put(projectTitle: str, contextBackend: str):
+    project_dir = get_project_dir(projectTitle)
+    update_project_settings(project_dir, context_backend=ContextBackend(contextBackend))
+    invalidate_project(project_dir)
+    return context_backend_form(projectTitle)
+
+
+@app.route("/project/community-level")
+async def put(projectTitle: str, communityLevel: str = ""):
+    project_dir = get_project_dir(projectTitle)
+    try:
+        community_level = level_setting(communityLevel)
+    except ValueError as e:
+        return community_level_form(projectTitle, str(e))
+    update_project_settings(project_dir, community_level=community_level)
+    return community_level_form(projectTitle)
+
+
+@app.route("/project/search-profile")
+async def put(projectTitle: str, searchProfile: str = ""):
+    project_dir = get_project_dir(projectTitle)
+    try:
+        search_profile = profile_setting(searchProfile)
+    except ValueError as e:
+        return search_profile_form(projectTitle, str(e))
+    update_project_settings(project_dir, search_profile=search_profile)
+    return search_profile_form(projectTitle)
+
+
+@app.route("/project/neo4j-sync")
+async def put(projectTitle: str, force: str = ""):
+    project_dir = get_project_dir(projectTitle)
+    try:
+        job = start_neo4j_sync(project_dir, force.lower() == "true")
+        return neo4j_sync_status(projectTitle, job)
+    except Exception as e:
+        return f"Failed to start the Neo4J sync: {e}"
+
+
+@app.route("/project/neo4j-sync/status")
+async def get(projectTitle: str):
+    job = find_neo4j_sync_job(get_project_dir(projectTitle))
+    if job is None:
+        return f"No Neo4J sync running for project <b>{projectTitle}</b>."
+    return neo4j_sync_status(projectTitle, job)
+
+
 @app.route("/project/key")
 async def post(projectTitle: str, key: str):
     project_dir = get_project_dir(projectTitle)
     try:
-        set_api_key(project_dir, key)
+        await run_blocking(set_api_key, project_dir, key)
+        invalidate_project(project_dir)
         return f"""Key for project <b>{projectTitle}</b> set successfully. {REFRESH_LINK}"""
     except Exception as e:
         return f"Failed to set key: {e}"
@@ -197,7 +319,8 @@ async def post(projectTitle: str, key: str):
 async def put(projectTitle: str, enabled: str):
     project_dir = get_project_dir(projectTitle)
     try:
-        activate_claims(project_dir, enabled.lower() == "true")
+        await run_blocking(activate_claims, project_dir, enabled.lower() == "true")
+        invalidate_project(project_dir)
         return f"Claims for project <b>{projectTitle}</b> {"activated" if enabled.lower() == 'true' else "deactivated"}."
     except Exception as e:
         return f"Failed to activate claims: {e}"
@@ -207,30 +330,161 @@ async def put(projectTitle: str, enabled: str):
 async def put(projectTitle: str):
     project_dir = get_project_dir(projectTitle)
     try:
-        graphrag_prompt_tuning(project_dir)
-        return f"Prompt tuning for project <b>{projectTitle}</b> finished."
+        job = start_prompt_tuning(project_dir)
+        return prompt_tuning_status(
+            projectTitle, job, prompt_tuning_diffs(project_dir, job)
+        )
     except Exception as e:
         return f"Failed to start prompt tuning: {e}"
 
 
+@app.route("/project/prompt-tuning/status")
+async def get(projectTitle: str):
+    project_dir = get_project_dir(projectTitle)
+    job = find_prompt_tuning_job(project_dir)
+    if job is None:
+        return f"No prompt tuning running for project <b>{projectTitle}</b>."
+    return prompt_tuning_status(
+        projectTitle, job, prompt_tuning_diffs(project_dir, job)
+    )
+
+
+@app.route("/project/prompt-tuning/apply")
+async def post(projectTitle: str, key: str):
+    project_dir = get_project_dir(projectTitle)
+    try:
+        applied = apply_prompts(project_dir, key)
+        return f"Applied prompts {', '.join(applied)} to project <b>{projectTitle}</b>."
+    except Exception as e:
+        return f"Failed to apply prompts: {e}"
+
+
+async def import_graphrag_query():
+    """
+    The search module, imported by the first search so that graphrag is not
+    loaded at startup, and in the thread pool, as the import blocks for a while.
+    """
+    return await run_blocking(
+        importlib.import_module, "graphrag_ui.service.graphrag_query"
+    )
+
+
 @app.route("/project/search")
-async def post(projectTitle: str, query: str, searchType: str):
-    search_type = SearchType.GLOBAL if searchType == "global" else SearchType.LOCAL
+async def post(
+    request: Request,
+    projectTitle: str,
+    query: str,
+    searchType: str,
+    searchId: str = "",
+    communityLevel: str = "",
+    searchProfile: str = "",
+):
+    started = time.perf_counter()
+    try:
+        search_type = SearchType(searchType)
+    except ValueError:
+        return f"Invalid search type: {searchType}"
     projectTitle = unquote_plus(projectTitle)
-    results = await query_rag(query, cfg.project_dir / projectTitle, search_type)
+    project_dir = cfg.project_dir / projectTitle
+    search_rag = (await import_graphrag_query()).search_rag
+
+    try:
+        profile = await run_blocking(resolve_search_profile, project_dir, searchProfile)
+        community_level = await run_blocking(
+            resolve_community_level, project_dir, communityLevel, profile
+        )
+    except ValueError as e:
+        return str(e)
+    with profiled(project_dir, f"{search_type.value} search", query):
+        try:
+            result = await run_search(
+                request,
+                searchId,
+                search_type,
+                lambda: search_rag(
+                    query, project_dir, search_type, community_level, profile
+                ),
+                search_key(
+                    project_dir,
+                    search_type,
+                    query,
+                    community_level=community_level,
+                    profile=profile.name,
+                ),
+            )
+        except SearchCancelled:
+            return "Search cancelled."
+        results = markdown(result.response)
+    notes = [
+        search_note(
+            profile,
+            community_level,
+            level_choice(project_dir, communityLevel),
+            result,
+            time.perf_counter() - started,
+        )
+    ]
+    if search_type == SearchType.FAST_GLOBAL:
+        notes.append(report_selection_note(result.report_selection))
     if search_type == SearchType.LOCAL:
-        form = generate_question_form(projectTitle, query)
-        return tuple((form, NotStr(results)))
-    else:
-        return results
+        form = generate_question_form(
+            projectTitle, query, searchId, str(community_level), profile.name.value
+        )
+        return tuple((form, *notes, NotStr(results)))
+    return tuple((*notes, NotStr(results)))
+
+
+@app.route("/project/search/cancel")
+async def post(searchId: str = ""):
+    cancel_searches(searchId)
+    return ""
+
+
+@app.route("/project/search/metrics")
+def get():
+    return search_metrics.model_dump(mode="json")
 
 
 @app.route("/project/generate-question")
-async def post(projectTitle: str, query: str):
+async def post(
+    request: Request,
+    projectTitle: str,
+    query: str,
+    searchId: str = "",
+    communityLevel: str = "",
+    searchProfile: str = "",
+):
     question_history = [query]
-    questions = await generate_questions(
-        question_history, cfg.project_dir / projectTitle
-    )
+    project_dir = cfg.project_dir / projectTitle
+    generate_question_result = (await import_graphrag_query()).generate_question_result
+
+    try:
+        profile = await run_blocking(resolve_search_profile, project_dir, searchProfile)
+        community_level = await run_blocking(
+            resolve_community_level, project_dir, communityLevel, profile
+        )
+    except ValueError as e:
+        return str(e)
+    with profiled(project_dir, "question generation", query):
+        try:
+            result = await run_search(
+                request,
+                searchId,
+                "questions",
+                lambda: generate_question_result(
+                    question_history, project_dir, community_level, profile
+                ),
+                search_key(
+                    project_dir,
+                    "questions",
+                    query,
+                    community_level=community_level,
+                    profile=profile.name,
+                ),
+            )
+        except SearchCancelled:
+            return "Question generation cancelled."
+    questions = result.response
     return Div(
         H3("Questions"),
         *[
@@ -252,30 +506,39 @@ async def post(projectTitle: str, query: str):
 def get(projectTitle: str, file_name: str):
     projectTitle = unquote_plus(projectTitle)
     file_name = unquote_plus(file_name)
-    file = cfg.project_dir / projectTitle / "output" / file_name
-    columns, head = list_columns(file)
+    project_dir = cfg.project_dir / projectTitle
+    file = project_dir / "output" / file_name
     title = f"File {file_name}"
-    columns_components = []
-    for column in columns:
-        columns_components.append(Li(column))
-    columns_list = Ul(*columns_components, cls="list-group")
     return Title(f"File {file_name}"), Main(
         title_group(title),
         Div(
             "Project: ", B(A(projectTitle, href=f"/project/{quote_plus(projectTitle)}"))
         ),
-        Br(),
-        columns_list,
-        Br(),
-        Pre(head),
+        cached_fragment(
+            project_dir,
+            "output-preview",
+            lambda: output_preview(file),
+            file_name,
+            file.stat().st_mtime_ns if file.exists() else None,
+        ),
         cls="container",
     )
 
 
+def output_preview(file: Path):
+    columns, head = list_columns(file)
+    columns_components = []
+    for column in columns:
+        columns_components.append(Li(column))
+    columns_list = Ul(*columns_components, cls="list-group")
+    return Br(), columns_list, Br(), Pre(head)
+
+
 @app.route("/project/convert-to-csv")
 async def post(projectTitle: str):
     try:
-        convert_to_csv(cfg.project_dir / projectTitle)
+        await run_in_process(convert_to_csv, cfg.project_dir / projectTitle)
+        invalidate_project(cfg.project_dir / projectTitle)
         return f"CSV conversion for project <b>{projectTitle}</b> finished."
     except Exception as e:
         return f"Failed to convert to CSVs: {e}"
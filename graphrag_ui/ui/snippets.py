@@ -8,6 +8,8 @@ from urllib.parse import unquote_plus
 
 from graphrag_ui.config import cfg
 from graphrag_ui.service.graphrag_service import ProjectStatus, get_project_status
+from graphrag_ui.ui.assets import asset_url
+from graphrag_ui.ui.fragment_cache import cached
 
 
 REFRESH_LINK = (
@@ -20,7 +22,7 @@ def title_group(title: str):
         H1(title),
         A(
             Img(
-                src="/house-svgrepo-com.svg",
+                src=asset_url("house-svgrepo-com.svg"),
                 alt="Home",
                 title="Home",
                 width=24,
@@ -55,5 +57,7 @@ def create_project_title_status(
     projectTitle = unquote_plus(projectTitle)
     title = f"Project {projectTitle}"
     project_dir = cfg.project_dir / projectTitle
-    project_status = get_project_status(project_dir)
+    project_status = cached(
+        project_dir, "status", lambda: get_project_status(project_dir)
+    )
     return title, project_status, project_dir, projectTitle
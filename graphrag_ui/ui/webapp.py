@@ -21,7 +21,6 @@ from fasthtml.common import (
     P,
     A,
     UploadFile,
-    FileResponse,
     Script,
     Link,
     Dialog,
@@ -29,7 +28,9 @@ from fasthtml.common import (
     HighlightJS,
     RedirectResponse,
 )
+from starlette.middleware import Middleware
 from starlette.requests import Request
+from starlette.responses import Response
 
 from graphrag_ui.service.graphrag_service import (
     list_projects,
@@ -40,6 +41,15 @@ from graphrag_ui.service.graphrag_service import (
     STATUS_MESSAGES,
 )
 from graphrag_ui.config import cfg
+from graphrag_ui.service.metrics_service import render_metrics, CONTENT_TYPE
+from graphrag_ui.service.execution_service import (
+    run_blocking,
+    start_loop_monitor,
+    shutdown_pools,
+)
+from graphrag_ui.service.query_cache_service import start_warm_up, drop_project
+from graphrag_ui.ui.assets import PageGZipMiddleware, asset_response, asset_url
+from graphrag_ui.ui.fragment_cache import invalidate_project
 from graphrag_ui.ui.snippets import title_group, create_file_input
 
 footer = Dialog(
@@ -57,14 +67,24 @@ app = FastHTML(
     static_path=cfg.image_path,
     hdrs=(
         picolink,
-        Link(href="/css/main.css", type="text/css", rel="stylesheet"),
-        Script(src="/js/error.js"),
-        Script(src="/js/main.js"),
+        Link(href=asset_url("css/main.css"), type="text/css", rel="stylesheet"),
+        Script(src=asset_url("js/error.js")),
+        Script(src=asset_url("js/main.js")),
         MarkdownJS(),
         HighlightJS(langs=["python", "javascript", "html", "css"]),
     ),
     htmlkw={"data-theme": "dark"},
     ftrs=(footer,),
+    on_startup=[start_loop_monitor, start_warm_up],
+    on_shutdown=[shutdown_pools],
+    # The assets are left to asset_response, which gives every encoding its own ETag
+    middleware=[
+        Middleware(
+            PageGZipMiddleware,
+            minimum_size=cfg.compression_min_size,
+            compresslevel=cfg.compression_level,
+        )
+    ],
 )
 
 ID_UPLOAD_FORM = "upload-form"
@@ -88,8 +108,13 @@ class ErrorCode(Enum):
 
 
 @app.route("/{fname:path}.{ext:static}")
-async def get(fname: str, ext: str):
-    return FileResponse(f"assets/{fname}.{ext}")
+async def get(request: Request, fname: str, ext: str):
+    return asset_response(request, fname, ext)
+
+
+@app.route("/metrics")
+def get():
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
 
 
 @app.route("/")
@@ -237,6 +262,8 @@ def delete(projectName: str):
     try:
         project_dir = get_project_dir(projectName)
         delete_project(project_dir)
+        invalidate_project(project_dir)
+        drop_project(project_dir)
         projects = list_projects()
         if len(projects) == 0:
             return "<p style='text-align: center; padding-top: 2em'>No projects available right now.</p>"
@@ -270,10 +297,12 @@ async def post(projectTitle: str):
     if not project_dir.exists():
         return f"Project {projectTitle} does not exist.<br />"
     try:
-        graphrag_index(project_dir)
+        await run_blocking(graphrag_index, project_dir)
         return f"Project {projectTitle} indexed successfully. {REFRESH_LINK}<br />"
     except Exception as e:
         return f"Error: {e}"
+    finally:
+        invalidate_project(project_dir)
 
 
 def create_project_link(projectTitle: str):
@@ -311,7 +340,7 @@ async def init_graphrag_file(files: List[UploadFile], project_title: str) -> Err
         return ErrorCode.UNSUPPORTED_FILE_TYPE
 
     try:
-        graphrag_init(project_dir)
+        await run_blocking(graphrag_init, project_dir)
     except Exception as e:
         print(e)
         return ErrorCode.GRAPHRAG_INIT_ERROR